@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger("exam-analyzer-api")
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def exam_fingerprint(exam_content, namespace=""):
+    """
+    Content-address an exam by its normalized text
+
+    Whitespace runs are collapsed so that re-extractions of the same PDF map to
+    the same key. `namespace` (e.g. the model name) is mixed in so that a model
+    change does not serve analyses produced by another model.
+
+    Args:
+        exam_content (str): Text returned by extract_pdf_content
+        namespace (str, optional): Extra discriminator for the key
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    normalized = _WHITESPACE_RE.sub(' ', exam_content).strip()
+    digest = hashlib.sha256()
+    digest.update(namespace.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalized.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Persistent on-disk cache of exam analyses keyed by exam fingerprint.
+
+    Backed by a single SQLite file. Reports are stored zlib-compressed and the
+    total stored size is kept under `max_bytes` by deleting the least recently
+    used rows. The database is opened lazily on first use.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analyses (
+                    key TEXT PRIMARY KEY,
+                    analysis BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_last_access_idx ON analyses(last_access)")
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Analysis cache opened at {self.path}")
+        return self._conn
+
+    def get(self, key):
+        """
+        Look up a cached analysis and mark it as recently used
+
+        Args:
+            key (str): Exam fingerprint
+
+        Returns:
+            str: The cached analysis, or None on a miss
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT analysis FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE analyses SET last_access = ? WHERE key = ?", (self._clock(), key))
+            conn.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, key, analysis):
+        """
+        Store an analysis and evict least recently used rows beyond the size limit
+
+        Args:
+            key (str): Exam fingerprint
+            analysis (str): Analysis text to cache
+        """
+        blob = zlib.compress(analysis.encode('utf-8'))
+        now = self._clock()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, analysis, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM analyses ORDER BY last_access ASC LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                conn.execute("DELETE FROM analyses WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+            conn.commit()
+
+    def stats(self):
+        """Return counters and current disk usage"""
+        with self._lock:
+            conn = self._connection()
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+            return {
+                "entries": entries,
+                "bytes": total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,14 +1,11 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from backend/.env, once, before other modules read them
+load_dotenv(Path(__file__).parent.parent / '.env')
 
 # API configurations
 API_CONFIG = {
     "gemini_api_key": os.getenv("GEMINI_API_KEY"),
 }
-
-# Validate required configurations
-if not API_CONFIG["gemini_api_key"]:
-    raise ValueError("GEMINI_API_KEY is required in the .env file")
\ No newline at end of file
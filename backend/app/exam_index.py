@@ -0,0 +1,153 @@
+import logging
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Maximum characters per chunk; a lab marker line is never split
+CHUNK_MAX_CHARS = int(os.getenv("EXAM_CHUNK_MAX_CHARS", "600"))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r'[a-z0-9]+(?:[.,][0-9]+)?')
+
+# Words that carry no signal in a question about an exam
+STOPWORDS = frozenset("""
+    a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela para
+    com sem sobre entre e ou que se meu minha meus minhas seu sua seus suas esse essa
+    este esta isso isto ele ela eles elas eu voce nao sim mais menos muito pouco qual
+    quais quanto como quando onde porque ser estar estao sao foi tem ter ha
+    exame exames resultado resultados valor valores nivel niveis significa
+""".split())
+
+# Questions about the exam as a whole are answered from the full text
+BROAD_TERMS = frozenset("""
+    resumo resuma resumir geral todos todas tudo completo inteiro panorama
+    normais alterados alterado alterada alteradas anormal anormais
+""".split())
+
+
+def tokenize(text, min_length=2):
+    """Lowercase, accent-folded search terms of text, without stopwords"""
+    folded = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return [word for word in _WORD_RE.findall(folded)
+            if len(word) >= min_length and word not in STOPWORDS]
+
+
+def split_exam(text, max_chars=CHUNK_MAX_CHARS):
+    """
+    Split exam text into chunks along sections and marker lines
+
+    Blank lines delimit sections. A section longer than max_chars is cut
+    between lines, so each chunk holds whole marker lines.
+
+    Args:
+        text (str): Exam text as returned by extract_pdf_content
+        max_chars (int): Target maximum size of a chunk
+
+    Returns:
+        list: Chunk strings in document order
+    """
+    chunks = []
+    for section in re.split(r'\n\s*\n', text):
+        current = []
+        size = 0
+        for line in section.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if current and size + len(line) + 1 > max_chars:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append("\n".join(current))
+    return chunks
+
+
+class ExamIndex:
+    """
+    BM25 keyword index over the chunks of one exam.
+
+    Built once per exam and read-only afterwards, so it can be shared across
+    concurrent requests. `nbytes` is a rough estimate of its memory use.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self._term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self._lengths = [sum(freqs.values()) for freqs in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(chunks)) if chunks else 0.0
+        doc_freqs = Counter()
+        for freqs in self._term_freqs:
+            doc_freqs.update(freqs.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+        # Chunk text plus ~100 bytes per term entry (dict slot, key and count objects)
+        self.nbytes = sum(len(chunk) for chunk in chunks) + 100 * (
+            sum(len(freqs) for freqs in self._term_freqs) + len(self._idf)
+        )
+
+    def search(self, query, top_k=5):
+        """
+        Rank chunks against a query
+
+        Args:
+            query (str): User question
+            top_k (int): Maximum number of chunks returned
+
+        Returns:
+            list: (chunk position, score) pairs with a positive score, best first
+        """
+        terms = [term for term in tokenize(query) if term in self._idf]
+        if not terms:
+            return []
+
+        scores = []
+        for position, freqs in enumerate(self._term_freqs):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[position] / self._avg_length)
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((position, score))
+
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:top_k]
+
+    def excerpts(self, query, top_k=5):
+        """
+        Text of the chunks most relevant to query, joined in document order
+
+        Returns:
+            str: Matching chunks, or an empty string when nothing matches
+        """
+        positions = sorted(position for position, _ in self.search(query, top_k))
+        return "\n[...]\n".join(self.chunks[position] for position in positions)
+
+
+def is_broad_question(question):
+    """True when the question is about the exam as a whole rather than specific markers"""
+    return any(term in BROAD_TERMS for term in tokenize(question))
+
+
+def build_index(exam_content):
+    """
+    Split an exam into chunks and index them
+
+    CPU-bound for large exams; callers on the event loop run it in a thread.
+    The index is kept with the exam's session (see SessionStore), so it
+    shares the session's memory budget and expiry.
+    """
+    index = ExamIndex(split_exam(exam_content))
+    logger.info(f"Indexed exam: {len(index.chunks)} chunks, ~{index.nbytes // 1024} KB")
+    return index
@@ -1,13 +1,33 @@
 import os
+import re
 import json
+import time
+import asyncio
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from typing import Optional
 import firebase_admin
 from firebase_admin import credentials, auth
+from google.auth import jwt
+
+from app import http_client
 
 # Set up logging
 logger = logging.getLogger("exam-analyzer-api")
 
+# Public certificates that sign Firebase ID tokens
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+# Verified tokens kept in memory (one entry per signed-in client)
+TOKEN_CACHE_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_ENTRIES", "10000"))
+# Bounds on the certificate refresh interval, whatever max-age Google sends
+CERT_REFRESH_MIN_SECONDS = float(os.getenv("AUTH_CERT_REFRESH_MIN_SECONDS", "60"))
+CERT_REFRESH_MAX_SECONDS = float(os.getenv("AUTH_CERT_REFRESH_MAX_SECONDS", "3600"))
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
 def initialize_firebase():
     """Initialize Firebase Admin SDK"""
     try:
@@ -34,20 +54,201 @@ def initialize_firebase():
         logger.error(f"Firebase initialization failed: {str(e)}")
         return False
 
-# Initialize Firebase when module loads
-firebase_initialized = initialize_firebase()
+# Set on first use by firebase_ready(), so importing this module stays cheap
+firebase_initialized = None
+_init_lock = threading.Lock()
+
+def firebase_ready() -> bool:
+    """Initialize Firebase on first call; True if it is configured"""
+    global firebase_initialized
+    if firebase_initialized is None:
+        with _init_lock:
+            if firebase_initialized is None:
+                firebase_initialized = initialize_firebase()
+    return firebase_initialized
+
+
+class VerifiedTokenCache:
+    """
+    In-memory LRU of decoded token claims, valid until the token's `exp`.
+
+    Entries are keyed by a SHA-256 of the token, so raw bearer tokens are not
+    kept in memory. Guarded by a lock; reads are cheap enough for the event loop.
+    """
+
+    def __init__(self, max_entries=10000, clock=time.time):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # token hash -> (claims, exp)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """Return the cached claims of a token, or None if unknown or expired"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, exp = entry
+            if exp <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        """Cache verified claims until their `exp` claim"""
+        exp = claims.get("exp")
+        if not exp:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CertificateStore:
+    """
+    Google's token signing certificates, prefetched and refreshed off the request path.
+
+    refresh() downloads the certificates through the shared HTTP client and
+    honors the max-age of the response; run() refreshes them in a background
+    task for the lifetime of the app.
+    """
+
+    def __init__(self, url=FIREBASE_CERTS_URL):
+        self.url = url
+        self._certs = {}
+        self.refreshes = 0
+        self.failures = 0
+
+    def get(self):
+        """Current certificates by key id (empty until the first refresh)"""
+        return self._certs
+
+    @property
+    def loaded(self):
+        """True once the certificates were downloaded"""
+        return bool(self._certs)
+
+    def refresh(self):
+        """
+        Download the certificates
+
+        Returns:
+            float: Seconds until the next refresh is due
+        """
+        response = http_client.get(self.url)
+        try:
+            response.raise_for_status()
+            certs = response.json()
+            match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+        finally:
+            response.close()
+
+        max_age = float(match.group(1)) if match else CERT_REFRESH_MAX_SECONDS
+        # Swapped in one assignment, so readers never see a partial set
+        self._certs = certs
+        self.refreshes += 1
+        logger.info(f"Firebase certificates refreshed: {len(certs)} keys, max-age {max_age:.0f}s")
+        # Refresh ahead of expiry so a token signed by a new key finds it
+        return min(max(max_age * 0.8, CERT_REFRESH_MIN_SECONDS), CERT_REFRESH_MAX_SECONDS)
+
+    async def run(self):
+        """Refresh the certificates forever; failures retry after CERT_REFRESH_MIN_SECONDS"""
+        while True:
+            try:
+                delay = await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Firebase certificate refresh failed: {str(e)}")
+                delay = CERT_REFRESH_MIN_SECONDS
+            await asyncio.sleep(delay)
+
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_ENTRIES)
+certificate_store = CertificateStore()
+
+def _project_id():
+    return firebase_admin.get_app().project_id
+
+def _verify_locally(token: str) -> Optional[dict]:
+    """
+    Verify an ID token against the prefetched certificates
+
+    Applies the same checks as auth.verify_id_token (RS256 signature, exp/iat,
+    audience, issuer, subject). Returns None when the certificates are not
+    loaded yet or lack the signing key, so the caller can fall back to the SDK.
+
+    Raises:
+        ValueError: If the token is invalid
+    """
+    certs = certificate_store.get()
+    if not certs:
+        return None
+    header = jwt.decode_header(token)
+    if header.get("kid") not in certs:
+        return None
+    if header.get("alg") != "RS256":
+        raise ValueError(f"Unexpected token algorithm: {header.get('alg')}")
+
+    project_id = _project_id()
+    claims = jwt.decode(token, certs=certs, audience=project_id)
+    if claims.get("iss") != FIREBASE_ISSUER_PREFIX + project_id:
+        raise ValueError("Token has an incorrect issuer")
+    subject = claims.get("sub")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise ValueError("Token has an invalid subject")
+    claims["uid"] = subject
+    return claims
+
+def cached_token_claims(token: str) -> Optional[dict]:
+    """Claims of an already verified, unexpired token; None if it must be verified"""
+    if not firebase_ready():
+        return None
+    return token_cache.get(token)
 
 def verify_firebase_token(token: str) -> Optional[dict]:
-    """Verify Firebase ID token"""
-    if not firebase_initialized:
+    """
+    Verify Firebase ID token
+
+    Verified claims are cached until the token expires. Tokens signed by a key
+    missing from the prefetched certificates go through auth.verify_id_token.
+    """
+    if not firebase_ready():
         logger.warning("Firebase not initialized - running in test mode")
         return {"uid": "test-uid", "email": "test@example.com"}
-    
+
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
     try:
-        return auth.verify_id_token(token)
-    except auth.InvalidIdTokenError:
+        claims = _verify_locally(token)
+        if claims is None:
+            claims = auth.verify_id_token(token)
+    except (auth.InvalidIdTokenError, ValueError):
         logger.error("Invalid Firebase ID token")
         return None
     except Exception as e:
         logger.error(f"Token verification failed: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+    token_cache.put(token, claims)
+    return claims
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from .metrics import observe_stage, stage
+from .rate_limiter import RateLimiter
+from .token_budget import count_tokens
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Errors worth retrying: quota exhaustion (429) and temporary unavailability (503)
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+)
+
+
+class GeminiAPI:
+    """
+    Shared entry point for every Gemini call made by the agents.
+
+    GenerativeModel objects are created once per model name and reused, so
+    all calls go through the transport configured by genai.configure().
+    The SDK itself is imported and configured with `api_key` on first use
+    (see sdk()); without an api_key the existing configuration is kept.
+    Each call first waits on the RPM/TPM limiter, then retries 429/503
+    responses with exponential backoff and full jitter. At most
+    `max_concurrency` requests are in flight at once across all agents.
+    """
+
+    def __init__(self, model_name, generation_config, rpm=60, tpm=1_000_000,
+                 max_retries=3, backoff_base=1.0, backoff_max=30.0,
+                 limiter=None, sleep=asyncio.sleep, max_concurrency=8, api_key=None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.generation_config = generation_config
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = limiter or RateLimiter(rpm, tpm)
+        self.max_concurrency = max_concurrency
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self._sleep = sleep
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._genai = None
+        self.calls = 0
+        self.retries = 0
+
+    def sdk(self):
+        """The google.generativeai module, imported and configured on first use"""
+        with self._models_lock:
+            return self._sdk()
+
+    def _sdk(self):
+        if self._genai is None:
+            # Importing google.generativeai takes about half a second, most of
+            # the API's import time, so it is deferred until the first call
+            import google.generativeai as genai
+            if self.api_key:
+                genai.configure(api_key=self.api_key)
+            self._genai = genai
+        return self._genai
+
+    @property
+    def ready(self):
+        """True once the SDK is loaded and the default model created"""
+        return self.model_name in self._models
+
+    def model(self, model_name=None):
+        """Return the cached GenerativeModel for model_name (default: the configured model)"""
+        model_name = model_name or self.model_name
+        with self._models_lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._sdk().GenerativeModel(model_name)
+                self._models[model_name] = model
+            return model
+
+    async def generate(self, prompt, safety_settings=None, stream=False, tokens=None):
+        """
+        Rate-limited, retried generate_content_async
+
+        Args:
+            prompt (str): Prompt text
+            safety_settings (list, optional): Safety settings for this call
+            stream (bool): Return a streamed response (only the initial call is retried)
+            tokens (int, optional): Token estimate for the limiter; estimated from the prompt if omitted
+
+        Returns:
+            The Gemini response (async iterable of chunks when stream=True)
+        """
+        tokens = tokens if tokens is not None else count_tokens(prompt)
+        self.calls += 1
+
+        kwargs = {"generation_config": self.generation_config}
+        if safety_settings is not None:
+            kwargs["safety_settings"] = safety_settings
+        if stream:
+            kwargs["stream"] = True
+
+        attempt = 0
+        while True:
+            # Every attempt counts against the quota, retries included
+            with stage("gemini_rate_limit"):
+                await self.limiter.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                # For streams only the initial request holds a slot
+                async with self._concurrency:
+                    response = await self.model().generate_content_async(contents=prompt, **kwargs)
+                observe_stage("gemini_call", time.perf_counter() - started)
+                return response
+            except RETRYABLE_ERRORS as e:
+                observe_stage("gemini_call", time.perf_counter() - started, "retryable_error")
+                if attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Gemini API returned {type(e).__name__}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await self._sleep(delay)
+            except Exception:
+                observe_stage("gemini_call", time.perf_counter() - started, "error")
+                raise
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            **self.limiter.stats(),
+        }
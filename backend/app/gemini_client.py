@@ -1,35 +1,160 @@
-import google.generativeai as genai
+import asyncio
 import os
 import logging
-from dotenv import load_dotenv
-from .scrapers import MedicationInfoScraper, MedicationPriceScraper
-
-from dotenv import load_dotenv
 from pathlib import Path
-
-# Carrega o .env.local prioritariamente, fallback para .env
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path if env_path.exists() else Path(__file__).parent.parent / '.env')
+from .config import API_CONFIG
+from .scrapers import MedicationInfoScraper, MedicationPriceScraper
+from .session_store import SessionStore
+from .analysis_cache import AnalysisCache, exam_fingerprint
+from .medication_names import MedicationNameIndex, fold_name
+from .price_catalog import PriceCatalog
+from .response_cache import ResponseCache
+from .singleflight import SingleFlight
+from .gemini_api import GeminiAPI
+from .token_budget import fit_prompt, truncate_to_tokens, count_tokens
+from .exam_index import build_index, is_broad_question
+from .lab_markers import parse_markers, answer_from_markers, format_marker_table, strip_marker_rows
 
 # Set up logger
 logger = logging.getLogger("exam-analyzer-api")
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Gemini API key; the SDK is configured with it on first use (see warm_up)
+GEMINI_API_KEY = API_CONFIG["gemini_api_key"]
 if not GEMINI_API_KEY:
     logger.error("GEMINI_API_KEY not found in environment variables")
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-
-# Configure the Gemini API with the key
-genai.configure(api_key=GEMINI_API_KEY)
 
 # Define the fully qualified model name with generation config
 # Use the correct model name format
 MODEL_NAME = "models/gemini-1.5-pro"
 
-# In-memory storage for exam data - this will map session_id to exam content
-# In a production system, you'd likely use a database or Redis instead
-exam_storage = {}
+# Generation settings shared by every agent
+GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+# Safety settings used for exam analysis
+SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    }
+]
+
+# Single Gemini layer shared by every agent: reuses the model object and
+# applies client-side RPM/TPM and concurrency limits plus backoff on 429/503
+gemini = GeminiAPI(
+    MODEL_NAME,
+    GENERATION_CONFIG,
+    rpm=int(os.getenv("GEMINI_RPM", "60")),
+    tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    api_key=GEMINI_API_KEY,
+)
+
+# In-memory storage for exam data - this will map session_id to exam content.
+# Bounded by entry count and compressed bytes, with idle expiry, so worker
+# memory stays flat no matter how many exams are uploaded.
+exam_storage = SessionStore(
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "1000")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600")),
+)
+
+# Persistent content-addressed cache of exam analyses, so re-uploads of the
+# same PDF skip the Gemini call
+analysis_cache = AnalysisCache(
+    os.getenv("ANALYSIS_CACHE_PATH", str(Path(__file__).parent.parent / ".cache" / "analysis_cache.sqlite3")),
+    max_bytes=int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+# Follow-up questions about exams larger than this (estimated tokens) are
+# answered from the top-k matching chunks instead of the whole text
+EXAM_RETRIEVAL_MIN_TOKENS = int(os.getenv("EXAM_RETRIEVAL_MIN_TOKENS", "1500"))
+EXAM_RETRIEVAL_TOP_K = int(os.getenv("EXAM_RETRIEVAL_TOP_K", "6"))
+# Size of the earlier analysis included with retrieved chunks
+ANALYSIS_SUMMARY_TOKENS = int(os.getenv("ANALYSIS_SUMMARY_TOKENS", "400"))
+
+# Formatted medication answers: info changes rarely, prices within hours
+medication_info_cache = ResponseCache(
+    "medication-info",
+    ttl=float(os.getenv("MEDICATION_INFO_TTL_SECONDS", str(3 * 24 * 3600))),
+    stale_ttl=float(os.getenv("MEDICATION_INFO_STALE_SECONDS", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("MEDICATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+medication_prices_cache = ResponseCache(
+    "medication-prices",
+    ttl=float(os.getenv("MEDICATION_PRICES_TTL_SECONDS", str(6 * 3600))),
+    stale_ttl=float(os.getenv("MEDICATION_PRICES_STALE_SECONDS", str(24 * 3600))),
+    max_bytes=int(os.getenv("MEDICATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+
+# Local index of scraped prices, kept fresh for the most requested medications
+# by PriceCatalogRefresher; price lookups scrape live only when it misses
+price_catalog = PriceCatalog(
+    os.getenv("PRICE_CATALOG_PATH", str(Path(__file__).parent.parent / ".cache" / "price_catalog.sqlite3")),
+    max_age=float(os.getenv("PRICE_CATALOG_MAX_AGE_SECONDS", str(6 * 3600))),
+)
+
+# Known medication names: spelling variants and typos resolve to one canonical
+# name before any cache lookup or scrape
+medication_names = MedicationNameIndex(
+    os.getenv("MEDICATION_NAMES_PATH", str(Path(__file__).parent / "data" / "medications.txt"))
+)
+
+# Identical concurrent lookups (same endpoint and medication) share one
+# scrape-and-format pipeline
+medication_lookups = SingleFlight("medication-lookups")
+
+# Scrapers are stateless between searches and share one pooled HTTP client,
+# so a single instance of each serves every request
+medication_info_scraper = MedicationInfoScraper()
+medication_price_scraper = MedicationPriceScraper()
+
+def normalize_medication_name(medication_name):
+    """Cache key for a medication: case, accents and extra whitespace are ignored"""
+    return fold_name(medication_name)
+
+def _resolve_medication_name(safe_medication_name):
+    """Canonical spelling of a medication name, or None when the input is obviously not one"""
+    name, matched = medication_names.resolve(safe_medication_name)
+    if matched and normalize_medication_name(name) != normalize_medication_name(safe_medication_name):
+        logger.info(f"Medication name '{safe_medication_name}' resolved to '{name}'")
+    return name
+
+def _not_a_medication_answer(safe_medication_name):
+    """Answer for input that names no medication, given without scraping or calling Gemini"""
+    return (
+        f"Não reconheci \"{safe_medication_name.strip()}\" como o nome de um medicamento. "
+        "Confira a grafia e informe apenas o nome do remédio, se quiser com a dosagem "
+        "(por exemplo, \"dipirona\" ou \"losartana 50mg\")."
+    )
+
+def warm_up():
+    """
+    Import and configure the Gemini SDK ahead of the first request
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set
+    """
+    if not GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    gemini.model()
 
 def get_available_models():
     """
@@ -37,7 +162,7 @@ def get_available_models():
     """
     try:
         logger.info("Listing available Gemini models")
-        models = genai.list_models()
+        models = gemini.sdk().list_models()
         model_names = [model.name for model in models]
         logger.info(f"Available models: {model_names}")
         return model_names
@@ -45,37 +170,69 @@ def get_available_models():
         logger.error(f"Error listing Gemini models: {str(e)}")
         return []
 
-def analyze_exam(exam_content, session_id=None):
+async def _store_exam(exam_content, session_id=None, markers=None, analysis=None):
     """
-    Agent 1: Send exam content to Gemini API for analysis
+    Normalize exam content to UTF-8 text and store it under session_id
+    
+    The lab marker table, the search index and the analysis, when already
+    known, are stored with the session; when the caller has no markers (e.g.
+    the text did not come from extract_exam_content) they are parsed from the
+    text lines. Parsing and indexing run in a worker thread.
     
-    Args:
-        exam_content (str): Extracted text content from the exam PDF
-        session_id (str, optional): Session ID to store exam content for follow-up questions
-        
     Returns:
-        str: Analysis results from Gemini
+        str: The normalized exam content
     """
-    logger.info(f"Initializing Gemini model for exam analysis using model: {MODEL_NAME}")
+    # Ensure exam_content is properly encoded as UTF-8
+    if not isinstance(exam_content, str):
+        logger.warning("Converting exam_content to string with UTF-8 encoding")
+        exam_content = str(exam_content).encode('utf-8', 'ignore').decode('utf-8')
     
-    try:
-        # Ensure exam_content is properly encoded as UTF-8
-        if not isinstance(exam_content, str):
-            logger.warning("Converting exam_content to string with UTF-8 encoding")
-            exam_content = str(exam_content).encode('utf-8', 'ignore').decode('utf-8')
-        
-        # Store exam content for future reference if session_id is provided
-        if session_id:
-            # Ensure session_id is properly encoded as UTF-8
-            safe_session_id = str(session_id).encode('utf-8', 'ignore').decode('utf-8')
-            logger.info(f"Storing exam content for session: {safe_session_id}")
-            exam_storage[safe_session_id] = exam_content
-        
-        # Initialize the Gemini model with the correct model name format
-        model = genai.GenerativeModel(MODEL_NAME)
-        
-        # Create prompt for analysis - ensuring UTF-8 encoding
-        prompt = f"""
+    if session_id:
+        # Ensure session_id is properly encoded as UTF-8
+        safe_session_id = str(session_id).encode('utf-8', 'ignore').decode('utf-8')
+        logger.info(f"Storing exam content for session: {safe_session_id}")
+        await asyncio.to_thread(_store_exam_session, safe_session_id, exam_content, markers, analysis)
+    
+    return exam_content
+
+async def _store_analysis(session_id, analysis):
+    """Attach an exam's analysis to its session, where follow-up questions read it"""
+    if session_id and analysis:
+        safe_session_id = str(session_id).encode('utf-8', 'ignore').decode('utf-8')
+        await asyncio.to_thread(exam_storage.set_analysis, safe_session_id, analysis)
+
+def _store_exam_session(session_id, exam_content, markers, analysis=None):
+    """Parse missing markers and index the exam, then store them with the session"""
+    if markers is None:
+        markers = parse_markers(exam_content.splitlines())
+    # Indexed now so follow-up questions only pay for the search
+    exam_storage.put(session_id, exam_content, markers, build_index(exam_content), analysis)
+
+def _response_text(response):
+    """Extract the UTF-8 safe text from a Gemini response or streamed chunk"""
+    response_text = ""
+    if hasattr(response, 'text'):
+        response_text = response.text
+    elif hasattr(response, 'parts'):
+        # For newer API versions that might use parts
+        response_text = ''.join(part.text for part in response.parts)
+    else:
+        # Fallback to string representation
+        response_text = str(response)
+    
+    # Ensure the response is properly encoded UTF-8
+    return str(response_text).encode('utf-8', 'ignore').decode('utf-8')
+
+async def _stream_text(response):
+    """Yield the text of each chunk of a streamed Gemini response as it arrives"""
+    async for chunk in response:
+        text = _response_text(chunk)
+        if text:
+            yield text
+
+def _build_exam_analysis_prompt(exam_content):
+    """Build the Agent 1 prompt for a full exam analysis"""
+    prompt = f"""
         Você é um assistente médico especializado em interpretação de exames.
 
         Analise o conteúdo a seguir e responda seguindo exatamente esta estrutura de seções:
@@ -110,60 +267,336 @@ def analyze_exam(exam_content, session_id=None):
         EXAME:
         {exam_content}
         """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_exam_question_prompt(exam_content, safe_question):
+    """Build the prompt for a follow-up question about a stored exam"""
+    prompt = f"""
+        Você é um assistente médico especializado em interpretação de exames.
         
-        # Ensure prompt is properly encoded UTF-8
-        prompt = str(prompt).encode('utf-8', 'ignore').decode('utf-8')
-        logger.info("Sending exam analysis request to Gemini API")
+        O usuário enviou o seguinte exame médico:
         
-        # Use the generate_content method with safety settings
-        generation_config = {
-            "temperature": 0.4,
-            "top_p": 0.8,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
+        {exam_content}
         
-        safety_settings = [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
+        Agora o usuário fez a seguinte pergunta sobre esse exame:
+        
+        "{safe_question}"
+        
+        Instruções:
+        
+        1. Responda apenas com base nas informações contidas no exame.
+        2. Se a pergunta se referir a um marcador ou valor específico, destaque esse valor em negrito e explique seu significado.
+        3. Se a pergunta for sobre uma condição médica relacionada, explique como os valores no exame podem ou não estar associados.
+        4. Use linguagem clara, didática e acessível, evitando termos técnicos desnecessários.
+        5. Não dê diagnósticos definitivos, apenas explicações e interpretações dos dados disponíveis.
+        6. Se a pergunta não puder ser respondida com os dados do exame, indique isso claramente.
+        
+        Sua resposta deve ser escrita de forma leve, gentil e didática, sem causar alarme desnecessário.
+        """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_exam_excerpts_prompt(exam_excerpts, analysis_summary, safe_question):
+    """Build the prompt for a follow-up question answered from retrieved exam excerpts"""
+    prompt = f"""
+        Você é um assistente médico especializado em interpretação de exames.
+        
+        Resumo da análise já feita sobre o exame do usuário:
+        
+        {analysis_summary}
+        
+        Trechos do exame relacionados à pergunta:
+        
+        {exam_excerpts}
+        
+        Agora o usuário fez a seguinte pergunta sobre esse exame:
+        
+        "{safe_question}"
+        
+        Instruções:
+        
+        1. Responda apenas com base nas informações contidas nos trechos e no resumo do exame.
+        2. Se a pergunta se referir a um marcador ou valor específico, destaque esse valor em negrito e explique seu significado.
+        3. Se a pergunta for sobre uma condição médica relacionada, explique como os valores no exame podem ou não estar associados.
+        4. Use linguagem clara, didática e acessível, evitando termos técnicos desnecessários.
+        5. Não dê diagnósticos definitivos, apenas explicações e interpretações dos dados disponíveis.
+        6. Se a pergunta não puder ser respondida com os dados do exame, indique isso claramente.
+        
+        Sua resposta deve ser escrita de forma leve, gentil e didática, sem causar alarme desnecessário.
+        """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_exam_table_prompt(marker_table, exam_excerpts, analysis_summary, safe_question):
+    """Build the prompt for a follow-up question answered from the exam's marker table"""
+    prompt = f"""
+        Você é um assistente médico especializado em interpretação de exames.
+        
+        Resultados do exame do usuário (marcador: valor unidade, referência e situação):
+        
+        {marker_table}
+        
+        Outros trechos do exame (fora da tabela):
+        
+        {exam_excerpts}
+        
+        Resumo da análise já feita sobre o exame:
+        
+        {analysis_summary}
+        
+        Agora o usuário fez a seguinte pergunta sobre esse exame:
+        
+        "{safe_question}"
+        
+        Instruções:
+        
+        1. Responda apenas com base nas informações contidas nos resultados, nos trechos e no resumo do exame.
+        2. Se a pergunta se referir a um marcador ou valor específico, destaque esse valor em negrito e explique seu significado.
+        3. Se a pergunta for sobre uma condição médica relacionada, explique como os valores no exame podem ou não estar associados.
+        4. Use linguagem clara, didática e acessível, evitando termos técnicos desnecessários.
+        5. Não dê diagnósticos definitivos, apenas explicações e interpretações dos dados disponíveis.
+        6. Se a pergunta não puder ser respondida com os dados do exame, indique isso claramente.
+        
+        Sua resposta deve ser escrita de forma leve, gentil e didática, sem causar alarme desnecessário.
+        """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _analysis_summary(analysis):
+    """Head of the earlier analysis stored with the exam's session"""
+    return truncate_to_tokens(analysis, ANALYSIS_SUMMARY_TOKENS) if analysis else "Não disponível."
+
+async def _fit_exam_question_prompt(exam_content, safe_question, markers=None, index=None, analysis=None):
+    """
+    Build the follow-up prompt from the compact parts of the exam relevant to the question
+    
+    Exams with a marker table are sent as the table plus the chunks matching
+    the question; broad questions ("resuma o exame") and questions that match
+    no chunk get every line outside the table instead, so imaging reports,
+    qualitative results and notes are kept. Otherwise large exams are sent as
+    the matching chunks; small exams, broad questions and questions that
+    match no chunk fall back to the whole exam text. `index` is the exam's stored
+    search index; without one it is built in a worker thread when needed.
+    `analysis` is the earlier analysis stored with the session.
+    
+    Returns:
+        tuple: (prompt, estimated input tokens)
+    """
+    broad = is_broad_question(safe_question)
+    
+    async def excerpts():
+        exam_index = index if index is not None else await asyncio.to_thread(build_index, exam_content)
+        return exam_index.excerpts(safe_question, EXAM_RETRIEVAL_TOP_K)
+    
+    if markers:
+        # Rows already in the table are dropped from the excerpts
+        exam_excerpts = "" if broad else await excerpts()
+        if exam_excerpts:
+            exam_excerpts = strip_marker_rows(exam_excerpts)
+        else:
+            exam_excerpts = await asyncio.to_thread(strip_marker_rows, exam_content)
+        logger.info(f"Answering follow-up question from the table of {len(markers)} lab markers")
+        return fit_prompt(
+            "exam_question",
+            _build_exam_table_prompt,
             {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+                "marker_table": format_marker_table(markers),
+                "exam_excerpts": exam_excerpts or "Nenhum.",
+                "analysis_summary": _analysis_summary(analysis),
+                "safe_question": safe_question,
             },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            }
-        ]
-        
-        response = model.generate_content(
-            contents=prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
+            priority=["safe_question", "marker_table", "exam_excerpts", "analysis_summary"]
         )
+    
+    if count_tokens(exam_content) > EXAM_RETRIEVAL_MIN_TOKENS and not broad:
+        exam_excerpts = await excerpts()
+        if exam_excerpts:
+            logger.info("Answering follow-up question from retrieved exam excerpts")
+            return fit_prompt(
+                "exam_question",
+                _build_exam_excerpts_prompt,
+                {
+                    "exam_excerpts": exam_excerpts,
+                    "analysis_summary": _analysis_summary(analysis),
+                    "safe_question": safe_question,
+                },
+                priority=["safe_question", "exam_excerpts", "analysis_summary"]
+            )
+    
+    return fit_prompt(
+        "exam_question",
+        _build_exam_question_prompt,
+        {"exam_content": exam_content, "safe_question": safe_question},
+        priority=["safe_question", "exam_content"]
+    )
+
+def _build_medication_info_prompt(safe_medication_name, content, source):
+    """Build the Agent 2 prompt that reformats scraped medication information"""
+    prompt = f"""
+            Você é um assistente especializado em informações sobre medicamentos.
+            
+            Abaixo estão informações coletadas de uma fonte confiável sobre o medicamento "{safe_medication_name}".
+            Por favor, reformate e organize estas informações em uma resposta clara e didática.
+            
+            Inclua as seguintes seções:
+            
+            1. Descrição geral e propósito do medicamento
+            2. Princípios ativos principais
+            3. Indicações de uso
+            4. Contraindicações
+            5. Efeitos colaterais comuns
+            6. Interações medicamentosas relevantes (se disponível)
+            7. Dosagem típica (se disponível)
+            8. Precauções especiais
+            
+            Informações coletadas:
+            {content}
+            
+            Fonte: {source}
+            
+            Observação: Esta informação tem caráter educativo e não substitui a orientação de um profissional de saúde ou a bula oficial do medicamento.
+            """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_medication_info_fallback_prompt(safe_medication_name):
+    """Build the Agent 2 prompt used when no source could be scraped"""
+    prompt = f"""
+            Você é um assistente especializado em informações sobre medicamentos.
+            
+            Forneça informações detalhadas sobre o medicamento "{safe_medication_name}" em português.
+            Inclua as seguintes informações:
+            
+            1. Descrição geral e propósito do medicamento
+            2. Princípios ativos principais
+            3. Indicações de uso
+            4. Contraindicações
+            5. Efeitos colaterais comuns
+            6. Interações medicamentosas relevantes
+            7. Dosagem típica (adulto e infantil, se aplicável)
+            8. Precauções especiais
+            
+            Sua resposta deve ser informativa, mas também acessível para pacientes sem conhecimento médico avançado.
+            
+            Importante: Indique claramente que esta informação tem caráter educativo e não substitui a orientação de um profissional de saúde ou a bula oficial do medicamento.
+            """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_medication_prices_prompt(safe_medication_name, product_text, sources):
+    """Build the Agent 3 prompt that summarizes scraped prices"""
+    prompt = f"""
+            Você é um assistente especializado em informações sobre preços de medicamentos no Brasil.
+            
+            Abaixo estão informações coletadas sobre preços do medicamento "{safe_medication_name}" de diferentes fontes.
+            Por favor, analise estas informações e forneça um resumo claro e útil sobre os preços encontrados.
+            
+            Inclua:
+            
+            1. Faixa de preço encontrada (menor e maior preço)
+            2. Preço médio aproximado
+            3. Diferenças entre versões do medicamento (genérico, similar, referência), se identificáveis
+            4. Sugestões para economizar na compra deste medicamento
+            5. Onde encontrar os melhores preços com base nos dados
+            
+            Produtos encontrados:
+            {product_text}
+            
+            Fontes consultadas: {sources}
+            
+            Observação: Os preços podem variar de acordo com a região e período de consulta.
+            """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_medication_prices_fallback_prompt(safe_medication_name):
+    """Build the Agent 3 prompt used when no prices could be scraped"""
+    prompt = f"""
+            Você é um assistente especializado em informações sobre preços de medicamentos no Brasil.
+            
+            Forneça informações sobre preços e disponibilidade do medicamento "{safe_medication_name}" em português.
+            Inclua as seguintes informações:
+            
+            1. Faixa de preço típica para este medicamento
+            2. Versões disponíveis (genérico, similar, referência)
+            3. Diferenças de preço entre as versões
+            4. Dicas para economizar na compra deste medicamento
+            5. Programas de desconto disponíveis (se aplicável)
+            6. Onde encontrar o medicamento pelo melhor preço
+            
+            Sua resposta deve ser prática e orientada para ajudar o paciente a encontrar o medicamento pelo melhor preço possível.
+            
+            Importante: Indique claramente que esta informação tem caráter orientativo e que os preços podem variar de acordo com a região e o período.
+            """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+def _build_general_question_prompt(safe_question):
+    """Build the Agent 4 prompt for a general health question"""
+    prompt = f"""
+        Você é um assistente especializado em assuntos relacionados à saúde.
+        
+        Responda à seguinte pergunta de saúde em português de forma clara e acessível:
+        
+        "{safe_question}"
+        
+        Sua resposta deve:
+        1. Ser baseada em informações médicas precisas
+        2. Ser compreensível para pessoas sem conhecimento médico avançado
+        3. Ser equilibrada e não alarmista
+        4. Incluir ressalvas quando apropriado
+        5. Sugerir quando seria adequado consultar um profissional de saúde
+        
+        Lembre-se de que está fornecendo informações gerais, não aconselhamento médico personalizado.
+        """
+    # Ensure prompt is properly encoded UTF-8
+    return str(prompt).encode('utf-8', 'ignore').decode('utf-8')
+
+async def analyze_exam(exam_content, session_id=None, markers=None):
+    """
+    Agent 1: Send exam content to Gemini API for analysis
+    
+    Args:
+        exam_content (str): Extracted text content from the exam PDF
+        session_id (str, optional): Session ID to store exam content for follow-up questions
+        markers (list, optional): Lab marker table from extract_exam_content
+        
+    Returns:
+        str: Analysis results from Gemini
+    """
+    logger.info(f"Initializing Gemini model for exam analysis using model: {MODEL_NAME}")
+    
+    try:
+        # Store exam content for future reference if session_id is provided
+        exam_content = await _store_exam(exam_content, session_id, markers)
+        
+        # Duplicate uploads of the same exam reuse the stored report
+        cache_key = exam_fingerprint(exam_content, MODEL_NAME)
+        cached_analysis = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached_analysis:
+            logger.info(f"Serving cached exam analysis: {cache_key[:12]}")
+            await _store_analysis(session_id, cached_analysis)
+            return cached_analysis
+        
+        # Create prompt for analysis - ensuring UTF-8 encoding
+        prompt, prompt_tokens = fit_prompt(
+            "exam_analysis",
+            _build_exam_analysis_prompt,
+            {"exam_content": exam_content},
+            priority=["exam_content"]
+        )
+        logger.info("Sending exam analysis request to Gemini API")
+        
+        response = await gemini.generate(prompt, safety_settings=SAFETY_SETTINGS, tokens=prompt_tokens)
         
         logger.info("Received exam analysis response from Gemini API")
         
         # Return the response text, ensuring it's UTF-8 encoded
-        response_text = ""
-        if hasattr(response, 'text'):
-            response_text = response.text
-        elif hasattr(response, 'parts'):
-            # For newer API versions that might use parts
-            response_text = ''.join(part.text for part in response.parts)
-        else:
-            # Fallback to string representation
-            response_text = str(response)
-        
-        # Ensure the response is properly encoded UTF-8
-        response_text = str(response_text).encode('utf-8', 'ignore').decode('utf-8')
-            
+        response_text = _response_text(response)
+        if response_text:
+            await asyncio.to_thread(analysis_cache.put, cache_key, response_text)
+            await _store_analysis(session_id, response_text)
         return response_text
         
     except Exception as e:
@@ -176,7 +609,112 @@ def analyze_exam(exam_content, session_id=None):
         
         raise Exception(f"Failed to analyze exam with Gemini API: {error_message}")
 
-def analyze_and_answer(question, session_id):
+async def analyze_exam_stream(exam_content, session_id=None, markers=None):
+    """
+    Streaming variant of analyze_exam: yields the analysis as Gemini generates it
+    
+    Args:
+        exam_content (str): Extracted text content from the exam PDF
+        session_id (str, optional): Session ID to store exam content for follow-up questions
+        markers (list, optional): Lab marker table from extract_exam_content
+        
+    Yields:
+        str: Consecutive chunks of the analysis text
+    """
+    logger.info(f"Initializing Gemini model for streamed exam analysis using model: {MODEL_NAME}")
+    
+    try:
+        # Store exam content for future reference if session_id is provided
+        exam_content = await _store_exam(exam_content, session_id, markers)
+        
+        # A cached report is sent as a single chunk
+        cache_key = exam_fingerprint(exam_content, MODEL_NAME)
+        cached_analysis = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached_analysis:
+            logger.info(f"Serving cached exam analysis: {cache_key[:12]}")
+            await _store_analysis(session_id, cached_analysis)
+            yield cached_analysis
+            return
+        
+        prompt, prompt_tokens = fit_prompt(
+            "exam_analysis",
+            _build_exam_analysis_prompt,
+            {"exam_content": exam_content},
+            priority=["exam_content"]
+        )
+        logger.info("Sending streaming exam analysis request to Gemini API")
+        
+        response = await gemini.generate(prompt, safety_settings=SAFETY_SETTINGS, stream=True, tokens=prompt_tokens)
+        
+        chunks = []
+        async for text in _stream_text(response):
+            chunks.append(text)
+            yield text
+        
+        logger.info("Received exam analysis response from Gemini API")
+        if chunks:
+            analysis = ''.join(chunks)
+            await asyncio.to_thread(analysis_cache.put, cache_key, analysis)
+            await _store_analysis(session_id, analysis)
+        
+    except Exception as e:
+        logger.error(f"Error in Gemini API request for exam analysis: {str(e)}")
+        raise Exception(f"Failed to analyze exam with Gemini API: {str(e)}")
+
+async def analyze_exam_batch(exams, session_id=None):
+    """
+    Agent 1 over several exams of the same patient
+    
+    Each exam is analyzed on its own and concurrently; the shared Gemini layer
+    bounds how many calls are in flight. The exams are then stored together
+    under session_id with their joined analyses, so follow-up questions can
+    refer to all of them. The joined text was never analyzed as one document,
+    so it is not written to the analysis cache.
+    
+    Args:
+        exams (list): (filename, exam text, lab markers or None) tuples
+        session_id (str, optional): Session ID for the combined exams
+        
+    Returns:
+        list: One dict per exam with the filename and either "analysis" or "error"
+    """
+    logger.info(f"Analyzing batch of {len(exams)} exams")
+    
+    async def analyze_one(filename, exam_content, markers):
+        try:
+            return {"filename": filename, "analysis": await analyze_exam(exam_content, markers=markers)}
+        except Exception as e:
+            logger.error(f"Error analyzing {filename} in batch: {str(e)}")
+            return {"filename": filename, "error": str(e)}
+    
+    results = await asyncio.gather(*[analyze_one(*exam) for exam in exams])
+    
+    if session_id and exams:
+        # Markers keep the name of the exam they came from
+        combined_markers = await asyncio.to_thread(_combine_markers, exams)
+        # The joined analyses serve as the summary for follow-up questions
+        combined_analysis = "\n\n".join(
+            f"=== EXAME: {result['filename']} ===\n{result['analysis']}" for result in results if result.get("analysis")
+        )
+        await _store_exam(
+            "\n\n".join(f"=== EXAME: {filename} ===\n{exam_content}" for filename, exam_content, _ in exams),
+            session_id,
+            combined_markers,
+            combined_analysis or None
+        )
+    
+    return results
+
+def _combine_markers(exams):
+    """Marker tables of a batch, each marker tagged with the exam it came from"""
+    combined_markers = []
+    for filename, exam_content, markers in exams:
+        if markers is None:
+            markers = parse_markers(exam_content.splitlines())
+        combined_markers.extend(dict(marker, exam=filename) for marker in markers)
+    return combined_markers
+
+async def analyze_and_answer(question, session_id):
     """
     Unified function that combines exam analysis with follow-up questions.
     Maintains context of the previously analyzed exam.
@@ -196,83 +734,92 @@ def analyze_and_answer(question, session_id):
     logger.info(f"Processing follow-up question for session {safe_session_id}: {safe_question}")
     
     try:
-        # Retrieve the stored exam content for this session
-        exam_content = exam_storage.get(safe_session_id)
+        # Retrieve the stored exam content for this session (decompressed off the event loop)
+        session = await asyncio.to_thread(exam_storage.get_entry, safe_session_id)
         
-        if not exam_content:
+        if not session or not session["exam_content"]:
             logger.warning(f"No exam content found for session {safe_session_id}")
             return "Não foi possível encontrar o exame associado a esta sessão. Por favor, envie o exame novamente."
         
-        # Initialize the Gemini model with the correct model name format
-        model = genai.GenerativeModel(MODEL_NAME)
+        # Plain value lookups are answered from the marker table without Gemini
+        local_answer = answer_from_markers(safe_question, session["markers"])
+        if local_answer:
+            return local_answer
         
-        # Create prompt that combines the exam content with the follow-up question
-        prompt = f"""
-        Você é um assistente médico especializado em interpretação de exames.
-        
-        O usuário enviou o seguinte exame médico:
+        # Create prompt that combines the relevant parts of the exam with the follow-up question
+        prompt, prompt_tokens = await _fit_exam_question_prompt(
+            session["exam_content"], safe_question, session["markers"], session["index"],
+            session["analysis"]
+        )
+        logger.info("Sending follow-up question to Gemini API")
         
-        {exam_content}
+        response = await gemini.generate(prompt, tokens=prompt_tokens)
         
-        Agora o usuário fez a seguinte pergunta sobre esse exame:
+        logger.info("Received follow-up question response from Gemini API")
         
-        "{safe_question}"
+        # Return the response text, ensuring it's UTF-8 encoded
+        return _response_text(response)
         
-        Instruções:
+    except Exception as e:
+        logger.error(f"Error in Gemini API request for follow-up question: {str(e)}")
+        raise Exception(f"Failed to answer follow-up question: {str(e)}")
+
+async def analyze_and_answer_stream(question, session_id):
+    """
+    Streaming variant of analyze_and_answer
+    
+    Args:
+        question (str): User's follow-up question about the exam
+        session_id (str): Session ID to retrieve the stored exam content
         
-        1. Responda apenas com base nas informações contidas no exame.
-        2. Se a pergunta se referir a um marcador ou valor específico, destaque esse valor em negrito e explique seu significado.
-        3. Se a pergunta for sobre uma condição médica relacionada, explique como os valores no exame podem ou não estar associados.
-        4. Use linguagem clara, didática e acessível, evitando termos técnicos desnecessários.
-        5. Não dê diagnósticos definitivos, apenas explicações e interpretações dos dados disponíveis.
-        6. Se a pergunta não puder ser respondida com os dados do exame, indique isso claramente.
+    Yields:
+        str: Consecutive chunks of the answer text
+    """
+    safe_session_id = str(session_id).encode('utf-8', 'ignore').decode('utf-8')
+    safe_question = str(question).encode('utf-8', 'ignore').decode('utf-8')
+    
+    logger.info(f"Processing streamed follow-up question for session {safe_session_id}: {safe_question}")
+    
+    try:
+        session = await asyncio.to_thread(exam_storage.get_entry, safe_session_id)
         
-        Sua resposta deve ser escrita de forma leve, gentil e didática, sem causar alarme desnecessário.
-        """
+        if not session or not session["exam_content"]:
+            logger.warning(f"No exam content found for session {safe_session_id}")
+            yield "Não foi possível encontrar o exame associado a esta sessão. Por favor, envie o exame novamente."
+            return
         
-        # Ensure prompt is properly encoded UTF-8
-        prompt = str(prompt).encode('utf-8', 'ignore').decode('utf-8')
-        logger.info("Sending follow-up question to Gemini API")
+        local_answer = answer_from_markers(safe_question, session["markers"])
+        if local_answer:
+            yield local_answer
+            return
         
-        # Use the generate_content method with configuration
-        generation_config = {
-            "temperature": 0.4,
-            "top_p": 0.8,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
-        
-        response = model.generate_content(
-            contents=prompt,
-            generation_config=generation_config
+        prompt, prompt_tokens = await _fit_exam_question_prompt(
+            session["exam_content"], safe_question, session["markers"], session["index"],
+            session["analysis"]
         )
+        logger.info("Sending streaming follow-up question to Gemini API")
         
-        logger.info("Received follow-up question response from Gemini API")
+        response = await gemini.generate(prompt, stream=True, tokens=prompt_tokens)
         
-        # Return the response text, ensuring it's UTF-8 encoded
-        response_text = ""
-        if hasattr(response, 'text'):
-            response_text = response.text
-        elif hasattr(response, 'parts'):
-            # For newer API versions that might use parts
-            response_text = ''.join(part.text for part in response.parts)
-        else:
-            # Fallback to string representation
-            response_text = str(response)
+        async for text in _stream_text(response):
+            yield text
         
-        # Ensure the response is properly encoded UTF-8
-        response_text = str(response_text).encode('utf-8', 'ignore').decode('utf-8')
-            
-        return response_text
+        logger.info("Received follow-up question response from Gemini API")
         
     except Exception as e:
         logger.error(f"Error in Gemini API request for follow-up question: {str(e)}")
         raise Exception(f"Failed to answer follow-up question: {str(e)}")
 
-def search_medication_info(medication_name):
+async def search_medication_info(medication_name):
     """
     Agent 2: Search for medication information using web scraping + Gemini
     
+    Answers are cached per normalized medication name; stale answers are
+    served immediately while a background refresh runs. Concurrent lookups
+    of the same medication share a single scrape and Gemini call. The name
+    is first resolved against the known medication names; input that is
+    obviously not a medication is answered without scraping.
+    
     Args:
         medication_name (str): Name of the medication to look up
         
@@ -283,10 +830,26 @@ def search_medication_info(medication_name):
     safe_medication_name = str(medication_name).encode('utf-8', 'ignore').decode('utf-8')
     logger.info(f"Searching medication info for: {safe_medication_name}")
     
+    # Variants share one cache entry and scrape; obvious non-medications stop here
+    resolved_name = _resolve_medication_name(safe_medication_name)
+    if resolved_name is None:
+        logger.info(f"Not a medication name, answering without lookup: {safe_medication_name}")
+        return _not_a_medication_answer(safe_medication_name)
+    safe_medication_name = resolved_name
+    cache_key = normalize_medication_name(safe_medication_name)
+    return await medication_info_cache.get_or_compute(
+        cache_key,
+        lambda: medication_lookups.do(
+            ("info", cache_key),
+            lambda: _fetch_medication_info(safe_medication_name)
+        )
+    )
+
+async def _fetch_medication_info(safe_medication_name):
+    """Scrape and format medication info with Gemini, bypassing the cache"""
     try:
         # Step 1: Scrape medication information from web sources
-        scraper = MedicationInfoScraper()
-        scraped_info = scraper.search(safe_medication_name)
+        scraped_info = await medication_info_scraper.search_async(safe_medication_name)
         
         # Log the scraped content (shortened for log readability)
         content_preview = ""
@@ -299,7 +862,6 @@ def search_medication_info(medication_name):
         logger.info(f"Source: {source}")
         
         # Step 2: Use Gemini to enhance and format the information
-        model = genai.GenerativeModel(MODEL_NAME)
         
         # If we have scraped content, use it as the basis for Gemini's response
         if scraped_info.get("content"):
@@ -307,82 +869,30 @@ def search_medication_info(medication_name):
             content = str(scraped_info.get("content")).encode('utf-8', 'ignore').decode('utf-8')
             source = str(scraped_info.get("source", "Unknown")).encode('utf-8', 'ignore').decode('utf-8')
             
-            prompt = f"""
-            Você é um assistente especializado em informações sobre medicamentos.
-            
-            Abaixo estão informações coletadas de uma fonte confiável sobre o medicamento "{safe_medication_name}".
-            Por favor, reformate e organize estas informações em uma resposta clara e didática.
-            
-            Inclua as seguintes seções:
-            
-            1. Descrição geral e propósito do medicamento
-            2. Princípios ativos principais
-            3. Indicações de uso
-            4. Contraindicações
-            5. Efeitos colaterais comuns
-            6. Interações medicamentosas relevantes (se disponível)
-            7. Dosagem típica (se disponível)
-            8. Precauções especiais
-            
-            Informações coletadas:
-            {content}
-            
-            Fonte: {source}
-            
-            Observação: Esta informação tem caráter educativo e não substitui a orientação de um profissional de saúde ou a bula oficial do medicamento.
-            """
+            # Long leaflets are trimmed to the agent's input token budget
+            prompt, prompt_tokens = fit_prompt(
+                "medication_info",
+                _build_medication_info_prompt,
+                {"safe_medication_name": safe_medication_name, "content": content, "source": source},
+                priority=["safe_medication_name", "source", "content"]
+            )
         else:
             # Fallback to using Gemini for information generation if scraping failed
-            prompt = f"""
-            Você é um assistente especializado em informações sobre medicamentos.
-            
-            Forneça informações detalhadas sobre o medicamento "{safe_medication_name}" em português.
-            Inclua as seguintes informações:
-            
-            1. Descrição geral e propósito do medicamento
-            2. Princípios ativos principais
-            3. Indicações de uso
-            4. Contraindicações
-            5. Efeitos colaterais comuns
-            6. Interações medicamentosas relevantes
-            7. Dosagem típica (adulto e infantil, se aplicável)
-            8. Precauções especiais
-            
-            Sua resposta deve ser informativa, mas também acessível para pacientes sem conhecimento médico avançado.
-            
-            Importante: Indique claramente que esta informação tem caráter educativo e não substitui a orientação de um profissional de saúde ou a bula oficial do medicamento.
-            """
+            prompt, prompt_tokens = fit_prompt(
+                "medication_info",
+                _build_medication_info_fallback_prompt,
+                {"safe_medication_name": safe_medication_name},
+                priority=["safe_medication_name"]
+            )
         
-        # Ensure prompt is properly encoded UTF-8
-        prompt = str(prompt).encode('utf-8', 'ignore').decode('utf-8')
         logger.info(f"Sending medication info to Gemini for formatting: {safe_medication_name}")
         
-        # Use the generate_content method with configuration
-        generation_config = {
-            "temperature": 0.4,
-            "top_p": 0.8,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
-        
-        response = model.generate_content(
-            contents=prompt,
-            generation_config=generation_config
-        )
+        response = await gemini.generate(prompt, tokens=prompt_tokens)
         
         logger.info(f"Received medication info response from Gemini API: {safe_medication_name}")
         
         # Get the formatted response
-        formatted_response = ""
-        if hasattr(response, 'text'):
-            formatted_response = response.text
-        elif hasattr(response, 'parts'):
-            formatted_response = ''.join(part.text for part in response.parts)
-        else:
-            formatted_response = str(response)
-        
-        # Ensure the response is properly encoded UTF-8
-        formatted_response = str(formatted_response).encode('utf-8', 'ignore').decode('utf-8')
+        formatted_response = _response_text(response)
             
         # If we have a source, append it to the response
         if scraped_info.get("source"):
@@ -395,10 +905,16 @@ def search_medication_info(medication_name):
         logger.error(f"Error in medication info processing: {str(e)}")
         raise Exception(f"Failed to get medication info: {str(e)}")
 
-def search_medication_prices(medication_name):
+async def search_medication_prices(medication_name):
     """
     Agent 3: Search for medication prices using web scraping + Gemini
     
+    Answers are cached per normalized medication name; stale answers are
+    served immediately while a background refresh runs. Concurrent lookups
+    of the same medication share a single scrape and Gemini call. Prices come
+    from the local price catalog when it has fresh data for the medication.
+    Names are resolved as in search_medication_info.
+    
     Args:
         medication_name (str): Name of the medication to look up prices for
         
@@ -409,19 +925,43 @@ def search_medication_prices(medication_name):
     safe_medication_name = str(medication_name).encode('utf-8', 'ignore').decode('utf-8')
     logger.info(f"Searching medication prices for: {safe_medication_name}")
     
+    # Variants share one cache entry and scrape; obvious non-medications stop here
+    resolved_name = _resolve_medication_name(safe_medication_name)
+    if resolved_name is None:
+        logger.info(f"Not a medication name, answering without lookup: {safe_medication_name}")
+        return _not_a_medication_answer(safe_medication_name)
+    safe_medication_name = resolved_name
+    cache_key = normalize_medication_name(safe_medication_name)
+    # Demand picks the medications the catalog refresher keeps fresh
+    price_catalog.note_request(cache_key, safe_medication_name)
+    return await medication_prices_cache.get_or_compute(
+        cache_key,
+        lambda: medication_lookups.do(
+            ("prices", cache_key),
+            lambda: _fetch_medication_prices(safe_medication_name)
+        )
+    )
+
+async def _fetch_medication_prices(safe_medication_name):
+    """Look up or scrape medication prices and format them with Gemini, bypassing the response cache"""
     try:
-        # Step 1: Scrape medication prices from web sources
-        scraper = MedicationPriceScraper()
-        scraped_prices = scraper.search(safe_medication_name)
+        # Step 1: Prices from the local catalog, or scraped live from web sources on a miss
+        catalog_key = normalize_medication_name(safe_medication_name)
+        scraped_prices = await asyncio.to_thread(price_catalog.lookup, catalog_key, safe_medication_name)
+        if scraped_prices is not None:
+            logger.info(f"Prices for {safe_medication_name} answered from the catalog ({scraped_prices['catalog_age']}s old)")
+        else:
+            scraped_prices = await medication_price_scraper.search_async(safe_medication_name)
+            await asyncio.to_thread(price_catalog.store_search, catalog_key, safe_medication_name, scraped_prices)
         
         # Log the scraped content
         num_sources = len(scraped_prices.get('sources', []))
         num_products = len(scraped_prices.get('products', []))
         logger.info(f"Scraped prices for {safe_medication_name} from {num_sources} sources")
         logger.info(f"Found {num_products} products")
+        logger.info(f"Price source timings: {scraped_prices.get('timings', {})}")
         
         # Step 2: Use Gemini to format and present the price information
-        model = genai.GenerativeModel(MODEL_NAME)
         
         # Format the products for inclusion in the prompt
         product_lines = []
@@ -441,77 +981,30 @@ def search_medication_prices(medication_name):
         
         # If we have scraped products, use them as the basis for Gemini's response
         if product_lines:
-            prompt = f"""
-            Você é um assistente especializado em informações sobre preços de medicamentos no Brasil.
-            
-            Abaixo estão informações coletadas sobre preços do medicamento "{safe_medication_name}" de diferentes fontes.
-            Por favor, analise estas informações e forneça um resumo claro e útil sobre os preços encontrados.
-            
-            Inclua:
-            
-            1. Faixa de preço encontrada (menor e maior preço)
-            2. Preço médio aproximado
-            3. Diferenças entre versões do medicamento (genérico, similar, referência), se identificáveis
-            4. Sugestões para economizar na compra deste medicamento
-            5. Onde encontrar os melhores preços com base nos dados
-            
-            Produtos encontrados:
-            {product_text}
-            
-            Fontes consultadas: {', '.join(sources)}
-            
-            Observação: Os preços podem variar de acordo com a região e período de consulta.
-            """
+            # Products are listed cheapest first, so trimming drops the most expensive
+            prompt, prompt_tokens = fit_prompt(
+                "medication_prices",
+                _build_medication_prices_prompt,
+                {"safe_medication_name": safe_medication_name, "product_text": product_text, "sources": ', '.join(sources)},
+                priority=["safe_medication_name", "sources", "product_text"]
+            )
         else:
             # Fallback to using Gemini for price information generation if scraping failed
-            prompt = f"""
-            Você é um assistente especializado em informações sobre preços de medicamentos no Brasil.
-            
-            Forneça informações sobre preços e disponibilidade do medicamento "{safe_medication_name}" em português.
-            Inclua as seguintes informações:
-            
-            1. Faixa de preço típica para este medicamento
-            2. Versões disponíveis (genérico, similar, referência)
-            3. Diferenças de preço entre as versões
-            4. Dicas para economizar na compra deste medicamento
-            5. Programas de desconto disponíveis (se aplicável)
-            6. Onde encontrar o medicamento pelo melhor preço
-            
-            Sua resposta deve ser prática e orientada para ajudar o paciente a encontrar o medicamento pelo melhor preço possível.
-            
-            Importante: Indique claramente que esta informação tem caráter orientativo e que os preços podem variar de acordo com a região e o período.
-            """
+            prompt, prompt_tokens = fit_prompt(
+                "medication_prices",
+                _build_medication_prices_fallback_prompt,
+                {"safe_medication_name": safe_medication_name},
+                priority=["safe_medication_name"]
+            )
         
-        # Ensure prompt is properly encoded UTF-8
-        prompt = str(prompt).encode('utf-8', 'ignore').decode('utf-8')
         logger.info(f"Sending medication price info to Gemini for formatting: {safe_medication_name}")
         
-        # Use the generate_content method with configuration
-        generation_config = {
-            "temperature": 0.4,
-            "top_p": 0.8,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
-        
-        response = model.generate_content(
-            contents=prompt,
-            generation_config=generation_config
-        )
+        response = await gemini.generate(prompt, tokens=prompt_tokens)
         
         logger.info(f"Received medication prices response from Gemini API: {safe_medication_name}")
         
         # Get the formatted response
-        formatted_response = ""
-        if hasattr(response, 'text'):
-            formatted_response = response.text
-        elif hasattr(response, 'parts'):
-            formatted_response = ''.join(part.text for part in response.parts)
-        else:
-            formatted_response = str(response)
-        
-        # Ensure the response is properly encoded UTF-8
-        formatted_response = str(formatted_response).encode('utf-8', 'ignore').decode('utf-8')
+        formatted_response = _response_text(response)
             
         # Add links to the products if available
         if product_lines:
@@ -531,7 +1024,7 @@ def search_medication_prices(medication_name):
         logger.error(f"Error in medication price processing: {str(e)}")
         raise Exception(f"Failed to get medication prices: {str(e)}")
 
-def answer_general_question(question):
+async def answer_general_question(question):
     """
     Agent 4: Answer general health questions using Gemini
     
@@ -547,61 +1040,55 @@ def answer_general_question(question):
         # Ensure question is properly encoded as UTF-8
         safe_question = str(question).encode('utf-8', 'ignore').decode('utf-8')
             
-        # Initialize the Gemini model with the correct model name format
-        model = genai.GenerativeModel(MODEL_NAME)
-        
         # Create prompt for general question
-        prompt = f"""
-        Você é um assistente especializado em assuntos relacionados à saúde.
+        prompt, prompt_tokens = fit_prompt(
+            "general_question",
+            _build_general_question_prompt,
+            {"safe_question": safe_question},
+            priority=["safe_question"]
+        )
+        logger.info(f"Sending general question to Gemini API: {safe_question}")
         
-        Responda à seguinte pergunta de saúde em português de forma clara e acessível:
+        response = await gemini.generate(prompt, tokens=prompt_tokens)
         
-        "{safe_question}"
+        logger.info("Received general question response from Gemini API")
         
-        Sua resposta deve:
-        1. Ser baseada em informações médicas precisas
-        2. Ser compreensível para pessoas sem conhecimento médico avançado
-        3. Ser equilibrada e não alarmista
-        4. Incluir ressalvas quando apropriado
-        5. Sugerir quando seria adequado consultar um profissional de saúde
+        # Return the response text
+        return _response_text(response)
         
-        Lembre-se de que está fornecendo informações gerais, não aconselhamento médico personalizado.
-        """
+    except Exception as e:
+        logger.error(f"Error in Gemini API request for general question: {str(e)}")
+        raise Exception(f"Failed to answer question with Gemini API: {str(e)}")
+
+async def answer_general_question_stream(question):
+    """
+    Streaming variant of answer_general_question
+    
+    Args:
+        question (str): User's health-related question
         
-        # Ensure prompt is properly encoded UTF-8
-        prompt = str(prompt).encode('utf-8', 'ignore').decode('utf-8')
-        logger.info(f"Sending general question to Gemini API: {safe_question}")
+    Yields:
+        str: Consecutive chunks of the answer text
+    """
+    logger.info(f"Initializing Gemini model for streamed general question using model: {MODEL_NAME}")
+    
+    try:
+        safe_question = str(question).encode('utf-8', 'ignore').decode('utf-8')
         
-        # Use the generate_content method with configuration
-        generation_config = {
-            "temperature": 0.4,
-            "top_p": 0.8,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
-        
-        response = model.generate_content(
-            contents=prompt,
-            generation_config=generation_config
+        prompt, prompt_tokens = fit_prompt(
+            "general_question",
+            _build_general_question_prompt,
+            {"safe_question": safe_question},
+            priority=["safe_question"]
         )
+        logger.info(f"Sending streaming general question to Gemini API: {safe_question}")
         
-        logger.info("Received general question response from Gemini API")
+        response = await gemini.generate(prompt, stream=True, tokens=prompt_tokens)
         
-        # Return the response text
-        response_text = ""
-        if hasattr(response, 'text'):
-            response_text = response.text
-        elif hasattr(response, 'parts'):
-            # For newer API versions that might use parts
-            response_text = ''.join(part.text for part in response.parts)
-        else:
-            # Fallback to string representation
-            response_text = str(response)
+        async for text in _stream_text(response):
+            yield text
         
-        # Ensure the response is properly encoded UTF-8
-        response_text = str(response_text).encode('utf-8', 'ignore').decode('utf-8')
-            
-        return response_text
+        logger.info("Received general question response from Gemini API")
         
     except Exception as e:
         logger.error(f"Error in Gemini API request for general question: {str(e)}")
@@ -0,0 +1,155 @@
+import re
+import threading
+
+from lxml import etree
+
+# Product cards read from each pharmacy search page
+MAX_PRODUCTS = 5
+
+# "R$ 1.234,56" -> "1.234,56"
+PRICE_RE = re.compile(r'R\$\s*([\d.,]+)')
+
+_STRING_VALUE = etree.XPath("string()", smart_strings=False)
+
+# lxml parses without holding the GIL, but only with a parser owned by the
+# calling thread; a shared parser instance serializes the scraper threads.
+_local = threading.local()
+
+
+def _parser():
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = etree.HTMLParser(remove_comments=True, remove_pis=True, no_network=True)
+    return parser
+
+
+def css_class(name):
+    """XPath predicate for an element having the class `name` (the CSS `.name`)"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class Selector:
+    """
+    A precompiled XPath query, the replacement for BeautifulSoup's select_one/select
+
+    Paths ending in an attribute step (`/@href`) return strings; element
+    results are read with text(), which matches bs4's `.text.strip()`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._xpath = etree.XPath(path, smart_strings=False)
+
+    def all(self, node):
+        return self._xpath(node)
+
+    def first(self, node):
+        found = self._xpath(node)
+        return found[0] if found else None
+
+    def text(self, node):
+        """Stripped text of the first match, or None when nothing matches"""
+        found = self.first(node)
+        if found is None:
+            return None
+        return (found if isinstance(found, str) else _STRING_VALUE(found)).strip()
+
+
+def _raw_text_end(text, at):
+    """End of the <script> or <style> element around position at, or None"""
+    for tag in ('<script', '<style'):
+        if text.rfind(tag, 0, at) > text.rfind('</' + tag[1:], 0, at):
+            end = text.find('</' + tag[1:], at)
+            return end if end != -1 else len(text)
+    return None
+
+
+def _window(text, marker):
+    """
+    Offset of the part of the page worth parsing
+
+    That is the first tag holding marker, or else the <body> tag, which skips
+    the <head> with its inline state scripts and styles. The opening tag of
+    the first element the caller needs holds the marker, so the window never
+    starts after it; an earlier tag holding it only makes the window larger.
+    Occurrences in scripts and styles are skipped, as they are not elements.
+    """
+    at = text.find(marker) if marker else -1
+    while at != -1:
+        raw_end = _raw_text_end(text, at)
+        if raw_end is None:
+            start = text.rfind('<', 0, at)
+            if start != -1 and '>' not in text[start:at]:
+                return start
+            # In text content: the page is not laid out as expected
+            break
+        at = text.find(marker, raw_end)
+    return max(text.find('<body'), 0)
+
+
+def parse_html(text, marker=None):
+    """
+    Parse the relevant part of a page into an lxml tree
+
+    Args:
+        text (str): The decoded page
+        marker (str, optional): Text in the opening tag of the first element
+            the caller needs, such as its class name. Parsing starts at the
+            first tag holding it, so selectors must not depend on the
+            ancestors of that element.
+
+    Returns:
+        lxml element: The root, or None for an empty page
+    """
+    start = _window(text, marker)
+    fragment = text[start:] if start else text
+    try:
+        return etree.fromstring(fragment, _parser())
+    except ValueError:
+        # str input with an XML encoding declaration
+        return etree.fromstring(fragment.encode('utf-8'), etree.HTMLParser(encoding='utf-8', no_network=True))
+
+
+def parse_price(price_text):
+    """Price in reais from text like "R$ 1.234,56", or None"""
+    match = PRICE_RE.search(price_text or "")
+    if not match:
+        return None
+    try:
+        return float(match.group(1).replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+class ProductListing:
+    """
+    Where a pharmacy search page keeps its product cards
+
+    Args:
+        card (str): XPath of the cards, from the document root
+        name, price (str): XPath of the name and price elements, relative to a card
+        link (str): XPath of the product URL attribute, relative to a card
+        marker (str): Text in the opening tag of every card (e.g. its class
+            name); parsing starts at the first tag holding it
+    """
+
+    def __init__(self, card, name, price, link, marker=None):
+        self.marker = marker
+        self.cards = Selector(f"({card})[position() <= {MAX_PRODUCTS}]")
+        self.name = Selector(f"({name})[1]")
+        self.price = Selector(f"({price})[1]")
+        self.link = Selector(f"({link})[1]")
+
+    def products(self, root):
+        """
+        Fields of the first MAX_PRODUCTS cards
+
+        Returns:
+            list: (name or None, price text, href or None) per card
+        """
+        if root is None:
+            return []
+        return [
+            (self.name.text(card), self.price.text(card) or "", self.link.first(card))
+            for card in self.cards.all(root)
+        ]
@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+logger = logging.getLogger("exam-analyzer-api")
+
+try:
+    import brotli  # noqa: F401  (urllib3 decodes "br" when it is installed)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# Number of distinct hosts whose connection pools are kept alive
+POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))
+# Maximum simultaneous connections per host; extra requests wait for a free one.
+# Defaults to the number of scraper threads, so a burst of searches on one
+# site never leaves scraper threads queued on the pool with no timeout
+POOL_MAX_PER_HOST = int(os.getenv("HTTP_POOL_MAX_PER_HOST", os.getenv("SCRAPER_THREADS", "16")))
+# Retries for idempotent requests on connection errors and 429/5xx responses
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+
+DEFAULT_TIMEOUT = 10
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.3,
+        backoff_jitter=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_HOSTS,
+        pool_maxsize=POOL_MAX_PER_HOST,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    logger.info(f"Shared HTTP client created: {POOL_MAX_PER_HOST} connections per host, {HTTP_RETRIES} retries")
+    return session
+
+
+def get_session():
+    """Return the process-wide requests.Session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def get(url, headers=None, timeout=DEFAULT_TIMEOUT, stream=False):
+    """
+    GET through the shared keep-alive session
+
+    Args:
+        url (str): URL to fetch
+        headers (dict, optional): Extra request headers
+        timeout (float): Connect/read timeout in seconds
+        stream (bool): Defer reading the body (see requests' stream=True)
+
+    Returns:
+        requests.Response: The response; callers must close streamed responses
+    """
+    return get_session().get(url, headers=headers, timeout=timeout, stream=stream)
+
+
+def stats():
+    """
+    Connection reuse counters aggregated over the live connection pools
+
+    Returns:
+        dict: requests sent, connections opened, requests served on a reused
+        connection, and the same counters per host
+    """
+    with _session_lock:
+        session = _session
+    hosts = {}
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}"
+                counters = hosts.setdefault(host, {"requests": 0, "connections": 0})
+                counters["requests"] += pool.num_requests
+                counters["connections"] += pool.num_connections
+    total_requests = sum(h["requests"] for h in hosts.values())
+    total_connections = sum(h["connections"] for h in hosts.values())
+    return {
+        "requests": total_requests,
+        "connections_opened": total_connections,
+        "reused_requests": max(total_requests - total_connections, 0),
+        "hosts": hosts,
+    }
+
+
+def close():
+    """Close all pooled connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from uuid import uuid4
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Agent types, as the frontend names them in its interaction history
+EXAM_ANALYZER = "exam-analyzer"
+EXAM_FOLLOW_UP = "exam-follow-up"
+GENERAL_QUESTION = "general-question"
+
+
+def _interactions_table(metadata):
+    from sqlalchemy import Column, DateTime, Table, Text, Uuid
+
+    # Mirrors the `interactions` table of the Supabase migration
+    return Table(
+        "interactions",
+        metadata,
+        Column("id", Uuid, primary_key=True),
+        Column("user_email", Text),
+        Column("agent_type", Text, nullable=False),
+        Column("question", Text, nullable=False),
+        Column("answer", Text, nullable=False),
+        Column("timestamp", DateTime(timezone=True)),
+    )
+
+
+class InteractionRecorder:
+    """
+    Writes user interactions to the `interactions` table in batches.
+
+    record() never touches the database: rows are buffered in memory and a
+    background task inserts them with one multi-row INSERT per batch, as soon
+    as `batch_size` rows are waiting or every `flush_interval` seconds. When
+    `max_buffer` rows are waiting, record() gives the writer up to
+    `put_timeout` seconds to make room and then drops the row, counting it
+    in `dropped`. stop() flushes what is left.
+
+    `url` is any SQLAlchemy URL: the Supabase Postgres database
+    (postgresql+psycopg2://...) or a local SQLite stand-in (sqlite:///...),
+    where the table is created on start. Without a url nothing is recorded.
+    """
+
+    def __init__(self, url, batch_size=100, flush_interval=1.0, max_buffer=10000, put_timeout=0.05):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.put_timeout = put_timeout
+        self._buffer = deque()
+        self._engine = None
+        self._table = None
+        self._task = None
+        self._wakeup = None
+        self._space = None
+        self._stopping = False
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def enabled(self):
+        return bool(self.url)
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def _connect(self):
+        # SQLAlchemy takes ~0.2s to import, so it is only loaded when recording is on
+        from sqlalchemy import MetaData, create_engine
+
+        engine = create_engine(self.url, pool_pre_ping=True)
+        metadata = MetaData()
+        table = _interactions_table(metadata)
+        if engine.dialect.name == "sqlite":
+            # The Postgres schema (RLS, foreign keys) belongs to the Supabase migrations
+            metadata.create_all(engine)
+        self._engine, self._table = engine, table
+        logger.info(f"Interaction recorder connected ({engine.dialect.name})")
+
+    async def start(self):
+        """Connect and start the writer task on the running event loop"""
+        if not self.enabled or self._task is not None:
+            return
+        await asyncio.to_thread(self._connect)
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush the buffered rows and stop the writer task"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._engine.dispose)
+        logger.info(f"Interaction recorder stopped: {self.stats()}")
+
+    async def record(self, user_email, agent_type, question, answer):
+        """
+        Queue one interaction for writing
+
+        Returns:
+            bool: False if the row was dropped (recorder stopped or buffer full)
+        """
+        if self._task is None or self._stopping:
+            self.dropped += 1
+            return False
+
+        if len(self._buffer) >= self.max_buffer:
+            # Backpressure: let the writer catch up for a moment before dropping
+            self._wakeup.set()
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), self.put_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning(f"Interaction buffer full, {self.dropped} rows dropped so far")
+                return False
+
+        self._buffer.append({
+            "id": uuid4(),
+            "user_email": user_email,
+            "agent_type": agent_type,
+            "question": str(question).encode('utf-8', 'ignore').decode('utf-8'),
+            "answer": str(answer).encode('utf-8', 'ignore').decode('utf-8'),
+            "timestamp": datetime.now(timezone.utc),
+        })
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _insert(self, rows):
+        from sqlalchemy import insert
+
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(insert(self._table).values(rows))
+            return len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"Could not record interaction: {str(e)}")
+                return 0
+            # One bad row (e.g. an email missing from `users`) must not lose the batch
+            logger.warning(f"Batch insert of {len(rows)} interactions failed, retrying row by row: {str(e)}")
+            return sum(self._insert([row]) for row in rows)
+
+    async def _flush(self):
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._space.set()
+            written = await asyncio.to_thread(self._insert, batch)
+            self.batches += 1
+            self.recorded += written
+            self.failed += len(batch) - written
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+            if self._stopping:
+                return
+
+    def stats(self):
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+interaction_recorder = InteractionRecorder(
+    os.getenv("INTERACTIONS_DATABASE_URL", ""),
+    batch_size=int(os.getenv("INTERACTIONS_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("INTERACTIONS_FLUSH_SECONDS", "1.0")),
+    max_buffer=int(os.getenv("INTERACTIONS_MAX_BUFFER", "10000")),
+)
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from uuid import uuid4
+
+logger = logging.getLogger("exam-analyzer-api")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Durable job queue backed by a single SQLite file.
+
+    Payloads and results are stored zlib-compressed. A claimed job holds a
+    lease of `lease_seconds`, renewed by its worker while it runs; if the
+    worker dies (crash, restart) the lease expires and the job is claimed
+    again, up to `max_attempts` times. Each claim is identified by the
+    attempt number, and only the current claim can renew, complete or fail
+    the job. Claiming is a single UPDATE, so several API processes can share
+    the file. Finished jobs are deleted `result_ttl` seconds after they end.
+    """
+
+    def __init__(self, path, lease_seconds=300.0, max_attempts=3, result_ttl=24 * 3600.0, clock=time.time):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    owner TEXT,
+                    status TEXT NOT NULL,
+                    payload BLOB,
+                    result BLOB,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_idx ON jobs(status, created_at)")
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Job queue opened at {self.path}")
+        return self._conn
+
+    def enqueue(self, kind, payload, owner=None):
+        """
+        Add a job to the queue
+
+        Args:
+            kind (str): Name of the handler that runs the job
+            payload (dict): JSON-serializable job input
+            owner (str, optional): User allowed to read the job
+
+        Returns:
+            str: The job id
+        """
+        job_id = str(uuid4())
+        blob = zlib.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        now = self._clock()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, QUEUED, blob, now, now)
+            )
+            # Finished jobs are only kept long enough to be fetched
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, now - self.result_ttl)
+            )
+            conn.commit()
+        logger.info(f"Job queued: {job_id} ({kind})")
+        return job_id
+
+    def claim(self):
+        """
+        Take the oldest queued job, or a running one whose lease expired
+
+        Returns:
+            dict: id, kind, payload and attempts of the claimed job, or None
+        """
+        while True:
+            now = self._clock()
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ?
+                    WHERE id = (
+                        SELECT id FROM jobs
+                        WHERE status = ? OR (status = ? AND lease_until < ?)
+                        ORDER BY created_at LIMIT 1
+                    )
+                    RETURNING id, kind, payload, attempts
+                    """,
+                    (RUNNING, now + self.lease_seconds, now, QUEUED, RUNNING, now)
+                ).fetchone()
+                conn.commit()
+            if row is None:
+                return None
+
+            job_id, kind, blob, attempts = row
+            if attempts > self.max_attempts:
+                # The job keeps killing its worker: stop retrying it
+                self.fail(job_id, f"Job abandoned after {self.max_attempts} attempts", attempts)
+                continue
+            if attempts > 1:
+                logger.warning(f"Job {job_id} reclaimed after an expired lease (attempt {attempts})")
+            return {
+                "id": job_id,
+                "kind": kind,
+                "payload": json.loads(zlib.decompress(blob).decode('utf-8')),
+                "attempts": attempts,
+            }
+
+    def renew(self, job_id, attempt):
+        """
+        Extend the lease of a running job by `lease_seconds`
+
+        Args:
+            job_id (str): The job id
+            attempt (int): Attempt number returned by claim()
+
+        Returns:
+            bool: False if the claim was lost (reclaimed or already ended)
+        """
+        now = self._clock()
+        with self._lock:
+            conn = self._connection()
+            updated = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+                (now + self.lease_seconds, now, job_id, RUNNING, attempt)
+            ).rowcount
+            conn.commit()
+        return updated > 0
+
+    def complete(self, job_id, result, attempt):
+        """
+        Store the result of a job and mark it done
+
+        Returns:
+            bool: False if the claim was lost and the result was dropped
+        """
+        blob = zlib.compress(result.encode('utf-8'))
+        return self._finish(job_id, attempt, DONE, result=blob)
+
+    def fail(self, job_id, error, attempt):
+        """
+        Mark a job as failed with an error message
+
+        Returns:
+            bool: False if the claim was lost and the job was left as is
+        """
+        return self._finish(job_id, attempt, FAILED, error=error)
+
+    def _finish(self, job_id, attempt, status, result=None, error=None):
+        with self._lock:
+            conn = self._connection()
+            # The payload is no longer needed once the job has ended
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND attempts = ?",
+                (status, result, error, self._clock(), job_id, RUNNING, attempt)
+            ).rowcount
+            conn.commit()
+        if not updated:
+            logger.warning(f"Job {job_id} attempt {attempt} no longer owns the job; {status} dropped")
+            return False
+        logger.info(f"Job {status}: {job_id}")
+        return True
+
+    def get(self, job_id):
+        """
+        Look up a job
+
+        Returns:
+            dict: id, kind, owner, status, result, error, attempts and
+            timestamps, or None if the job does not exist
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT id, kind, owner, status, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, owner, status, result, error, attempts, created_at, updated_at = row
+        return {
+            "id": job_id,
+            "kind": kind,
+            "owner": owner,
+            "status": status,
+            "result": zlib.decompress(result).decode('utf-8') if result is not None else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def stats(self):
+        """Number of jobs per status"""
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobWorkers:
+    """
+    Pool of asyncio tasks running queued jobs on the event loop.
+
+    `handlers` maps a job kind to a coroutine function taking the payload and
+    returning the result text. Workers are woken by notify() after an enqueue
+    and also poll every `poll_interval` seconds, which picks up jobs queued by
+    other processes and jobs whose lease expired. A running job's lease is
+    renewed every third of `lease_seconds`, so long jobs are not reclaimed.
+    """
+
+    def __init__(self, queue, handlers, concurrency=4, poll_interval=2.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup = None
+        self._finished = None
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._finished = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._run(n)) for n in range(self.concurrency)]
+        logger.info(f"Job workers started: {self.concurrency}")
+
+    async def stop(self):
+        """
+        Cancel the worker tasks
+
+        Jobs interrupted here keep their lease and are picked up again after a
+        restart once it expires.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Job workers stopped")
+
+    @property
+    def running(self):
+        """True while the worker tasks are started"""
+        return bool(self._tasks)
+
+    def notify(self):
+        """Wake an idle worker after a job was queued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def wait(self, job_id, timeout):
+        """
+        Wait until a job is finished or timeout seconds pass
+
+        Returns:
+            dict: The job as returned by JobQueue.get, or None if it does not exist
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self.queue.get, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in (DONE, FAILED) or remaining <= 0:
+                return job
+            if self._finished is None:
+                await asyncio.sleep(min(self.poll_interval, remaining))
+                continue
+            async with self._finished:
+                try:
+                    await asyncio.wait_for(self._finished.wait(), min(self.poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(self, worker):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+            except Exception as e:
+                logger.error(f"Job worker {worker} could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"Job worker {worker} running {job['id']} ({job['kind']})")
+            lease = asyncio.create_task(self._keep_lease(job))
+            try:
+                result = await self.handlers[job["kind"]](job["payload"])
+                await asyncio.to_thread(self.queue.complete, job["id"], result, job["attempts"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {str(e)}")
+                await asyncio.to_thread(self.queue.fail, job["id"], str(e), job["attempts"])
+            finally:
+                lease.cancel()
+
+            async with self._finished:
+                self._finished.notify_all()
+
+    async def _keep_lease(self, job):
+        """Renew the lease of a running job until cancelled or the claim is lost"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                renewed = await asyncio.to_thread(self.queue.renew, job["id"], job["attempts"])
+            except Exception as e:
+                logger.error(f"Could not renew the lease of job {job['id']}: {str(e)}")
+                continue
+            if not renewed:
+                logger.warning(f"Job {job['id']} lost its lease")
+                return
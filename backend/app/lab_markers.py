@@ -0,0 +1,253 @@
+import logging
+import re
+
+from .exam_index import tokenize
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Number as printed in Brazilian lab reports: 13,5 / 7.200 / 1.234,5
+_NUMBER = r'\d+(?:[.,]\d+)*'
+
+_ROW_RE = re.compile(
+    r'^(?P<name>[^\W\d_][\w()%/\-+,. ]*?)\s*[:=]?\s+'
+    r'(?P<value>[<>]?\s?' + _NUMBER + r')(?=\s|$)\s*(?P<rest>.*)$'
+)
+_LEADER_RE = re.compile(r'(?:\s*\.){2,}|_{2,}')
+_RANGE_RE = re.compile(r'(' + _NUMBER + r')\s*(?:a|-|–|até)\s*(' + _NUMBER + r')', re.IGNORECASE)
+_UPPER_RE = re.compile(r'(?:<=?|≤|até|inferior a|menor que|abaixo de)\s*(' + _NUMBER + r')', re.IGNORECASE)
+_LOWER_RE = re.compile(r'(?:>=?|≥|superior a|maior que|acima de)\s*(' + _NUMBER + r')', re.IGNORECASE)
+
+# Units without a "/", "%" or "^" that are still common in lab reports
+_PLAIN_UNITS = frozenset(["fl", "pg", "u", "ui", "mui", "seg", "segundos", "milhoes", "milhões", "mil", "mmhg"])
+
+# Words that turn a question into a request for interpretation
+INTERPRETIVE_TERMS = frozenset("""
+    significa significado quer dizer normal normais alto alta altos altas baixo baixa baixos baixas
+    alterado alterada alterados alteradas preocupar preocupante grave risco riscos causa causas
+    porque devo fazer tratamento tratar ruim bom boa ideal explique explica explicar interpretar
+    melhorar aumentar diminuir reduzir doenca serve servem como funciona mede medem
+""".split())
+
+# Definitional phrasing ("o que é hemoglobina?", "que são plaquetas?"); these
+# words are stopwords, so the question would otherwise look like a lookup
+_DEFINITION_RE = re.compile(r'\bque\s+(?:é|e|sao|são|seria|significa)\b|\bpara\s+que\b|\bpra\s+que\b')
+
+# Words of a plain value lookup ("qual o resultado da glicose?")
+LOOKUP_TERMS = frozenset("resultado resultados valor valores nivel niveis quanto deu taxa numero".split())
+
+_STATUS_TEXT = {
+    "normal": "dentro da faixa de referência",
+    "alto": "acima da faixa de referência",
+    "baixo": "abaixo da faixa de referência",
+}
+
+
+def parse_number(text):
+    """Parse a number as printed in Brazilian reports ("7.200" is 7200, "13,5" is 13.5)"""
+    text = text.strip().lstrip('<>').strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(?:\.\d{3})+', text):
+        text = text.replace('.', '')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _is_unit(token):
+    return any(c in token for c in '/%^') or token.casefold() in _PLAIN_UNITS
+
+
+def _reference_bounds(reference):
+    match = _RANGE_RE.search(reference)
+    if match:
+        return parse_number(match.group(1)), parse_number(match.group(2))
+    match = _UPPER_RE.search(reference)
+    if match:
+        return None, parse_number(match.group(1))
+    match = _LOWER_RE.search(reference)
+    if match:
+        return parse_number(match.group(1)), None
+    return None, None
+
+
+def parse_marker_row(row):
+    """
+    Parse one report row such as "Hemoglobina: 13,5 g/dL (12,0 a 16,0)"
+
+    Args:
+        row (str): A visual row of the report
+
+    Returns:
+        dict: name, value, unit, reference, low, high and status
+        ("normal", "alto", "baixo" or None), or None if the row is not a marker
+    """
+    row = _LEADER_RE.sub(' ', row).strip()
+    match = _ROW_RE.match(row)
+    if not match:
+        return None
+
+    name = match.group('name').strip(' :.-')
+    value = match.group('value').replace(' ', '')
+    rest = match.group('rest').strip()
+
+    unit = None
+    if rest:
+        first = rest.split()[0]
+        if _is_unit(first):
+            unit = first
+            rest = rest[len(first):].strip()
+
+    reference = rest.strip('()[] ')
+    low, high = _reference_bounds(reference)
+    if low is None and high is None:
+        reference = None
+        if unit is None:
+            # A name followed by a bare number (dates, page numbers...) is not a marker
+            return None
+
+    status = None
+    number = parse_number(value)
+    if number is not None and reference is not None and value[0] not in '<>':
+        if low is not None and number < low:
+            status = "baixo"
+        elif high is not None and number > high:
+            status = "alto"
+        else:
+            status = "normal"
+
+    return {
+        "name": name,
+        "value": value,
+        "unit": unit,
+        "reference": reference,
+        "low": low,
+        "high": high,
+        "status": status,
+    }
+
+
+def parse_markers(rows):
+    """
+    Build the marker table of an exam from its rows
+
+    Args:
+        rows (iterable): Report rows (text lines, or rows rebuilt from word positions)
+
+    Returns:
+        list: Marker dicts in report order
+    """
+    markers = []
+    for row in rows:
+        marker = parse_marker_row(row)
+        if marker:
+            markers.append(marker)
+    return markers
+
+
+def strip_marker_rows(text):
+    """Remove the lines of text that parse as markers, keeping the rest (notes, qualitative results)"""
+    return "\n".join(line for line in text.splitlines() if line.strip() and not parse_marker_row(line))
+
+
+def format_marker(marker):
+    """One-line description of a marker"""
+    text = f"{marker['name']}: {marker['value']}"
+    if marker.get('exam'):
+        text = f"[{marker['exam']}] {text}"
+    if marker['unit']:
+        text += f" {marker['unit']}"
+    if marker['reference']:
+        text += f" (ref. {marker['reference']})"
+    if marker['status'] and marker['status'] != "normal":
+        text += f" [{marker['status'].upper()}]"
+    return text
+
+
+def format_marker_table(markers):
+    """Compact text table of the markers, one per line, for prompts"""
+    return "\n".join(format_marker(marker) for marker in markers)
+
+
+def _terms(text):
+    # Single letters count here: "vitamina D" must not match "Vitamina B12"
+    return set(tokenize(text, min_length=1))
+
+
+def find_markers(question, markers):
+    """
+    Markers named in a question
+
+    Markers are grouped by the question terms their name covers; within a
+    group the names with the fewest extra words win, so "hemoglobina" finds
+    "Hemoglobina" rather than "Hemoglobina glicada". Groups are then picked
+    greedily, largest first, until the question terms are covered.
+
+    Returns:
+        tuple: (matching markers, question terms not covered by them)
+    """
+    terms = _terms(question) - LOOKUP_TERMS
+    groups = {}
+    for marker in markers:
+        name_terms = _terms(marker['name'])
+        covered = frozenset(name_terms & terms)
+        if not covered:
+            continue
+        extra = len(name_terms - terms)
+        best_extra, group = groups.get(covered, (extra, []))
+        if extra < best_extra:
+            best_extra, group = extra, []
+        if extra == best_extra:
+            group.append(marker)
+        groups[covered] = (best_extra, group)
+
+    matches = []
+    remaining = set(terms)
+    for covered, (_, group) in sorted(groups.items(), key=lambda item: (-len(item[0]), item[1][0])):
+        if covered & remaining:
+            matches.extend(group)
+            remaining -= covered
+    order = {id(marker): position for position, marker in enumerate(markers)}
+    matches.sort(key=lambda marker: order[id(marker)])
+    return matches, remaining
+
+
+def answer_from_markers(question, markers):
+    """
+    Answer a plain value lookup ("qual meu valor de hemoglobina?") from the table
+
+    Questions asking for interpretation, naming something that is not in the
+    table, or matching too many markers return None and go to Gemini.
+
+    Returns:
+        str: The answer, or None
+    """
+    if not markers:
+        return None
+    words = _terms(question) | set(re.findall(r'\w+', question.casefold()))
+    if words & INTERPRETIVE_TERMS or _DEFINITION_RE.search(question.casefold()):
+        return None
+
+    matches, uncovered = find_markers(question, markers)
+    if not matches or uncovered or len(matches) > 3:
+        return None
+
+    lines = []
+    for marker in matches:
+        value = f"{marker['value']} {marker['unit']}" if marker['unit'] else marker['value']
+        line = f"**{marker['name']}**: **{value}**"
+        if marker.get('exam'):
+            line += f" em {marker['exam']}"
+        if marker['reference']:
+            line += f" (referência: {marker['reference']})"
+        if marker['status']:
+            line += f" — {_STATUS_TEXT[marker['status']]}"
+        lines.append(line)
+
+    logger.info(f"Answered value lookup locally: {', '.join(m['name'] for m in matches)}")
+    return (
+        "Segundo o seu exame:\n\n" + "\n".join(f"- {line}" for line in lines) +
+        "\n\nPara entender o que esse resultado significa, é só perguntar. "
+        "Esta resposta não substitui a consulta com um profissional de saúde."
+    )
@@ -1,28 +1,201 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Header, status
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Header, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
+import io
+import json
 import logging
-from uuid import uuid4
 import os
-from typing import Optional
+import zipfile
+from pathlib import Path
+from uuid import uuid4
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 
-from app.firebase_admin import verify_firebase_token
-from app.pdf_processor import extract_pdf_content
+# config primeiro: carrega o .env antes que os outros módulos leiam o ambiente
+from app import config, gemini_client, http_client, token_budget
+from app.firebase_admin import cached_token_claims, certificate_store, firebase_ready, token_cache, verify_firebase_token
+from app.interactions import EXAM_ANALYZER, EXAM_FOLLOW_UP, GENERAL_QUESTION, interaction_recorder
+from app.job_queue import DONE, FAILED, JobQueue, JobWorkers
+from app.metrics import (
+    RequestContextMiddleware, StatsMetric, current_endpoint, install_request_id_logging, register, render_metrics,
+    request_id, stage
+)
+from app.pdf_processor import extract_exam_content, shutdown_extraction_pool
+from app.price_catalog import PriceCatalogRefresher
 from app.gemini_client import (
     analyze_exam,
+    analyze_exam_stream,
+    analyze_exam_batch,
     analyze_and_answer,
+    analyze_and_answer_stream,
     search_medication_info,
     search_medication_prices,
-    answer_general_question
+    answer_general_question,
+    answer_general_question_stream
 )
 
 # Configuração de logging
+# Cada linha de log traz o id da requisição (ou "-" fora de uma requisição)
+install_request_id_logging()
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    format="%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
 )
 logger = logging.getLogger("exam-analyzer-api")
 
-app = FastAPI(title="Exam Mine API")
+# Limite de tamanho por PDF (5MB)
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+# Máximo de exames por lote (PDFs avulsos ou dentro de .zip)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "10"))
+# Total descompactado aceito por .zip, somando todos os PDFs
+ZIP_MAX_UNCOMPRESSED_BYTES = int(os.getenv("ZIP_MAX_UNCOMPRESSED_BYTES", str(BATCH_MAX_FILES * MAX_UPLOAD_BYTES)))
+# Tamanho dos blocos lidos de cada PDF do .zip
+ZIP_READ_CHUNK_BYTES = 64 * 1024
+# Extrações de PDF simultâneas em um lote
+BATCH_EXTRACT_CONCURRENCY = int(os.getenv("BATCH_EXTRACT_CONCURRENCY", "4"))
+
+# Fila durável dos jobs de análise (modo assíncrono)
+job_queue = JobQueue(
+    os.getenv("JOB_QUEUE_PATH", str(Path(__file__).parent.parent / ".cache" / "jobs.sqlite3")),
+    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "300")),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL_SECONDS", str(24 * 3600))),
+)
+
+async def _run_analyze_exam_job(payload: dict) -> str:
+    """Executa a etapa do Gemini de um job de análise de exame."""
+    # Logs e métricas do job ficam associados à requisição que o criou
+    request_id.set(payload.get("request_id", "-"))
+    current_endpoint.set("/agents/analyze-exam/jobs")
+    analysis = await analyze_exam(payload["exam_content"], payload["session_id"], payload["markers"])
+    if payload.get("user_email"):
+        await interaction_recorder.record(payload["user_email"], EXAM_ANALYZER, payload["question"], analysis)
+    return analysis
+
+job_workers = JobWorkers(
+    job_queue,
+    {"analyze_exam": _run_analyze_exam_job},
+    concurrency=int(os.getenv("JOB_WORKERS", "4")),
+)
+
+# Atualiza em segundo plano os preços dos medicamentos mais buscados
+price_catalog_refresher = PriceCatalogRefresher(
+    gemini_client.price_catalog,
+    gemini_client.medication_price_scraper,
+    top_n=int(os.getenv("PRICE_CATALOG_TOP_N", "50")),
+    interval=float(os.getenv("PRICE_CATALOG_REFRESH_INTERVAL_SECONDS", "900")),
+    refresh_age=float(os.getenv("PRICE_CATALOG_REFRESH_AGE_SECONDS", str(3 * 3600))),
+    site_interval=float(os.getenv("PRICE_CATALOG_SITE_INTERVAL_SECONDS", "10")),
+)
+
+# Contadores das sessões, caches de respostas, deduplicação de buscas e do
+# pool de conexões HTTP, lidos a cada coleta do /metrics
+register(StatsMetric(
+    "exam_mine_session_store", "Exam sessions kept in memory",
+    lambda: [({"store": "exams"}, gemini_client.exam_storage.stats())],
+    counters=("hits", "misses", "evictions", "expirations"),
+))
+register(StatsMetric(
+    "exam_mine_response_cache", "Cached medication answers",
+    lambda: [({"cache": cache.name}, cache.stats())
+             for cache in (gemini_client.medication_info_cache, gemini_client.medication_prices_cache)],
+    counters=("hits", "stale_hits", "misses", "refreshes", "refresh_failures", "evictions"),
+))
+register(StatsMetric(
+    "exam_mine_singleflight", "Identical concurrent medication lookups",
+    lambda: [({"group": gemini_client.medication_lookups.name}, gemini_client.medication_lookups.stats())],
+    counters=("executions", "collapsed"),
+))
+# Interações descartadas por backpressure só aparecem aqui
+register(StatsMetric(
+    "exam_mine_interactions", "Interaction records buffered and written to the database",
+    lambda: [({"recorder": "interactions"}, interaction_recorder.stats())],
+    counters=("recorded", "dropped", "failed", "batches"),
+))
+# Chamadas ao Gemini, novas tentativas após 429/503 e esperas do limitador RPM/TPM
+register(StatsMetric(
+    "exam_mine_gemini", "Gemini API calls through the shared rate-limited client",
+    lambda: [({"model": gemini_client.MODEL_NAME}, gemini_client.gemini.stats())],
+    counters=("calls", "retries", "waits", "waited_seconds"),
+))
+# Tokens de entrada estimados por agente, para acompanhar cada orçamento
+register(StatsMetric(
+    "exam_mine_prompt", "Estimated Gemini input tokens per agent",
+    lambda: [({"agent": agent}, usage) for agent, usage in token_budget.usage_stats().items()],
+    counters=("calls", "input_tokens", "trimmed_calls"),
+))
+# Cache persistente das análises de exames (lido do SQLite a cada coleta)
+register(StatsMetric(
+    "exam_mine_analysis_cache", "Persistent cache of exam analyses",
+    lambda: [({"cache": "exam-analyses"}, gemini_client.analysis_cache.stats())],
+    counters=("hits", "misses", "evictions"),
+))
+# Tokens do Firebase já verificados, servidos sem validar a assinatura de novo
+register(StatsMetric(
+    "exam_mine_token_cache", "Verified Firebase token claims kept in memory",
+    lambda: [({"cache": "firebase-tokens"}, token_cache.stats())],
+    counters=("hits", "misses"),
+))
+# Profundidade da fila de jobs, por situação
+register(StatsMetric(
+    "exam_mine_job_queue", "Jobs in the durable analysis queue",
+    lambda: [({"status": job_status}, {"jobs": count}) for job_status, count in job_queue.stats().items()],
+))
+# Catálogo local de preços: acertos, itens ainda frescos e rodadas de atualização
+register(StatsMetric(
+    "exam_mine_price_catalog", "Local catalog of scraped medication prices",
+    lambda: [({"catalog": "prices"}, gemini_client.price_catalog.stats())] if gemini_client.price_catalog.enabled else [],
+    counters=("hits", "misses"),
+))
+register(StatsMetric(
+    "exam_mine_price_refresh", "Background refresh of the most requested medication prices",
+    lambda: [({"catalog": "prices"}, price_catalog_refresher.stats())],
+    counters=("refreshed", "failed", "waits", "waited_seconds"),
+))
+# Gauges: os contadores são dos pools vivos e recomeçam quando um pool é descartado
+register(StatsMetric(
+    "exam_mine_http_pool", "Outgoing HTTP requests over the live keep-alive pools",
+    lambda: [({"host": host}, {**counters, "reused_requests": max(counters["requests"] - counters["connections"], 0)})
+             for host, counters in http_client.stats()["hosts"].items()],
+))
+
+async def _warm_up():
+    """
+    Inicializa Gemini e Firebase em segundo plano, depois de a API subir,
+    e mantém os certificados do Firebase atualizados.
+    O /ready responde 503 até esta etapa terminar.
+    """
+    try:
+        await run_in_threadpool(gemini_client.warm_up)
+        logger.info("Gemini client ready")
+    except Exception as e:
+        logger.error(f"Gemini warm-up failed: {str(e)}")
+    if await run_in_threadpool(firebase_ready):
+        # Certificados do Firebase são baixados e renovados em segundo plano,
+        # fora do caminho das requisições
+        await certificate_store.run()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clientes pesados não são criados na importação, e sim aqui
+    warm_up = asyncio.create_task(_warm_up())
+    await interaction_recorder.start()
+    job_workers.start()
+    price_catalog_refresher.start()
+    yield
+    warm_up.cancel()
+    await price_catalog_refresher.stop()
+    # Jobs interrompidos aqui voltam para a fila quando o lease expira
+    await job_workers.stop()
+    job_queue.close()
+    # Grava as interações que ainda estão no buffer
+    await interaction_recorder.stop()
+    # Encerra os processos de extração de PDF e as conexões HTTP junto com a API
+    shutdown_extraction_pool()
+    http_client.close()
+
+app = FastAPI(title="Exam Mine API", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -32,6 +205,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Id por requisição (X-Request-ID) e histograma de latência por endpoint
+app.add_middleware(RequestContextMiddleware)
 
 async def get_current_user_from_token(authorization: str = Header(None)) -> Optional[dict]:
     """
@@ -41,13 +216,217 @@ async def get_current_user_from_token(authorization: str = Header(None)) -> Opti
     if not authorization or not authorization.startswith("Bearer "):
         return None
     token = authorization.replace("Bearer ", "")
-    return verify_firebase_token(token)
+    # Token já verificado: resolvido pelo cache, sem sair do event loop
+    claims = cached_token_claims(token)
+    if claims is not None:
+        return claims
+    # Verificação (RSA e, em último caso, download de certificados) fora do event loop
+    return await run_in_threadpool(verify_firebase_token, token)
+
+async def _read_exam_upload(file: UploadFile, current_user: Optional[dict]) -> Tuple[str, List[dict]]:
+    """
+    Valida autenticação, tamanho e extensão do upload e extrai o texto do PDF
+    e a tabela de marcadores laboratoriais.
+    Levanta HTTPException 401, 413, 415 ou 422 quando a validação falha.
+    """
+    logger.info(f"Processing exam upload for file: {file.filename}")
+
+    # Autenticação
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required for exam analysis"
+        )
+
+    # Validação de tamanho (5MB)
+    with stage("upload_read"):
+        contents = await file.read()
+    if len(contents) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large. Maximum size is 5MB."
+        )
+
+    # Validação de extensão
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Only PDF files are supported."
+        )
+
+    # Extração direto da memória (sem arquivo temporário); é CPU-bound,
+    # então roda fora do event loop
+    with stage("pdf_extract"):
+        exam_content, markers = await run_in_threadpool(extract_exam_content, contents)
+    if not exam_content or len(exam_content) < 10:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Could not extract text from the PDF."
+        )
+
+    return exam_content, markers
+
+def _read_zip_member(archive, info, limit: int) -> Optional[bytes]:
+    """
+    Lê um membro do .zip em blocos, parando assim que passa de limit bytes.
+    Retorna None quando o membro é maior que o limite.
+    """
+    chunks, size = [], 0
+    with archive.open(info) as member:
+        while True:
+            chunk = member.read(ZIP_READ_CHUNK_BYTES)
+            if not chunk:
+                return b"".join(chunks)
+            size += len(chunk)
+            if size > limit:
+                return None
+            chunks.append(chunk)
+
+def _expand_zip(filename: str, contents: bytes, max_files: int) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    Lista os PDFs de um .zip como (nome, bytes, erro).
+    Cada PDF está sujeito ao mesmo limite de 5MB do upload individual, e o
+    .zip inteiro a ZIP_MAX_UNCOMPRESSED_BYTES descompactados. Com mais de
+    max_files PDFs, o lote é recusado (413) antes de descompactar qualquer um.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                and info.filename.lower().endswith(".pdf")
+            ]
+            # Contagem pelo índice do .zip, sem ler dados (evita zip bombs)
+            if len(members) > max_files:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Too many files. Maximum is {BATCH_MAX_FILES} exams per batch."
+                )
+            entries = []
+            remaining = ZIP_MAX_UNCOMPRESSED_BYTES
+            for info in members:
+                label = f"{filename}/{info.filename}"
+                if info.file_size > MAX_UPLOAD_BYTES:
+                    entries.append((label, None, "File too large. Maximum size is 5MB."))
+                    continue
+                # O tamanho declarado no .zip não é confiável: lê no máximo o limite + 1 byte
+                data = _read_zip_member(archive, info, min(MAX_UPLOAD_BYTES, remaining))
+                if data is None and remaining < MAX_UPLOAD_BYTES:
+                    logger.error(f"ZIP upload {filename} exceeds {ZIP_MAX_UNCOMPRESSED_BYTES} bytes uncompressed")
+                    return [(filename, None, "ZIP file too large when uncompressed.")]
+                if data is None:
+                    entries.append((label, None, "File too large. Maximum size is 5MB."))
+                else:
+                    remaining -= len(data)
+                    entries.append((label, data, None))
+    except (zipfile.BadZipFile, RuntimeError) as e:
+        logger.error(f"Invalid ZIP upload {filename}: {e}")
+        return [(filename, None, "Invalid or encrypted ZIP file.")]
+
+    if not entries:
+        return [(filename, None, "No PDF files found in the ZIP file.")]
+    return entries
+
+async def _extract_batch(entries: List[Tuple[str, Optional[bytes], Optional[str]]]) -> list:
+    """
+    Extrai texto e marcadores dos PDFs do lote em paralelo, no máximo
+    BATCH_EXTRACT_CONCURRENCY ao mesmo tempo.
+    Retorna (nome, texto, marcadores, erro) na ordem de entrada.
+    """
+    semaphore = asyncio.Semaphore(BATCH_EXTRACT_CONCURRENCY)
+
+    async def extract(filename, contents, error):
+        if error:
+            return filename, None, None, error
+        async with semaphore:
+            try:
+                with stage("pdf_extract"):
+                    exam_content, markers = await run_in_threadpool(extract_exam_content, contents)
+            except Exception as e:
+                logger.error(f"Error extracting {filename}: {e}")
+                return filename, None, None, "Could not extract text from the PDF."
+        if not exam_content or len(exam_content) < 10:
+            return filename, None, None, "Could not extract text from the PDF."
+        return filename, exam_content, markers, None
+
+    return await asyncio.gather(*[extract(*entry) for entry in entries])
+
+async def _record_interaction(current_user: Optional[dict], agent_type: str, question: str, answer: str):
+    """
+    Registra a interação de um usuário autenticado na tabela `interactions`.
+    A escrita é feita em lote pelo interaction_recorder, fora do caminho da resposta.
+    """
+    email = (current_user or {}).get("email")
+    if email:
+        await interaction_recorder.record(email, agent_type, question, answer)
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Formata um evento Server-Sent Events com payload JSON."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(
+    chunks: AsyncIterator[str],
+    error_label: str,
+    on_done: Optional[Callable[[str], Awaitable[None]]] = None,
+    **start_data
+) -> StreamingResponse:
+    """
+    Retransmite os trechos gerados pelo Gemini como eventos SSE.
+    Envia `start` (com start_data), um `data` por trecho, `done` no final
+    ou `error` se o Gemini falhar no meio do stream.
+    Se o stream termina sem erro, on_done recebe o texto completo.
+    """
+    async def event_stream():
+        yield _sse_event(start_data, event="start")
+        parts = []
+        try:
+            async for text in chunks:
+                parts.append(text)
+                yield _sse_event({"text": text})
+        except Exception as e:
+            logger.error(f"{error_label}: {e}")
+            yield _sse_event({"detail": f"{error_label}: {e}"}, event="error")
+            return
+        yield _sse_event({}, event="done")
+        if on_done:
+            await on_done("".join(parts))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/")
 async def root():
     logger.info("Root endpoint called")
     return {"message": "Welcome to Exam Mine API"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Histogramas de latência por endpoint e por etapa, no formato do Prometheus."""
+    # Alguns componentes leem seus contadores do SQLite: fora do event loop
+    text = await asyncio.to_thread(render_metrics)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 200 quando Gemini, Firebase (se configurado) e os workers
+    de jobs estão prontos; 503 enquanto a inicialização não terminou.
+    """
+    checks = {
+        "gemini": gemini_client.gemini.ready,
+        "firebase": certificate_store.loaded if firebase_ready() else "disabled",
+        "job_workers": job_workers.running,
+    }
+    ready = all(check is not False for check in checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "starting", "checks": checks}
+    )
+
 @app.post("/agents/analyze-exam")
 async def analyze_exam_endpoint(
     file: UploadFile = File(...),
@@ -57,64 +436,253 @@ async def analyze_exam_endpoint(
     Processa upload de PDF de exame. Requer autenticação.
     """
     try:
-        logger.info(f"Processing exam upload for file: {file.filename}")
+        exam_content, markers = await _read_exam_upload(file, current_user)
 
-        # Autenticação
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required for exam analysis"
-            )
+        # Análise pelo Gemini
+        session_id = str(uuid4())
+        analysis_result = await analyze_exam(exam_content, session_id, markers)
+        await _record_interaction(current_user, EXAM_ANALYZER, f"Upload do arquivo: {file.filename}", analysis_result)
 
-        # Validação de tamanho (5MB)
-        contents = await file.read()
-        await file.seek(0)
-        if len(contents) > 5 * 1024 * 1024:
+        return {
+            "session_id": session_id,
+            "analysis": analysis_result
+        }
+
+    except HTTPException:
+        # Repassa 401, 413, 415, 422
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing exam: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error analyzing exam: {e}"
+        )
+
+@app.post("/agents/analyze-exam/stream")
+async def analyze_exam_stream_endpoint(
+    file: UploadFile = File(...),
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Variante em streaming (SSE) de /agents/analyze-exam. Requer autenticação.
+    O evento `start` traz o session_id; cada evento `data` traz um trecho da análise.
+    """
+    try:
+        exam_content, markers = await _read_exam_upload(file, current_user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing exam: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error analyzing exam: {e}"
+        )
+
+    session_id = str(uuid4())
+    question = f"Upload do arquivo: {file.filename}"
+    return _sse_response(
+        analyze_exam_stream(exam_content, session_id, markers),
+        "Error analyzing exam",
+        on_done=lambda analysis: _record_interaction(current_user, EXAM_ANALYZER, question, analysis),
+        session_id=session_id
+    )
+
+@app.post("/agents/analyze-exam/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def analyze_exam_job_endpoint(
+    file: UploadFile = File(...),
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Modo assíncrono de /agents/analyze-exam. Requer autenticação.
+    Responde 202 logo após validar e extrair o PDF; a análise pelo Gemini
+    roda em segundo plano. O resultado é consultado em /agents/jobs/{job_id}
+    (polling) ou /agents/jobs/{job_id}/events (SSE).
+    """
+    try:
+        exam_content, markers = await _read_exam_upload(file, current_user)
+
+        session_id = str(uuid4())
+        job_id = await run_in_threadpool(
+            job_queue.enqueue,
+            "analyze_exam",
+            {
+                "exam_content": exam_content,
+                "markers": markers,
+                "session_id": session_id,
+                "user_email": current_user.get("email"),
+                "question": f"Upload do arquivo: {file.filename}",
+                "request_id": request_id.get(),
+            },
+            current_user.get("uid")
+        )
+        job_workers.notify()
+
+        status_url = f"/agents/jobs/{job_id}"
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"job_id": job_id, "session_id": session_id, "status": "queued", "status_url": status_url},
+            headers={"Location": status_url, "Retry-After": "2"}
+        )
+
+    except HTTPException:
+        # Repassa 401, 413, 415, 422
+        raise
+    except Exception as e:
+        logger.error(f"Error queuing exam analysis: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error queuing exam analysis: {e}"
+        )
+
+async def _get_owned_job(job_id: str, current_user: Optional[dict]) -> dict:
+    """Busca o job do usuário autenticado; 401 sem login e 404 se não existir ou for de outro usuário."""
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None or job["owner"] != current_user.get("uid"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+def _job_response(job: dict) -> dict:
+    """Representação pública de um job."""
+    response = {"job_id": job["id"], "status": job["status"]}
+    if job["status"] == DONE:
+        response["analysis"] = job["result"]
+    elif job["status"] == FAILED:
+        response["detail"] = job["error"]
+    return response
+
+@app.get("/agents/jobs/{job_id}")
+async def job_status_endpoint(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Estado de um job de análise. Requer autenticação.
+    Com `wait` (segundos, até 30) a resposta espera o job terminar (long polling).
+    """
+    job = await _get_owned_job(job_id, current_user)
+    if wait and job["status"] not in (DONE, FAILED):
+        job = await job_workers.wait(job_id, wait) or job
+    return _job_response(job)
+
+@app.get("/agents/jobs/{job_id}/events")
+async def job_events_endpoint(
+    job_id: str,
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Acompanha um job via SSE. Requer autenticação.
+    Envia `start` com o estado atual, comentários de keep-alive enquanto o
+    job roda e `done` (com a análise) ou `error` quando ele termina.
+    """
+    job = await _get_owned_job(job_id, current_user)
+
+    async def event_stream():
+        current = job
+        yield _sse_event(_job_response(current), event="start")
+        while current["status"] not in (DONE, FAILED):
+            # Keep-alive evita que proxies encerrem a conexão ociosa
+            yield ": keep-alive\n\n"
+            current = await job_workers.wait(job_id, 15)
+            if current is None:
+                yield _sse_event({"job_id": job_id, "detail": "Job not found"}, event="error")
+                return
+        yield _sse_event(_job_response(current), event="done" if current["status"] == DONE else "error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/agents/analyze-exams")
+async def analyze_exams_endpoint(
+    files: List[UploadFile] = File(...),
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Analisa vários exames do mesmo paciente de uma vez: PDFs avulsos e/ou
+    arquivos .zip com PDFs. Requer autenticação.
+    Retorna o resultado de cada arquivo e um único session_id com todos os
+    exames, para perguntas de seguimento sobre o conjunto.
+    """
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required for exam analysis"
+        )
+
+    try:
+        entries = []
+        for file in files:
+            logger.info(f"Processing batch upload for file: {file.filename}")
+            with stage("upload_read"):
+                contents = await file.read()
+            filename = file.filename.lower()
+            if filename.endswith(".zip"):
+                if len(contents) > BATCH_MAX_FILES * MAX_UPLOAD_BYTES:
+                    entries.append((file.filename, None, "ZIP file too large."))
+                else:
+                    entries.extend(await run_in_threadpool(
+                        _expand_zip, file.filename, contents, max(0, BATCH_MAX_FILES - len(entries))
+                    ))
+            elif not filename.endswith(".pdf"):
+                entries.append((file.filename, None, "Only PDF and ZIP files are supported."))
+            elif len(contents) > MAX_UPLOAD_BYTES:
+                entries.append((file.filename, None, "File too large. Maximum size is 5MB."))
+            else:
+                entries.append((file.filename, contents, None))
+
+        if len(entries) > BATCH_MAX_FILES:
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="File too large. Maximum size is 5MB."
+                detail=f"Too many files. Maximum is {BATCH_MAX_FILES} exams per batch."
             )
 
-        # Validação de extensão
-        if not file.filename.lower().endswith(".pdf"):
+        extracted = await _extract_batch(entries)
+        exams = [(filename, exam_content, markers) for filename, exam_content, markers, error in extracted if not error]
+        if not exams:
             raise HTTPException(
-                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-                detail="Only PDF files are supported."
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=[{"filename": filename, "detail": error} for filename, _, _, error in extracted]
             )
 
-        # Salva temporariamente
-        temp_file_path = f"temp_{uuid4()}.pdf"
-        with open(temp_file_path, "wb") as buf:
-            buf.write(contents)
-
-        try:
-            exam_content = extract_pdf_content(temp_file_path)
-            if not exam_content or len(exam_content) < 10:
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail="Could not extract text from the PDF."
-                )
-        finally:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-
-        # Análise pelo Gemini
+        # Análise pelo Gemini, um exame por chamada, sob o limite de concorrência compartilhado
         session_id = str(uuid4())
-        analysis_result = analyze_exam(exam_content, session_id)
+        analyses = iter(await analyze_exam_batch(exams, session_id))
+
+        results = []
+        for filename, _, _, error in extracted:
+            if not error:
+                analysis = next(analyses)
+                error = analysis.get("error")
+            if error:
+                results.append({"filename": filename, "status": "error", "detail": error})
+            else:
+                results.append({"filename": filename, "status": "ok", "analysis": analysis["analysis"]})
+                await _record_interaction(current_user, EXAM_ANALYZER, f"Upload do arquivo: {filename}", analysis["analysis"])
 
         return {
             "session_id": session_id,
-            "analysis": analysis_result
+            "results": results
         }
 
     except HTTPException:
-        # Repassa 401, 413, 415, 422
+        # Repassa 401, 413, 422
         raise
     except Exception as e:
-        logger.error(f"Error analyzing exam: {e}")
+        logger.error(f"Error analyzing exam batch: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error analyzing exam: {e}"
+            detail=f"Error analyzing exam batch: {e}"
         )
 
 @app.post("/agents/exam-question")
@@ -135,7 +703,8 @@ async def exam_question_endpoint(
                 detail="Authentication required for exam questions"
             )
 
-        answer = analyze_and_answer(question, session_id)
+        answer = await analyze_and_answer(question, session_id)
+        await _record_interaction(current_user, EXAM_FOLLOW_UP, question, answer)
         return {"answer": answer}
 
     except HTTPException:
@@ -147,6 +716,30 @@ async def exam_question_endpoint(
             detail=f"Error processing exam question: {e}"
         )
 
+@app.post("/agents/exam-question/stream")
+async def exam_question_stream_endpoint(
+    question: str = Form(...),
+    session_id: str = Form(...),
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Variante em streaming (SSE) de /agents/exam-question. Requer autenticação.
+    """
+    logger.info(f"Processing streamed exam question: {question}, session_id: {session_id}")
+
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required for exam questions"
+        )
+
+    return _sse_response(
+        analyze_and_answer_stream(question, session_id),
+        "Error processing exam question",
+        on_done=lambda answer: _record_interaction(current_user, EXAM_FOLLOW_UP, question, answer),
+        session_id=session_id
+    )
+
 @app.post("/agents/medication-info")
 async def medication_info_endpoint(medication_name: str = Form(...)):
     """
@@ -154,7 +747,7 @@ async def medication_info_endpoint(medication_name: str = Form(...)):
     """
     try:
         logger.info(f"Looking up info for medication: {medication_name}")
-        info = search_medication_info(medication_name)
+        info = await search_medication_info(medication_name)
         return {"information": info}
     except Exception as e:
         logger.error(f"Error getting medication info: {e}")
@@ -170,7 +763,7 @@ async def medication_prices_endpoint(medication_name: str = Form(...)):
     """
     try:
         logger.info(f"Looking up prices for medication: {medication_name}")
-        prices = search_medication_prices(medication_name)
+        prices = await search_medication_prices(medication_name)
         return {"prices": prices}
     except Exception as e:
         logger.error(f"Error getting medication prices: {e}")
@@ -189,7 +782,8 @@ async def general_question_endpoint(
     """
     try:
         logger.info(f"Answering general health question: {question}")
-        answer = answer_general_question(question)
+        answer = await answer_general_question(question)
+        await _record_interaction(current_user, GENERAL_QUESTION, question, answer)
         return {"answer": answer}
     except Exception as e:
         logger.error(f"Error answering general question: {e}")
@@ -197,3 +791,18 @@ async def general_question_endpoint(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error answering general question: {e}"
         )
+
+@app.post("/agents/general-question/stream")
+async def general_question_stream_endpoint(
+    question: str = Form(...),
+    current_user: Optional[dict] = Depends(get_current_user_from_token)
+):
+    """
+    Variante em streaming (SSE) de /agents/general-question.
+    """
+    logger.info(f"Answering streamed general health question: {question}")
+    return _sse_response(
+        answer_general_question_stream(question),
+        "Error answering general question",
+        on_done=lambda answer: _record_interaction(current_user, GENERAL_QUESTION, question, answer)
+    )
@@ -0,0 +1,195 @@
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Everything but letters, digits, "+" and "-" separates words
+_SEPARATOR_RE = re.compile(r"[^\w+\-]+|_")
+_PLUS_RE = re.compile(r"\s*\+\s*")
+_VOWELS = set("aeiouy")
+
+# Inputs made only of these words name no medication ("preço do remédio", "teste")
+_FILLER_WORDS = {
+    "a", "o", "as", "os", "de", "do", "da", "dos", "das", "e", "um", "uma", "para", "pra", "por", "com", "sem",
+    "qual", "quais", "quanto", "quanta", "como", "onde", "que", "meu", "minha", "esse", "este", "isso",
+    "remedio", "remedios", "medicamento", "medicamentos", "medicacao", "droga", "generico", "bula", "preco",
+    "precos", "valor", "custa", "comprar", "farmacia", "informacao", "informacoes", "sobre",
+    "oi", "ola", "bom", "dia", "tarde", "noite", "obrigado", "obrigada", "teste", "test", "testando",
+    "nada", "nenhum", "nao", "sim", "sei", "la", "ok", "hello", "hi",
+}
+
+# Longest input, in words, that can still be a medication name with a dose
+_MAX_INPUT_WORDS = 8
+
+# Shortest name corrected for a typo; shorter ones are searched as typed
+_MIN_CORRECTED_LENGTH = 5
+
+
+def fold_name(text):
+    """Case and accents removed, whitespace collapsed: "  Dipirôna " -> "dipirona" """
+    folded = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return ' '.join(folded.split())
+
+
+def _words(text):
+    # "amoxicilina+clavulanato!" -> ["amoxicilina", "+", "clavulanato"]
+    return _SEPARATOR_RE.sub(' ', _PLUS_RE.sub(' + ', text)).split()
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def edit_distance(a, b, limit):
+    """
+    Edit distance counting an adjacent transposition as one edit
+
+    Returns limit + 1 as soon as the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class MedicationNameIndex:
+    """
+    Resolves user input to the canonical spelling of a known medication name.
+
+    Names come from a text file with one medication per line, the canonical
+    name followed by "|"-separated variants; "#" starts a comment. Input is
+    compared with case, accents and punctuation removed: first exactly, then
+    allowing a single typo, and only when exactly one medication is that
+    close (candidates come from a trigram index). Many different drugs are
+    two edits apart (oxazepam, diazepam), so a name that is not in the list
+    is searched as typed rather than turned into its nearest neighbour.
+    Words after the name, such as the dose, are kept. The file is read on
+    first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        # folded variant -> canonical name
+        self._exact = {}
+        self._variants = []
+        self._trigram_index = {}
+        self._max_words = 1
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                logger.error(f"Could not read medication names from {self.path}: {str(e)}")
+                lines = []
+            for line in lines:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                names = [' '.join(name.split()) for name in line.split('|')]
+                canonical = names[0]
+                for name in names:
+                    variant = fold_name(' '.join(_words(name)))
+                    if not variant or variant in self._exact:
+                        continue
+                    self._exact[variant] = canonical
+                    self._variants.append((variant, canonical))
+                    self._max_words = max(self._max_words, len(variant.split()))
+            for position, (variant, _) in enumerate(self._variants):
+                for trigram in _trigrams(variant):
+                    self._trigram_index.setdefault(trigram, []).append(position)
+            self._loaded = True
+            logger.info(f"Loaded {len(self._variants)} medication names from {self.path}")
+
+    def __len__(self):
+        self._load()
+        return len(self._variants)
+
+    def resolve(self, text):
+        """
+        Canonical spelling of a medication name
+
+        Args:
+            text (str): Medication name as the user typed it
+
+        Returns:
+            tuple: (name, matched). name is the canonical name followed by the
+            rest of the input (e.g. "losartan 50mg" -> "losartana 50mg"), the
+            cleaned input when it matches no known name, or None when the
+            input is obviously not a medication. matched is the known
+            canonical name, or None.
+        """
+        self._load()
+        words = _words(text)
+        folded = [fold_name(word) for word in words]
+        if _is_not_a_medication(folded):
+            return None, None
+
+        # The name comes before the dose or presentation ("500mg", "20"); the
+        # first word always counts, as some names hold digits ("b12", "d3")
+        name_words = next((i for i, word in enumerate(folded) if i and any(c.isdigit() for c in word)), len(folded))
+        lengths = range(min(name_words, self._max_words), 0, -1)
+        for match in (self._exact.get, self._closest):
+            for length in lengths:
+                canonical = match(' '.join(folded[:length]))
+                if canonical:
+                    rest = [word.lower() for word in words[length:]]
+                    return ' '.join([canonical] + rest), canonical
+        return ' '.join(words), None
+
+    def _closest(self, candidate):
+        """Canonical name of the only medication one typo away from candidate, or None"""
+        if len(candidate) < _MIN_CORRECTED_LENGTH or any(c.isdigit() for c in candidate):
+            return None
+        query = _trigrams(candidate)
+        shared = Counter()
+        for trigram, count in query.items():
+            for position in self._trigram_index.get(trigram, ()):
+                shared[position] += count
+        # One edit (or swap of adjacent letters) changes at most four trigrams
+        needed = sum(query.values()) - 4
+        matches = set()
+        for position, count in shared.items():
+            variant, canonical = self._variants[position]
+            if count >= needed and edit_distance(candidate, variant, 1) <= 1:
+                matches.add(canonical)
+        if len(matches) != 1:
+            return None
+        return matches.pop()
+
+
+def _is_not_a_medication(words):
+    # Short names are fine when they mix in digits or letters: "B12", "D3", "CBD"
+    letters = sum(c.isalpha() for word in words for c in word)
+    characters = sum(c.isalnum() for word in words for c in word)
+    if not letters or characters < 2 or len(words) > _MAX_INPUT_WORDS:
+        return True
+    if any(word.startswith(('http', 'www')) or '@' in word for word in words):
+        return True
+    alphabetic = [word for word in words if word.isalpha()]
+    if alphabetic and all(word in _FILLER_WORDS for word in alphabetic):
+        return True
+    # Keyboard mashing: no word has a vowel and one is too long to be an
+    # abbreviation ("sdfgh", but not "CBD")
+    return (any(len(word) >= 5 for word in alphabetic)
+            and not any(_VOWELS & set(word) for word in alphabetic))
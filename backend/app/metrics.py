@@ -0,0 +1,243 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Request being served, for log lines and metric labels. Both follow the
+# request into tasks and worker threads started with a copy of the context.
+request_id = ContextVar("request_id", default="-")
+current_endpoint = ContextVar("current_endpoint", default="")
+
+# Upper bounds in seconds; Gemini calls can take tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REQUEST_ID_RE = re.compile(r'^[\w.\-]{1,64}$')
+
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram with labels.
+
+    Rendered in the Prometheus text format by render(); cumulative bucket
+    counts are computed at render time, so observe() touches one bucket.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def series(self):
+        """Snapshot of {label values: (cumulative bucket counts, sum, count)}"""
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        result = {}
+        for key, (counts, total, count) in snapshot.items():
+            cumulative, running = [], 0
+            for bucket_count in counts:
+                running += bucket_count
+                cumulative.append(running)
+            result[key] = (cumulative, total, count)
+        return result
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (cumulative, total, count) in sorted(self.series().items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = labels + "," if labels else ""
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), cumulative):
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {bucket_count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class StatsMetric:
+    """
+    Gauges and counters read from components' stats() dicts at render time.
+
+    `collect` returns a list of (labels, stats) pairs, one per instance
+    (e.g. ({"cache": "medication-info"}, cache.stats())). Each numeric stats
+    key becomes the metric <prefix>_<key>: a counter, with the _total
+    suffix, when listed in `counters`, a gauge otherwise.
+    """
+
+    def __init__(self, prefix, documentation, collect, counters=()):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.collect = collect
+        self.counters = frozenset(counters)
+
+    def render(self):
+        try:
+            samples = self.collect()
+        except Exception as e:
+            logger.error(f"Could not collect {self.prefix} metrics: {str(e)}")
+            return []
+        keys = {}
+        for _, stats in samples:
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    keys.setdefault(key, None)
+        lines = []
+        for key in keys:
+            counter = key in self.counters
+            name = f"{self.prefix}_{key}_total" if counter else f"{self.prefix}_{key}"
+            lines.append(f"# HELP {name} {self.documentation}: {key.replace('_', ' ')}")
+            lines.append(f"# TYPE {name} {'counter' if counter else 'gauge'}")
+            for labels, stats in samples:
+                if key in stats:
+                    rendered = ",".join(f'{label}="{_escape(str(value))}"' for label, value in labels.items())
+                    lines.append(f"{name}{{{rendered}}} {stats[key]}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "exam_mine_request_duration_seconds",
+    "Time to serve an HTTP request, until the last byte of the response",
+    ["endpoint", "method", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "exam_mine_stage_duration_seconds",
+    "Time spent in one pipeline stage (upload_read, pdf_extract, prompt_build, gemini_call, scrape, html_parse...); "
+    "source is the pharmacy or bula site for scraper stages and the agent for prompt_build",
+    ["endpoint", "stage", "source", "outcome"],
+)
+
+_registry = [REQUEST_SECONDS, STAGE_SECONDS]
+
+
+def register(metric):
+    """Add a metric (anything with render()) to the /metrics output"""
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def observe_stage(stage, seconds, outcome="ok", source=""):
+    """Record the duration of a pipeline stage under the current endpoint"""
+    STAGE_SECONDS.observe(seconds, endpoint=current_endpoint.get(), stage=stage, source=source, outcome=outcome)
+
+
+class _StageTimer:
+    def __init__(self):
+        self.outcome = "ok"
+
+
+@contextmanager
+def stage(name, source=""):
+    """
+    Time a block as a pipeline stage
+
+    The outcome is "ok" unless the block sets another one on the yielded
+    timer (e.g. timer.outcome = "empty"), or "error" if it raises without
+    setting one.
+    """
+    timer = _StageTimer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        if timer.outcome == "ok":
+            timer.outcome = "error"
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - started, timer.outcome, source)
+
+
+def install_request_id_logging():
+    """Add the current request id to every log record, as %(request_id)s"""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_request_id", False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.request_id = request_id.get()
+        return record
+
+    record_factory.adds_request_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+def _route_path(scope):
+    # Route templates (/agents/jobs/{job_id}) keep the endpoint label bounded
+    from starlette.routing import Match
+
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that assigns each request an id and times it.
+
+    The id comes from the X-Request-ID header when it is a short token,
+    otherwise a new one is generated; it is echoed in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        rid = incoming if _REQUEST_ID_RE.match(incoming) else uuid4().hex
+        endpoint = _route_path(scope)
+        rid_token = request_id.set(rid)
+        endpoint_token = current_endpoint.set(endpoint)
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=scope["method"], status=status_code)
+            request_id.reset(rid_token)
+            current_endpoint.reset(endpoint_token)
@@ -1,54 +1,210 @@
 import fitz  # PyMuPDF
 import logging
+import math
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .lab_markers import parse_markers
 
 logger = logging.getLogger("exam-analyzer-api")
 
-def extract_pdf_content(file_path):
+# Documents with at least this many pages are sharded across the worker pool;
+# smaller ones are cheaper to extract in-process than to ship to a worker
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+# Number of extraction worker processes
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Workers are replaced after this many shards to contain PyMuPDF memory growth
+PDF_WORKER_MAX_TASKS = int(os.getenv("PDF_WORKER_MAX_TASKS", "50"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _open_document(source):
+    """
+    Open a PDF from a path or raw bytes
+
+    Bytes are handed to fitz.open(stream=...) so the document is parsed
+    straight from memory without touching the filesystem.
+    """
+    if isinstance(source, bytes):
+        logger.info(f"Opening PDF from memory: {len(source)} bytes")
+        return fitz.open(stream=source, filetype="pdf")
+
+    logger.info(f"Opening PDF file: {source}")
+    # Make sure the file exists
+    if not os.path.isfile(source):
+        logger.error(f"PDF file not found: {source}")
+        raise FileNotFoundError(f"PDF file not found: {source}")
+    return fitz.open(source)
+
+def _page_text(page, index):
+    """Extract one page's text, substituting a marker if the page fails"""
+    try:
+        # Get text with explicit UTF-8 handling
+        text = page.get_text()
+        # Ensure text is valid UTF-8
+        if not isinstance(text, str):
+            text = text.decode('utf-8', errors='replace')
+        return text
+    except Exception as e:
+        logger.error(f"Error extracting text from page {index+1}: {str(e)}")
+        # Continue with next page instead of failing completely
+        return f"\n[Error extracting text from page {index+1}]\n"
+
+def _page_rows(page):
+    """
+    Rebuild the visual rows of a page from PyMuPDF word positions
+
+    Table cells (marker, value, unit, reference range) are often separate text
+    blocks, so get_text() puts them on separate lines. Grouping words by their
+    vertical center and ordering them left to right restores one row per marker.
+    """
+    rows = []
+    for x0, y0, x1, y1, word, *_ in sorted(page.get_text("words"), key=lambda w: (w[1] + w[3], w[0])):
+        center = (y0 + y1) / 2
+        if rows and abs(center - rows[-1][0]) <= (y1 - y0) / 2:
+            rows[-1][1].append((x0, word))
+        else:
+            rows.append((center, [(x0, word)]))
+    return [" ".join(word for _, word in sorted(words)) for _, words in rows]
+
+def _page_markers(page, index):
+    """Parse the lab markers of one page, returning none if the page fails"""
+    try:
+        return parse_markers(_page_rows(page))
+    except Exception as e:
+        logger.error(f"Error extracting lab markers from page {index+1}: {str(e)}")
+        return []
+
+def _page_content(page, index, with_markers):
+    """Text of a page and, when requested, its lab markers"""
+    return _page_text(page, index), (_page_markers(page, index) if with_markers else [])
+
+def _extract_page_range(source, start, stop, with_markers=False):
+    """
+    Worker entry point: extract pages [start, stop) of a document
+
+    Runs in a pool process, so it reopens the document from the path or bytes.
+    Markers are parsed in the worker so only the compact table is sent back.
+
+    Returns:
+        list[tuple]: (page text, page markers) in page order
+    """
+    if isinstance(source, bytes):
+        doc = fitz.open(stream=source, filetype="pdf")
+    else:
+        doc = fitz.open(source)
+    with doc:
+        return [_page_content(doc[i], i, with_markers) for i in range(start, stop)]
+
+def _get_pool():
+    """Return the shared extraction pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" is required for max_tasks_per_child and avoids forking
+            # a process that holds the event loop and open sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=PDF_WORKER_MAX_TASKS,
+            )
+            logger.info(f"PDF extraction pool started with {PDF_WORKERS} workers")
+        return _pool
+
+def shutdown_extraction_pool():
+    """Stop the extraction worker pool, if it was started"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+            logger.info("PDF extraction pool stopped")
+
+def _extract_parallel(source, page_count, with_markers):
+    """Shard the page range across the pool and reassemble pages in page order"""
+    shard_size = math.ceil(page_count / PDF_WORKERS)
+    bounds = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+    pool = _get_pool()
+    futures = [pool.submit(_extract_page_range, source, start, stop, with_markers) for start, stop in bounds]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+def extract_pdf_content(source):
     """
-    Extract text content from a PDF file
-    
+    Extract text content from a PDF
+
+    Documents with PDF_PARALLEL_MIN_PAGES pages or more are split into page
+    shards extracted by a reusable process pool; smaller ones are extracted
+    in the calling thread.
+
     Args:
-        file_path (str): Path to the PDF file
-        
+        source (str | bytes | file-like): Path to the PDF file, the PDF bytes,
+            or a binary buffer positioned at the start of the PDF
+
     Returns:
         str: Extracted text content
     """
-    logger.info(f"Opening PDF file: {file_path}")
+    return _extract(source, with_markers=False)[0]
+
+def extract_exam_content(source):
+    """
+    Extract the text and the lab marker table of an exam PDF
+
+    Same as extract_pdf_content, plus the (marker, value, unit, reference
+    range, status) rows parsed from the word positions of each page.
+
+    Args:
+        source (str | bytes | file-like): Path to the PDF file, the PDF bytes,
+            or a binary buffer positioned at the start of the PDF
+
+    Returns:
+        tuple: (extracted text, list of marker dicts)
+    """
+    return _extract(source, with_markers=True)
+
+def _extract(source, with_markers):
     try:
-        # Make sure the file exists
-        if not os.path.isfile(file_path):
-            logger.error(f"PDF file not found: {file_path}")
-            raise FileNotFoundError(f"PDF file not found: {file_path}")
-            
-        # Open the PDF file with error handling
+        # Buffers are read once so the bytes can also be shipped to workers
+        if hasattr(source, "read"):
+            source = source.read()
+        if isinstance(source, (bytearray, memoryview)):
+            source = bytes(source)
+
+        # Open the PDF with error handling
         try:
-            doc = fitz.open(file_path)
+            doc = _open_document(source)
             logger.info(f"PDF opened successfully: {doc.page_count} pages")
+        except FileNotFoundError:
+            raise
         except Exception as e:
             logger.error(f"Error opening PDF: {str(e)}")
             raise Exception(f"Could not open PDF file: {str(e)}")
-        
-        # Extract text from each page with explicit UTF-8 handling
-        text_content = ""
-        for i, page in enumerate(doc):
-            logger.info(f"Processing page {i+1}/{doc.page_count}")
-            try:
-                # Get text with explicit UTF-8 handling
-                text = page.get_text()
-                # Ensure text is valid UTF-8
-                if not isinstance(text, str):
-                    text = text.decode('utf-8', errors='replace')
-                text_content += text
-                logger.info(f"Page {i+1} processed: {len(text)} characters extracted")
-            except Exception as e:
-                logger.error(f"Error extracting text from page {i+1}: {str(e)}")
-                # Continue with next page instead of failing completely
-                text_content += f"\n[Error extracting text from page {i+1}]\n"
-        
-        logger.info(f"PDF content extraction complete: {len(text_content)} characters total")
-        return text_content
-        
+
+        with doc:
+            page_count = doc.page_count
+            pages = None
+            if PDF_WORKERS > 1 and page_count >= PARALLEL_MIN_PAGES:
+                try:
+                    pages = _extract_parallel(source, page_count, with_markers)
+                except BrokenProcessPool as e:
+                    logger.error(f"PDF extraction pool failed, falling back to serial: {str(e)}")
+                    shutdown_extraction_pool()
+            if pages is None:
+                pages = [_page_content(page, i, with_markers) for i, page in enumerate(doc)]
+
+        text_content = "".join(text for text, _ in pages)
+        markers = [marker for _, page_markers in pages for marker in page_markers]
+        logger.info(f"PDF content extraction complete: {page_count} pages, {len(text_content)} characters total")
+        if with_markers:
+            logger.info(f"Lab markers extracted: {len(markers)}")
+        return text_content, markers
+
     except Exception as e:
         logger.error(f"Error extracting PDF content: {str(e)}")
-        raise Exception(f"Failed to extract PDF content: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to extract PDF content: {str(e)}")
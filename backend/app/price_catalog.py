@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .medication_names import fold_name
+from .metrics import current_endpoint
+from .rate_limiter import TokenBucket
+from .scrapers import _source_key, _submit_async, _timed_call
+
+logger = logging.getLogger("exam-analyzer-api")
+
+class PriceCatalog:
+    """
+    Local index of scraped medication prices, backed by a single SQLite file.
+
+    Products are stored per medication (the normalized name that was
+    searched) and source, with the time they were scraped. A medication is
+    only ever answered from its own products, never from products stored
+    for another name (a "losartana + hidroclorotiazida" row found for
+    losartana says nothing about hidroclorotiazida alone). Data older than
+    `max_age` seconds is not served.
+
+    Requests are counted in memory by note_request() and written by
+    flush_demand(), so the request path never writes to disk. An empty path
+    disables the catalog.
+    """
+
+    def __init__(self, path, max_age=6 * 3600.0, min_matches=3, max_products=15, clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.min_matches = min_matches
+        self.max_products = max_products
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = None
+        # key -> [name, requests, last requested at]
+        self._demand = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS medications (
+                    key TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    last_requested REAL,
+                    refreshed_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS medications_requests_idx ON medications(requests);
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY,
+                    medication_key TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    price_text TEXT,
+                    url TEXT,
+                    scraped_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS products_medication_idx ON products(medication_key, source);
+                CREATE INDEX IF NOT EXISTS products_scraped_at_idx ON products(scraped_at);
+                -- Product name search of earlier versions, no longer used
+                DROP TRIGGER IF EXISTS products_fts_insert;
+                DROP TRIGGER IF EXISTS products_fts_delete;
+                DROP TABLE IF EXISTS products_fts;
+                """
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Price catalog opened at {self.path}")
+        return self._conn
+
+    def note_request(self, key, name):
+        """Count a price request for a medication (in memory until flush_demand)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._demand.setdefault(key, [name, 0, 0.0])
+            entry[1] += 1
+            entry[2] = self._clock()
+
+    def flush_demand(self):
+        """Add the request counts noted since the last flush to the database"""
+        with self._lock:
+            demand, self._demand = self._demand, {}
+            if not demand:
+                return
+            conn = self._connection()
+            conn.executemany(
+                """
+                INSERT INTO medications (key, name, requests, last_requested) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    last_requested = MAX(COALESCE(last_requested, 0), excluded.last_requested)
+                """,
+                [(key, name, count, at) for key, (name, count, at) in demand.items()]
+            )
+            conn.commit()
+
+    def due(self, top_n, refresh_age, demand_window):
+        """
+        The most requested medications whose prices need a refresh
+
+        Args:
+            top_n (int): How many of the most requested medications to keep fresh
+            refresh_age (float): Refresh prices older than this, in seconds
+            demand_window (float): Only count medications requested this recently
+
+        Returns:
+            list: (key, name) of the medications to refresh, most requested first
+        """
+        now = self._clock()
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT key, name, refreshed_at FROM medications WHERE last_requested >= ? "
+                "ORDER BY requests DESC LIMIT ?",
+                (now - demand_window, top_n)
+            ).fetchall()
+        return [(key, name) for key, name, refreshed_at in rows
+                if refreshed_at is None or refreshed_at < now - refresh_age]
+
+    def store(self, key, name, products, sources=None, complete=True):
+        """
+        Replace the stored products of a medication
+
+        Args:
+            key (str): Normalized medication name
+            name (str): Medication name as searched
+            products (list): Product dicts as returned by MedicationPriceScraper
+            sources (list, optional): Only replace the products of these
+                sources, keeping the others; all are replaced when None
+            complete (bool): Whether every source answered, which marks the
+                medication as refreshed
+        """
+        now = self._clock()
+        rows = [
+            (key, product.get('source', ''), product['name'], product['price'],
+             product.get('price_text'), product.get('url'), now)
+            for product in products if product.get('name') and product.get('price')
+        ]
+        with self._lock:
+            conn = self._connection()
+            if sources is None:
+                conn.execute("DELETE FROM products WHERE medication_key = ?", (key,))
+            else:
+                conn.executemany("DELETE FROM products WHERE medication_key = ? AND source = ?",
+                                 [(key, source) for source in sources])
+            conn.executemany(
+                "INSERT INTO products (medication_key, source, name, price, price_text, url, scraped_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT INTO medications (key, name, refreshed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET refreshed_at = COALESCE(excluded.refreshed_at, refreshed_at)",
+                (key, name, now if complete else None)
+            )
+            conn.commit()
+
+    def store_search(self, key, name, result):
+        """
+        Store the result of a live MedicationPriceScraper.search
+
+        Products are replaced exactly for the sources that answered, with
+        products or without ("ok" or "empty"); sources that timed out or
+        failed keep their earlier products, and the medication only counts
+        as refreshed when every source answered.
+        """
+        if not self.enabled or not result:
+            return
+        products = result.get('products', [])
+        timings = result.get('timings', {})
+        answered = [timing for timing in timings.values() if timing.get('status') in ('ok', 'empty')]
+        if timings and not answered:
+            return
+        complete = len(answered) == len(timings)
+        sources = None
+        if not complete:
+            sources = {timing['source_name'] for timing in answered if timing.get('source_name')}
+            sources.update(product.get('source', '') for product in products)
+        try:
+            self.store(key, name, products, sources=sources, complete=complete)
+        except sqlite3.Error as e:
+            logger.error(f"Could not store prices of {name} in the catalog: {str(e)}")
+
+    def lookup(self, key, name):
+        """
+        Prices of a medication from the catalog, if fresh enough
+
+        A medication refreshed within `max_age` is answered with its own
+        products. One whose last refresh was partial (a source failed) is
+        answered with its own fresh products whose names start with the
+        medication name, when there are at least `min_matches` of them.
+
+        Returns:
+            dict: Same shape as MedicationPriceScraper.search, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        now = self._clock()
+        fresh_since = now - self.max_age
+        columns = "p.source, p.name, p.price, p.price_text, p.url, p.scraped_at"
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute("SELECT refreshed_at FROM medications WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] is not None and row[0] >= fresh_since:
+                    rows = conn.execute(
+                        f"SELECT {columns} FROM products p WHERE p.medication_key = ? AND p.scraped_at >= ? "
+                        "ORDER BY p.price LIMIT ?",
+                        (key, fresh_since, self.max_products)
+                    ).fetchall()
+                elif row is not None:
+                    rows = self._own_products(conn, key, fresh_since)
+                    if len(rows) < self.min_matches:
+                        rows = None
+                else:
+                    rows = None
+        except sqlite3.Error as e:
+            logger.error(f"Price catalog lookup failed for {name}: {str(e)}")
+            return None
+
+        if rows is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        products = [
+            {"name": product_name, "price": price, "price_text": price_text, "url": url, "source": source}
+            for source, product_name, price, price_text, url, _ in rows
+        ]
+        return {
+            "query": name,
+            "sources": list(dict.fromkeys(product['source'] for product in products)),
+            "products": products,
+            "timings": {},
+            "catalog_age": round(now - min((r[5] for r in rows), default=now), 1),
+        }
+
+    def _own_products(self, conn, key, fresh_since):
+        # Sites also list combinations and other drugs for a name; only
+        # products named after the medication (before any dose) are kept
+        words = key.split()
+        prefix = ' '.join(words[:next((i for i, word in enumerate(words) if any(c.isdigit() for c in word)), len(words))])
+        if not prefix:
+            return []
+        rows = conn.execute(
+            "SELECT p.source, p.name, p.price, p.price_text, p.url, p.scraped_at FROM products p "
+            "WHERE p.medication_key = ? AND p.scraped_at >= ? ORDER BY p.price",
+            (key, fresh_since)
+        ).fetchall()
+        return [row for row in rows if fold_name(row[1]).startswith(prefix)][:self.max_products]
+
+    def prune(self, retention):
+        """Delete products scraped, and medications requested, more than retention seconds ago"""
+        cutoff = self._clock() - retention
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM products WHERE scraped_at < ?", (cutoff,))
+            conn.execute("DELETE FROM medications WHERE COALESCE(last_requested, refreshed_at, 0) < ?", (cutoff,))
+            conn.commit()
+
+    def stats(self):
+        """Return counters, stored rows and how many medications are fresh enough to serve"""
+        fresh_since = self._clock() - self.max_age
+        with self._lock:
+            conn = self._connection()
+            medications, fresh = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(refreshed_at >= ?), 0) FROM medications", (fresh_since,)
+            ).fetchone()
+            products = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        return {"medications": medications, "fresh_medications": fresh, "products": products,
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SitePoliteness:
+    """
+    Minimum interval between background requests to the same site.
+
+    Callers for one site queue in arrival order; different sites do not wait
+    on each other. `sleep` and `clock` can be replaced to drive it from a test.
+    """
+
+    def __init__(self, min_interval, clock=time.monotonic, sleep=asyncio.sleep):
+        self.min_interval = min_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = {}
+        self._locks = {}
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    async def wait(self, site):
+        """Wait until a request to site keeps the minimum interval"""
+        if self.min_interval <= 0:
+            return
+        lock = self._locks.setdefault(site, asyncio.Lock())
+        async with lock:
+            bucket = self._buckets.get(site)
+            if bucket is None:
+                bucket = self._buckets[site] = TokenBucket(1, 1.0 / self.min_interval, self._clock)
+            delay = bucket.wait_time(1)
+            if delay > 0:
+                self.waits += 1
+                self.waited_seconds += delay
+                await self._sleep(delay)
+            bucket.consume(1)
+
+    def stats(self):
+        return {
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+class PriceCatalogRefresher:
+    """
+    Background task keeping the catalog fresh for the most requested medications.
+
+    Every `interval` seconds it writes the noted request counts, picks the
+    `top_n` medications requested within `demand_window` whose prices are
+    older than `refresh_age`, and scrapes them one at a time. The sources of
+    a medication are queried concurrently, but requests to each site are at
+    least `site_interval` seconds apart. Medications where a source failed
+    are retried on the next round.
+    """
+
+    def __init__(self, catalog, scraper, top_n=50, interval=900.0, refresh_age=3 * 3600.0,
+                 site_interval=10.0, demand_window=7 * 24 * 3600.0, initial_delay=60.0):
+        self.catalog = catalog
+        self.scraper = scraper
+        self.top_n = top_n
+        self.interval = interval
+        self.refresh_age = refresh_age
+        self.demand_window = demand_window
+        self.initial_delay = initial_delay
+        self.politeness = SitePoliteness(site_interval)
+        self._task = None
+        self.refreshed = 0
+        self.failed = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def stats(self):
+        return {
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            **self.politeness.stats(),
+        }
+
+    def start(self):
+        """Start the refresh loop on the running event loop"""
+        if self._task is not None or not self.catalog.enabled or self.top_n <= 0:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Price catalog refresher started: top {self.top_n} medications every {self.interval}s")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Price catalog refresher stopped")
+
+    async def _run(self):
+        # Scrape stages of the refresh are labeled apart from the endpoints
+        current_endpoint.set("price_catalog_refresh")
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.error(f"Price catalog refresh failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh_once(self):
+        """
+        Run one refresh round
+
+        Returns:
+            int: Number of medications refreshed
+        """
+        await asyncio.to_thread(self.catalog.flush_demand)
+        await asyncio.to_thread(self.catalog.prune, self.demand_window)
+        due = await asyncio.to_thread(self.catalog.due, self.top_n, self.refresh_age, self.demand_window)
+        refreshed = 0
+        for key, name in due:
+            results = await asyncio.gather(*[self._scrape(source_func, name) for source_func in self.scraper.sources])
+            answered = [result for result in results if result is not None]
+            if len(answered) < len(results):
+                self.failed += 1
+            if not answered:
+                continue
+            products = [product for result in answered for product in result.get('products', [])]
+            await asyncio.to_thread(
+                self.catalog.store, key, name, products,
+                [result.get('source_name') for result in answered], len(answered) == len(results)
+            )
+            refreshed += 1
+        self.refreshed += refreshed
+        if due:
+            logger.info(f"Price catalog refreshed {refreshed} of {len(due)} medications")
+        return refreshed
+
+    async def _scrape(self, source_func, name):
+        # Each source is one site
+        await self.politeness.wait(_source_key(source_func))
+        try:
+            result, _ = await _submit_async(_timed_call, source_func, name)
+        except Exception as e:
+            logger.error(f"Error refreshing {name} from {source_func.__name__}: {str(e)}")
+            return None
+        return result
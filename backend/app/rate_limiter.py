@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("exam-analyzer-api")
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second up to `capacity`.
+
+    Not synchronized on its own; RateLimiter serializes access.
+    """
+
+    def __init__(self, capacity, rate, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (0 if they already are)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Client-side limiter for requests per minute and tokens per minute.
+
+    Callers queue in arrival order: acquire() holds an asyncio lock while it
+    waits for both buckets, so a large request is not starved by small ones.
+    `sleep` and `clock` can be replaced to drive the limiter from a test.
+    """
+
+    def __init__(self, rpm, tpm, clock=time.monotonic, sleep=asyncio.sleep):
+        self.requests = TokenBucket(rpm, rpm / 60.0, clock)
+        self.tokens = TokenBucket(tpm, tpm / 60.0, clock)
+        self._sleep = sleep
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    async def acquire(self, tokens=0):
+        """
+        Wait until one request and `tokens` tokens fit in the current budget
+
+        Args:
+            tokens (int): Estimated tokens the request will consume
+        """
+        async with self._lock:
+            while True:
+                delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if delay <= 0:
+                    break
+                self.waits += 1
+                self.waited_seconds += delay
+                logger.info(f"Gemini rate limit reached, waiting {delay:.2f}s")
+                await self._sleep(delay)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+
+    def stats(self):
+        return {
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
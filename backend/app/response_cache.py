@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("exam-analyzer-api")
+
+
+class ResponseCache:
+    """
+    In-memory TTL cache of final agent responses with stale-while-revalidate.
+
+    An entry younger than `ttl` is served as is. Between `ttl` and
+    `ttl + stale_ttl` it is still served immediately, but a background task
+    recomputes it. Older entries count as misses and the caller waits for the
+    computation. Entries are evicted in LRU order beyond `max_entries` or
+    `max_bytes` (UTF-8 size of the cached text).
+
+    Meant to be used from the event loop only.
+    """
+
+    def __init__(self, name, ttl, stale_ttl, max_entries=2000, max_bytes=32 * 1024 * 1024,
+                 clock=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        # key -> (value, size in bytes, stored at)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.evictions = 0
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return the cached response for key, computing it when needed
+
+        Args:
+            key (str): Normalized cache key
+            compute (callable): Coroutine function returning the response text
+
+        Returns:
+            str: The cached or freshly computed response
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, _, stored_at = entry
+            age = self._clock() - stored_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._schedule_refresh(key, compute)
+                return value
+
+        self.misses += 1
+        value = await compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store a response, evicting least recently used entries beyond the limits"""
+        self._remove(key)
+        size = len(value.encode('utf-8'))
+        self._entries[key] = (value, size, self._clock())
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            evicted_key, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+            logger.info(f"{self.name} cache evicted: {evicted_key}")
+
+    def stats(self):
+        """Return counters and current usage"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _schedule_refresh(self, key, compute):
+        # One refresh per key at a time; the task is referenced until it ends
+        if key in self._refreshing:
+            return
+        task = asyncio.get_running_loop().create_task(self._refresh(key, compute))
+        self._refreshing[key] = task
+
+    async def _refresh(self, key, compute):
+        try:
+            value = await compute()
+            self.put(key, value)
+            self.refreshes += 1
+            logger.info(f"{self.name} cache refreshed: {key}")
+        except Exception as e:
+            # Keep serving the stale value; the next stale hit retries
+            self.refresh_failures += 1
+            logger.error(f"{self.name} cache refresh failed for {key}: {str(e)}")
+        finally:
+            self._refreshing.pop(key, None)
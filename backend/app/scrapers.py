@@ -1,16 +1,160 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
 import requests
 import logging
-from bs4 import BeautifulSoup
-import re
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import quote
 
+from . import http_client
+from .html_extract import ProductListing, Selector, css_class, parse_html, parse_price
+from .metrics import stage
+
 # Set up logger
 logger = logging.getLogger("exam-analyzer-api")
 
+# Overall time budget (seconds) for a price search across all pharmacies
+PRICE_SEARCH_DEADLINE = float(os.getenv("PRICE_SEARCH_DEADLINE_SECONDS", "12"))
+
+# Overall time budget (seconds) for a medication info search across all sources
+INFO_SEARCH_DEADLINE = float(os.getenv("INFO_SEARCH_DEADLINE_SECONDS", "25"))
+
+# Whether medication info sources are raced instead of tried one by one
+INFO_SEARCH_RACING = os.getenv("MEDICATION_INFO_RACING", "true").lower() == "true"
+# Preference order for medication info sources, comma-separated
+INFO_SOURCE_PRIORITY = [
+    name.strip() for name in os.getenv("MEDICATION_INFO_PRIORITY", "").split(",") if name.strip()
+]
+
+# Fields read from each site, compiled once
+_BULAS_SEARCH_RESULT = Selector(f"(//div[{css_class('col-lg-9')}]//ul[{css_class('search-results')}]//li//a/@href)[1]")
+_BULAS_NAME = Selector(f"(//h1[{css_class('product-title')}])[1]")
+_BULAS_MANUFACTURER = Selector(f"(//span[{css_class('manufacturer')}])[1]")
+_BULAS_BLOCKS = Selector(f"//div[{css_class('info-block')}]")
+_BULAS_BLOCK_TITLE = Selector(f"(.//h2[{css_class('info-title')}])[1]")
+_BULAS_BLOCK_CONTENT = Selector(f"(.//div[{css_class('info-content')}])[1]")
+
+_REMEDIOS_SEARCH_RESULT = Selector(f"(//a[{css_class('ProductCard_container__j43SM')}])[1]/@href")
+_REMEDIOS_NAME = Selector(f"(//h1[{css_class('ProductInfo_name__qA56Y')}])[1]")
+_REMEDIOS_MANUFACTURER = Selector(f"(//div[{css_class('ProductInfo_manufacturer__l_FRc')}])[1]")
+_REMEDIOS_DESCRIPTION = Selector(f"(//div[{css_class('ProductDescription_content__BwrMt')}])[1]")
+_REMEDIOS_SPECS = Selector(f"//li[{css_class('ProductSpecification_item__xJO4M')}]")
+_REMEDIOS_SPEC_LABEL = Selector(f"(.//span[{css_class('ProductSpecification_label__aDQsa')}])[1]")
+_REMEDIOS_SPEC_VALUE = Selector(f"(.//span[{css_class('ProductSpecification_value__sLXCJ')}])[1]")
+
+_CONSULTA_REMEDIOS_LISTING = ProductListing(
+    card='//div[@data-testid="product-card"]',
+    name='.//h2[@data-testid="product-card-title"]',
+    price='.//span[@data-testid="product-card-price-value"]',
+    link='.//a/@href',
+    marker='product-card'
+)
+_DROGASIL_LISTING = ProductListing(
+    card=f"//div[{css_class('ProductCard')}]",
+    name=f".//h2[{css_class('ProductCard__title')}]",
+    price=f".//span[{css_class('ProductPrice__value')}]",
+    link=f".//a[{css_class('ProductCard__link')}]/@href",
+    marker='ProductCard'
+)
+_ULTRAFARMA_LISTING = ProductListing(
+    card=f"//div[{css_class('boxProduto')}]",
+    name=f".//a[{css_class('prodTitle')}]",
+    price=f".//span[{css_class('boxPreco')}]",
+    link=f".//a[{css_class('prodTitle')}]/@href",
+    marker='boxProduto'
+)
+_PANVEL_LISTING = ProductListing(
+    card=f"//div[{css_class('boxProdutos')}]",
+    name=f".//a[{css_class('nomeLink')}]",
+    price=f".//div[{css_class('preco')}]",
+    link=f".//a[{css_class('nomeLink')}]/@href",
+    marker='boxProdutos'
+)
+
+# Shared threads for concurrent source fetches
+_scrape_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SCRAPER_THREADS", "16")),
+    thread_name_prefix="scraper"
+)
+
+class SearchCancelled(Exception):
+    """Raised inside a source fetch when another source already won the race"""
+
+def _submit(func, *args):
+    """Run func(*args) on the scraper threads with the caller's request context (id, endpoint)"""
+    return _scrape_executor.submit(contextvars.copy_context().run, func, *args)
+
+def _submit_async(func, *args):
+    """
+    Like _submit, but returns an asyncio future to await inside the event loop
+
+    The fetch runs on the scraper threads, so no thread of the loop's default
+    executor (shared with the caches, job queue and database writers) is held
+    waiting for a site.
+    """
+    return asyncio.wrap_future(_submit(func, *args))
+
+def _source_key(source_func):
+    return source_func.__name__.replace('_scrape_', '')
+
+def _timed_call(source_func, *args):
+    """
+    Run one source fetch, recorded as its `scrape` stage
+    
+    Returns:
+        tuple: (result, elapsed seconds)
+    """
+    with stage("scrape", source=_source_key(source_func)) as timer:
+        started = time.perf_counter()
+        try:
+            result = source_func(*args)
+        except SearchCancelled:
+            timer.outcome = "cancelled"
+            raise
+        if not result or not (result.get('content') or result.get('products')):
+            timer.outcome = "empty"
+        return result, time.perf_counter() - started
+
+def _parse_html(content, source, marker=None):
+    """Parse a page with lxml, recorded as the `html_parse` stage of source"""
+    with stage("html_parse", source=source):
+        return parse_html(content, marker)
+
+def _fetch_html(url, headers, cancel_event=None):
+    """
+    GET a page through the shared pooled client and return its body decoded as UTF-8
+    
+    When a cancel_event is given the body is streamed in chunks and the
+    connection is closed as soon as the event is set, so a fetch that lost a
+    race stops holding its socket and worker thread.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise SearchCancelled(url)
+    
+    response = http_client.get(url, headers=headers, timeout=10, stream=cancel_event is not None)
+    try:
+        response.raise_for_status()
+        if cancel_event is None:
+            body = response.content
+        else:
+            chunks = []
+            for chunk in response.iter_content(chunk_size=16384):
+                if cancel_event.is_set():
+                    raise SearchCancelled(url)
+                chunks.append(chunk)
+            body = b''.join(chunks)
+    finally:
+        response.close()
+    
+    # Ensure content is decoded as UTF-8
+    return body.decode('utf-8', errors='replace')
+
 class MedicationInfoScraper:
     """Scraper for medication information (bulas)"""
     
-    def __init__(self):
+    def __init__(self, racing=None, priority=None, deadline=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept-Charset': 'utf-8'
@@ -21,6 +165,15 @@ class MedicationInfoScraper:
             self._scrape_remedios_com_br,
             self._scrape_bulario_anvisa
         ]
+        # Racing starts every source at once instead of trying them in turn
+        self.racing = INFO_SEARCH_RACING if racing is None else racing
+        # Overall time budget for one racing search
+        self.deadline = deadline if deadline is not None else INFO_SEARCH_DEADLINE
+        # Source names (e.g. "bulas_med_br") in preference order; unknown names are ignored
+        self.priority = priority if priority is not None else INFO_SOURCE_PRIORITY
+        if self.priority:
+            rank = {name: i for i, name in enumerate(self.priority)}
+            self.sources.sort(key=lambda f: rank.get(f.__name__.replace('_scrape_', ''), len(rank)))
     
     def search(self, medication_name):
         """
@@ -39,22 +192,127 @@ class MedicationInfoScraper:
             logger.warning("Converting medication_name to string with UTF-8 encoding")
             medication_name = medication_name.decode('utf-8', errors='replace')
         
-        # Try each source until we get a result
-        for source_func in self.sources:
-            try:
-                result = source_func(medication_name)
+        if self.racing:
+            result = self._search_racing(medication_name)
+            if result:
+                return result
+        else:
+            # Try each source until we get a result
+            for source_func in self.sources:
+                try:
+                    result, _ = _timed_call(source_func, medication_name)
+                    if result and result.get('content'):
+                        logger.info(f"Found medication info from source: {source_func.__name__}")
+                        return result
+                except Exception as e:
+                    logger.error(f"Error scraping from {source_func.__name__}: {str(e)}")
+                    continue
+        
+        # If no source returned a result
+        logger.warning(f"No medication info found for: {medication_name}")
+        return {"content": "", "source": ""}
+
+    async def search_async(self, medication_name):
+        """
+        Non-blocking variant of search for use inside the event loop.
+        Each source runs on the scraper threads and the loop awaits it, so
+        a slow search holds no thread of the default executor.
+        
+        Args:
+            medication_name (str): Name of the medication to search for
+            
+        Returns:
+            dict: Information about the medication or empty if not found
+        """
+        logger.info(f"Searching medication info for: {medication_name}")
+        
+        if self.racing:
+            result = await self._search_racing_async(medication_name)
+            if result:
+                return result
+        else:
+            for source_func in self.sources:
+                try:
+                    result, _ = await _submit_async(_timed_call, source_func, medication_name)
+                except Exception as e:
+                    logger.error(f"Error scraping from {source_func.__name__}: {str(e)}")
+                    continue
                 if result and result.get('content'):
                     logger.info(f"Found medication info from source: {source_func.__name__}")
                     return result
-            except Exception as e:
-                logger.error(f"Error scraping from {source_func.__name__}: {str(e)}")
-                continue
         
-        # If no source returned a result
         logger.warning(f"No medication info found for: {medication_name}")
         return {"content": "", "source": ""}
+
+    def _start_race(self, medication_name):
+        """Submit every source at once; returns the cancel event and (future, source) pairs"""
+        cancel_event = threading.Event()
+        futures = [
+            (_submit(_timed_call, source_func, medication_name, cancel_event), source_func)
+            for source_func in self.sources
+        ]
+        return cancel_event, futures
+
+    @staticmethod
+    def _stop_race(cancel_event, futures):
+        # Not-yet-started fetches are dropped; running ones stop at their next chunk
+        cancel_event.set()
+        for future, _ in futures:
+            future.cancel()
+
+    def _search_racing(self, medication_name):
+        """
+        Start every source at once and return the first non-empty result in
+        priority order: a source wins as soon as it has content and every
+        higher-priority source has come back empty. Losing fetches are
+        cancelled when the winner is known or the deadline passes.
+        """
+        cancel_event, futures = self._start_race(medication_name)
+        deadline = time.monotonic() + self.deadline
+        try:
+            for future, source_func in futures:
+                done, _ = wait([future], timeout=max(0, deadline - time.monotonic()))
+                if not done:
+                    logger.warning(f"Medication info search missed the {self.deadline}s deadline")
+                    return None
+                try:
+                    result, _ = future.result()
+                except Exception as e:
+                    logger.error(f"Error scraping from {source_func.__name__}: {str(e)}")
+                    continue
+                if result and result.get('content'):
+                    logger.info(f"Found medication info from source: {source_func.__name__}")
+                    return result
+        finally:
+            self._stop_race(cancel_event, futures)
+        return None
+
+    async def _search_racing_async(self, medication_name):
+        """_search_racing awaited on the event loop instead of blocking a thread"""
+        cancel_event, futures = self._start_race(medication_name)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        try:
+            for future, source_func in futures:
+                waiter = asyncio.wrap_future(future)
+                done, _ = await asyncio.wait([waiter], timeout=max(0, deadline - loop.time()))
+                if not done:
+                    waiter.cancel()
+                    logger.warning(f"Medication info search missed the {self.deadline}s deadline")
+                    return None
+                try:
+                    result, _ = waiter.result()
+                except Exception as e:
+                    logger.error(f"Error scraping from {source_func.__name__}: {str(e)}")
+                    continue
+                if result and result.get('content'):
+                    logger.info(f"Found medication info from source: {source_func.__name__}")
+                    return result
+        finally:
+            self._stop_race(cancel_event, futures)
+        return None
     
-    def _scrape_bulas_med_br(self, medication_name):
+    def _scrape_bulas_med_br(self, medication_name, cancel_event=None):
         """Scrape medication information from bulas.med.br"""
         logger.info(f"Scraping bulas.med.br for: {medication_name}")
         
@@ -63,58 +321,48 @@ class MedicationInfoScraper:
             search_url = f"https://bulas.med.br/search?q={quote(medication_name)}"
             logger.info(f"Making request to: {search_url}")
             
-            search_response = requests.get(search_url, headers=self.headers, timeout=10)
-            search_response.raise_for_status()
-            
-            # Ensure content is decoded as UTF-8
-            search_content = search_response.content.decode('utf-8', errors='replace')
-            search_soup = BeautifulSoup(search_content, 'lxml')
+            search_content = _fetch_html(search_url, self.headers, cancel_event)
+            search_root = _parse_html(search_content, 'bulas_med_br')
             
-            # Look for the first search result
-            first_result = search_soup.select_one('div.col-lg-9 ul.search-results li a[href]')
+            # Get the URL of the first search result
+            bula_url = _BULAS_SEARCH_RESULT.first(search_root) if search_root is not None else None
             
-            if not first_result:
+            if not bula_url:
                 logger.warning("No results found on bulas.med.br")
                 return None
             
-            # Get the URL of the first result
-            bula_url = first_result['href']
             if not bula_url.startswith('http'):
                 bula_url = f"https://bulas.med.br{bula_url}"
             
             logger.info(f"Found bula URL: {bula_url}")
             
             # Request the bula page
-            bula_response = requests.get(bula_url, headers=self.headers, timeout=10)
-            bula_response.raise_for_status()
-            
-            # Ensure content is decoded as UTF-8
-            bula_content = bula_response.content.decode('utf-8', errors='replace')
-            bula_soup = BeautifulSoup(bula_content, 'lxml')
+            bula_content = _fetch_html(bula_url, self.headers, cancel_event)
+            bula_root = _parse_html(bula_content, 'bulas_med_br')
             
             # Extract relevant sections
             sections = {}
             
+            if bula_root is None:
+                logger.warning(f"Empty bula page: {bula_url}")
+                return None
+            
             # Extract medication name and manufacturer
-            med_name = bula_soup.select_one('h1.product-title')
-            manufacturer = bula_soup.select_one('span.manufacturer')
+            med_name = _BULAS_NAME.text(bula_root)
+            manufacturer = _BULAS_MANUFACTURER.text(bula_root)
             
-            if med_name:
-                sections['nome'] = med_name.text.strip()
+            if med_name is not None:
+                sections['nome'] = med_name
             
-            if manufacturer:
-                sections['fabricante'] = manufacturer.text.strip()
+            if manufacturer is not None:
+                sections['fabricante'] = manufacturer
             
             # Extract the content sections
-            info_blocks = bula_soup.select('div.info-block')
-            
-            for block in info_blocks:
-                title_elem = block.select_one('h2.info-title')
-                content_elem = block.select_one('div.info-content')
+            for block in _BULAS_BLOCKS.all(bula_root):
+                title = _BULAS_BLOCK_TITLE.text(block)
+                content = _BULAS_BLOCK_CONTENT.text(block)
                 
-                if title_elem and content_elem:
-                    title = title_elem.text.strip()
-                    content = content_elem.text.strip()
+                if title is not None and content is not None:
                     sections[title.lower()] = content
             
             # Prepare the final content
@@ -143,14 +391,18 @@ class MedicationInfoScraper:
                 "source": bula_url
             }
             
+        except SearchCancelled:
+            # Raised so the scrape stage is recorded as cancelled, not empty
+            logger.info("Scraping bulas.med.br cancelled: another source answered first")
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Request error scraping bulas.med.br: {str(e)}")
-            return None
+            raise
         except Exception as e:
             logger.error(f"Error scraping bulas.med.br: {str(e)}")
-            return None
+            raise
     
-    def _scrape_remedios_com_br(self, medication_name):
+    def _scrape_remedios_com_br(self, medication_name, cancel_event=None):
         """Scrape medication information from remedios.com.br"""
         logger.info(f"Scraping remedios.com.br for: {medication_name}")
         
@@ -158,58 +410,51 @@ class MedicationInfoScraper:
             search_url = f"https://remedios.com.br/busca?termo={quote(medication_name)}"
             logger.info(f"Making request to: {search_url}")
             
-            search_response = requests.get(search_url, headers=self.headers, timeout=10)
-            search_response.raise_for_status()
-            
-            # Ensure content is decoded as UTF-8
-            search_content = search_response.content.decode('utf-8', errors='replace')
-            search_soup = BeautifulSoup(search_content, 'lxml')
+            search_content = _fetch_html(search_url, self.headers, cancel_event)
+            search_root = _parse_html(search_content, 'remedios_com_br')
             
-            # Look for the first search result
-            product_link = search_soup.select_one('a.ProductCard_container__j43SM')
+            # Get the URL of the first search result
+            product_url = _REMEDIOS_SEARCH_RESULT.first(search_root) if search_root is not None else None
             
-            if not product_link:
+            if not product_url:
                 logger.warning("No results found on remedios.com.br")
                 return None
                 
-            product_url = product_link.get('href')
             if not product_url.startswith('http'):
                 product_url = f"https://remedios.com.br{product_url}"
             
             logger.info(f"Found product URL: {product_url}")
             
             # Request the product page
-            product_response = requests.get(product_url, headers=self.headers, timeout=10)
-            product_response.raise_for_status()
+            product_content = _fetch_html(product_url, self.headers, cancel_event)
+            product_root = _parse_html(product_content, 'remedios_com_br')
             
-            # Ensure content is decoded as UTF-8
-            product_content = product_response.content.decode('utf-8', errors='replace')
-            product_soup = BeautifulSoup(product_content, 'lxml')
+            if product_root is None:
+                logger.warning(f"Empty product page: {product_url}")
+                return None
             
             # Extract product information
-            product_name = product_soup.select_one('h1.ProductInfo_name__qA56Y')
-            manufacturer = product_soup.select_one('div.ProductInfo_manufacturer__l_FRc')
+            product_name = _REMEDIOS_NAME.text(product_root)
+            manufacturer = _REMEDIOS_MANUFACTURER.text(product_root)
             
             # Extract description and other details
-            description = product_soup.select_one('div.ProductDescription_content__BwrMt')
+            description = _REMEDIOS_DESCRIPTION.text(product_root)
             
             # Extract specifications
             specs = {}
-            spec_items = product_soup.select('li.ProductSpecification_item__xJO4M')
-            
-            for item in spec_items:
-                label = item.select_one('span.ProductSpecification_label__aDQsa')
-                value = item.select_one('span.ProductSpecification_value__sLXCJ')
+            for item in _REMEDIOS_SPECS.all(product_root):
+                label = _REMEDIOS_SPEC_LABEL.text(item)
+                value = _REMEDIOS_SPEC_VALUE.text(item)
                 
-                if label and value:
-                    specs[label.text.strip().lower()] = value.text.strip()
+                if label is not None and value is not None:
+                    specs[label.lower()] = value
             
             # Prepare the final content
             content_parts = [
-                f"# {product_name.text.strip() if product_name else medication_name}",
-                f"Fabricante: {manufacturer.text.strip() if manufacturer else 'Não informado'}",
+                f"# {product_name if product_name is not None else medication_name}",
+                f"Fabricante: {manufacturer if manufacturer is not None else 'Não informado'}",
                 "## Descrição",
-                description.text.strip() if description else "Informação não disponível",
+                description if description is not None else "Informação não disponível",
                 "## Especificações"
             ]
             
@@ -225,14 +470,18 @@ class MedicationInfoScraper:
                 "source": product_url
             }
             
+        except SearchCancelled:
+            # Raised so the scrape stage is recorded as cancelled, not empty
+            logger.info("Scraping remedios.com.br cancelled: another source answered first")
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Request error scraping remedios.com.br: {str(e)}")
-            return None
+            raise
         except Exception as e:
             logger.error(f"Error scraping remedios.com.br: {str(e)}")
-            return None
+            raise
     
-    def _scrape_bulario_anvisa(self, medication_name):
+    def _scrape_bulario_anvisa(self, medication_name, cancel_event=None):
         """Scrape medication information from bulario.anvisa.gov.br"""
         logger.info(f"Attempting to scrape from bulario.anvisa.gov.br for: {medication_name}")
         try:
@@ -253,11 +502,13 @@ class MedicationInfoScraper:
 class MedicationPriceScraper:
     """Scraper for medication prices"""
     
-    def __init__(self):
+    def __init__(self, deadline=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept-Charset': 'utf-8'
         }
+        # Overall time budget for one search across all pharmacies
+        self.deadline = deadline if deadline is not None else PRICE_SEARCH_DEADLINE
         # Define the sources to scrape
         self.sources = [
             self._scrape_consulta_remedios,
@@ -283,24 +534,89 @@ class MedicationPriceScraper:
             logger.warning("Converting medication_name to string with UTF-8 encoding")
             medication_name = medication_name.decode('utf-8', errors='replace')
             
+        futures = self._start_search(medication_name)
+        done, _ = wait(futures, timeout=self.deadline)
+        return self._combine(medication_name, futures, done)
+
+    async def search_async(self, medication_name):
+        """
+        Non-blocking variant of search for use inside the event loop.
+        Each source runs on the scraper threads and the loop awaits them
+        under the deadline, so a slow search holds no thread of the default
+        executor.
+        
+        Args:
+            medication_name (str): Name of the medication to search for
+            
+        Returns:
+            dict: Price information about the medication
+        """
+        logger.info(f"Searching medication prices for: {medication_name}")
+        
+        futures = self._start_search(medication_name)
+        waiters = {asyncio.wrap_future(future): future for future in futures}
+        done, pending = await asyncio.wait(waiters, timeout=self.deadline)
+        for waiter in pending:
+            waiter.cancel()
+        for waiter in done:
+            # Errors are read from the thread futures; mark them retrieved here too
+            waiter.exception()
+        return self._combine(medication_name, futures, {waiters[waiter] for waiter in done})
+
+    def _start_search(self, medication_name):
+        """Query every source at once; returns {future: source}"""
+        return {
+            _submit(_timed_call, source_func, medication_name): source_func
+            for source_func in self.sources
+        }
+
+    def _combine(self, medication_name, futures, done):
+        """
+        Merge the sources that finished before the deadline, cheapest first
+        
+        Args:
+            medication_name (str): Name of the medication searched for
+            futures (dict): {future: source} from _start_search
+            done (set): The futures that finished in time
+            
+        Returns:
+            dict: Price information about the medication
+        """
         all_results = []
+        timings = {}
         
-        # Try each source
-        for source_func in self.sources:
+        # Walk the futures in source order so the output is stable across runs
+        for future, source_func in futures.items():
+            source_key = _source_key(source_func)
+            if future not in done:
+                # The worker thread ends on its own request timeout; its result is dropped
+                future.cancel()
+                logger.warning(f"Source {source_func.__name__} missed the {self.deadline}s deadline")
+                timings[source_key] = {"status": "timeout", "seconds": self.deadline, "products": 0}
+                continue
             try:
-                result = source_func(medication_name)
-                if result and result.get('products'):
-                    logger.info(f"Found {len(result['products'])} products from {source_func.__name__}")
-                    all_results.append(result)
+                result, elapsed = future.result()
             except Exception as e:
                 logger.error(f"Error scraping from {source_func.__name__}: {str(e)}")
+                timings[source_key] = {"status": "error", "seconds": None, "products": 0}
                 continue
+            num_products = len(result.get('products', [])) if result else 0
+            timings[source_key] = {
+                "status": "ok" if num_products else "empty",
+                "seconds": round(elapsed, 3),
+                "products": num_products,
+                "source_name": result.get('source_name') if result else None
+            }
+            if num_products:
+                logger.info(f"Found {num_products} products from {source_func.__name__}")
+                all_results.append(result)
         
         # Combine results from all sources
         combined_results = {
             "query": medication_name,
             "sources": [r.get('source_name') for r in all_results if r.get('source_name')],
-            "products": []
+            "products": [],
+            "timings": timings
         }
         
         for result in all_results:
@@ -316,297 +632,91 @@ class MedicationPriceScraper:
             logger.info(f"Found a total of {len(combined_results['products'])} products for: {medication_name}")
         
         return combined_results
-    
-    def _scrape_consulta_remedios(self, medication_name):
-        """Scrape medication prices from consultaremedios.com.br"""
-        logger.info(f"Scraping consultaremedios.com.br for: {medication_name}")
+
+    def _scrape_listing(self, medication_name, search_url, listing, source_key, site, source_name):
+        """
+        Read the first product cards of a pharmacy search page
         
-        try:
-            search_url = f"https://consultaremedios.com.br/busca?termo={quote(medication_name)}"
-            logger.info(f"Making request to: {search_url}")
-            
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            # Ensure content is decoded as UTF-8
-            content = response.content.decode('utf-8', errors='replace')
-            soup = BeautifulSoup(content, 'lxml')
-            
-            products = []
-            product_cards = soup.select('div[data-testid="product-card"]')
-            
-            logger.info(f"Found {len(product_cards)} product cards on consultaremedios.com.br")
-            
-            for card in product_cards[:5]:  # Limit to 5 results
-                try:
-                    # Extract product name
-                    name_elem = card.select_one('h2[data-testid="product-card-title"]')
-                    name = name_elem.text.strip() if name_elem else "Nome não disponível"
-                    
-                    # Extract price
-                    price_elem = card.select_one('span[data-testid="product-card-price-value"]')
-                    price_text = price_elem.text.strip() if price_elem else ""
-                    
-                    # Extract price value
-                    price = None
-                    if price_text:
-                        price_match = re.search(r'R\$\s*([\d.,]+)', price_text)
-                        if price_match:
-                            price_str = price_match.group(1).replace('.', '').replace(',', '.')
-                            try:
-                                price = float(price_str)
-                            except ValueError:
-                                price = None
-                    
-                    # Extract product URL
-                    url = None
-                    link_elem = card.select_one('a[href]')
-                    if link_elem:
-                        url = link_elem['href']
-                        if not url.startswith('http'):
-                            url = f"https://consultaremedios.com.br{url}"
-                    
-                    if name and price:
-                        products.append({
-                            "name": name,
-                            "price": price,
-                            "price_text": price_text,
-                            "url": url,
-                            "source": "Consulta Remédios"
-                        })
-                except Exception as e:
-                    logger.error(f"Error extracting product information: {str(e)}")
-                    continue
+        Args:
+            medication_name (str): Name of the medication to search for
+            search_url (str): Search page URL
+            listing (ProductListing): Where the page keeps its product cards
+            source_key (str): Source label for the html_parse stage
+            site (str): Site name for log messages, also the base of relative product URLs
+            source_name (str): Pharmacy name shown with each product
             
-            return {
-                "source_name": "Consulta Remédios",
-                "source_url": search_url,
-                "products": products
-            }
+        Returns:
+            dict: The products found (none when the site answered without any)
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error scraping consultaremedios.com.br: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Error scraping consultaremedios.com.br: {str(e)}")
-            return None
-    
-    def _scrape_drogasil(self, medication_name):
-        """Scrape medication prices from drogasil.com.br"""
-        logger.info(f"Scraping drogasil.com.br for: {medication_name}")
+        Raises:
+            Exception: When the page could not be fetched or parsed
+        """
+        logger.info(f"Scraping {site} for: {medication_name}")
         
         try:
-            search_url = f"https://www.drogasil.com.br/search?w={quote(medication_name)}"
             logger.info(f"Making request to: {search_url}")
             
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            content = _fetch_html(search_url, self.headers)
+            root = _parse_html(content, source_key, listing.marker)
+            cards = listing.products(root)
             
-            # Ensure content is decoded as UTF-8
-            content = response.content.decode('utf-8', errors='replace')
-            soup = BeautifulSoup(content, 'lxml')
+            logger.info(f"Found {len(cards)} product cards on {site}")
             
             products = []
-            product_cards = soup.select('div.ProductCard')
-            
-            logger.info(f"Found {len(product_cards)} product cards on drogasil.com.br")
-            
-            for card in product_cards[:5]:  # Limit to 5 results
-                try:
-                    # Extract product name
-                    name_elem = card.select_one('h2.ProductCard__title')
-                    name = name_elem.text.strip() if name_elem else "Nome não disponível"
-                    
-                    # Extract price
-                    price_elem = card.select_one('span.ProductPrice__value')
-                    price_text = price_elem.text.strip() if price_elem else ""
-                    
-                    # Extract price value
-                    price = None
-                    if price_text:
-                        price_match = re.search(r'R\$\s*([\d.,]+)', price_text)
-                        if price_match:
-                            price_str = price_match.group(1).replace('.', '').replace(',', '.')
-                            try:
-                                price = float(price_str)
-                            except ValueError:
-                                price = None
-                    
-                    # Extract product URL
-                    url = None
-                    link_elem = card.select_one('a.ProductCard__link')
-                    if link_elem:
-                        url = link_elem['href']
-                        if not url.startswith('http'):
-                            url = f"https://www.drogasil.com.br{url}"
-                    
-                    if name and price:
-                        products.append({
-                            "name": name,
-                            "price": price,
-                            "price_text": price_text,
-                            "url": url,
-                            "source": "Drogasil"
-                        })
-                except Exception as e:
-                    logger.error(f"Error extracting product information: {str(e)}")
-                    continue
+            for name, price_text, url in cards:
+                name = name if name is not None else "Nome não disponível"
+                price = parse_price(price_text)
+                if url and not url.startswith('http'):
+                    url = f"https://{site}{url}"
+                
+                if name and price:
+                    products.append({
+                        "name": name,
+                        "price": price,
+                        "price_text": price_text,
+                        "url": url,
+                        "source": source_name
+                    })
             
             return {
-                "source_name": "Drogasil",
+                "source_name": source_name,
                 "source_url": search_url,
                 "products": products
             }
             
         except requests.exceptions.RequestException as e:
-            logger.error(f"Request error scraping drogasil.com.br: {str(e)}")
-            return None
+            # Raised so the search records an error rather than an empty answer,
+            # and the price catalog keeps this site's earlier products
+            logger.error(f"Request error scraping {site}: {str(e)}")
+            raise
         except Exception as e:
-            logger.error(f"Error scraping drogasil.com.br: {str(e)}")
-            return None
+            logger.error(f"Error scraping {site}: {str(e)}")
+            raise
+    
+    def _scrape_consulta_remedios(self, medication_name):
+        """Scrape medication prices from consultaremedios.com.br"""
+        return self._scrape_listing(
+            medication_name, f"https://consultaremedios.com.br/busca?termo={quote(medication_name)}",
+            _CONSULTA_REMEDIOS_LISTING, 'consulta_remedios', "consultaremedios.com.br", "Consulta Remédios"
+        )
+    
+    def _scrape_drogasil(self, medication_name):
+        """Scrape medication prices from drogasil.com.br"""
+        return self._scrape_listing(
+            medication_name, f"https://www.drogasil.com.br/search?w={quote(medication_name)}",
+            _DROGASIL_LISTING, 'drogasil', "www.drogasil.com.br", "Drogasil"
+        )
     
     def _scrape_ultrafarma(self, medication_name):
         """Scrape medication prices from ultrafarma.com.br"""
-        logger.info(f"Scraping ultrafarma.com.br for: {medication_name}")
-        
-        try:
-            search_url = f"https://www.ultrafarma.com.br/busca?t={quote(medication_name)}"
-            logger.info(f"Making request to: {search_url}")
-            
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            # Ensure content is decoded as UTF-8
-            content = response.content.decode('utf-8', errors='replace')
-            soup = BeautifulSoup(content, 'lxml')
-            
-            products = []
-            product_cards = soup.select('div.boxProduto')
-            
-            logger.info(f"Found {len(product_cards)} product cards on ultrafarma.com.br")
-            
-            for card in product_cards[:5]:  # Limit to 5 results
-                try:
-                    # Extract product name
-                    name_elem = card.select_one('a.prodTitle')
-                    name = name_elem.text.strip() if name_elem else "Nome não disponível"
-                    
-                    # Extract price
-                    price_elem = card.select_one('span.boxPreco')
-                    price_text = price_elem.text.strip() if price_elem else ""
-                    
-                    # Extract price value
-                    price = None
-                    if price_text:
-                        price_match = re.search(r'R\$\s*([\d.,]+)', price_text)
-                        if price_match:
-                            price_str = price_match.group(1).replace('.', '').replace(',', '.')
-                            try:
-                                price = float(price_str)
-                            except ValueError:
-                                price = None
-                    
-                    # Extract product URL
-                    url = None
-                    if name_elem and name_elem.has_attr('href'):
-                        url = name_elem['href']
-                        if not url.startswith('http'):
-                            url = f"https://www.ultrafarma.com.br{url}"
-                    
-                    if name and price:
-                        products.append({
-                            "name": name,
-                            "price": price,
-                            "price_text": price_text,
-                            "url": url,
-                            "source": "Ultrafarma"
-                        })
-                except Exception as e:
-                    logger.error(f"Error extracting product information: {str(e)}")
-                    continue
-            
-            return {
-                "source_name": "Ultrafarma",
-                "source_url": search_url,
-                "products": products
-            }
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error scraping ultrafarma.com.br: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Error scraping ultrafarma.com.br: {str(e)}")
-            return None
+        return self._scrape_listing(
+            medication_name, f"https://www.ultrafarma.com.br/busca?t={quote(medication_name)}",
+            _ULTRAFARMA_LISTING, 'ultrafarma', "www.ultrafarma.com.br", "Ultrafarma"
+        )
     
     def _scrape_panvel(self, medication_name):
         """Scrape medication prices from panvel.com"""
-        logger.info(f"Scraping panvel.com for: {medication_name}")
-        
-        try:
-            search_url = f"https://www.panvel.com/panvel/buscarProduto.do?termoPesquisa={quote(medication_name)}"
-            logger.info(f"Making request to: {search_url}")
-            
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            # Ensure content is decoded as UTF-8
-            content = response.content.decode('utf-8', errors='replace')
-            soup = BeautifulSoup(content, 'lxml')
-            
-            products = []
-            product_cards = soup.select('div.boxProdutos')
-            
-            logger.info(f"Found {len(product_cards)} product cards on panvel.com")
-            
-            for card in product_cards[:5]:  # Limit to 5 results
-                try:
-                    # Extract product name
-                    name_elem = card.select_one('a.nomeLink')
-                    name = name_elem.text.strip() if name_elem else "Nome não disponível"
-                    
-                    # Extract price
-                    price_elem = card.select_one('div.preco')
-                    price_text = price_elem.text.strip() if price_elem else ""
-                    
-                    # Extract price value
-                    price = None
-                    if price_text:
-                        price_match = re.search(r'R\$\s*([\d.,]+)', price_text)
-                        if price_match:
-                            price_str = price_match.group(1).replace('.', '').replace(',', '.')
-                            try:
-                                price = float(price_str)
-                            except ValueError:
-                                price = None
-                    
-                    # Extract product URL
-                    url = None
-                    if name_elem and name_elem.has_attr('href'):
-                        url = name_elem['href']
-                        if not url.startswith('http'):
-                            url = f"https://www.panvel.com{url}"
-                    
-                    if name and price:
-                        products.append({
-                            "name": name,
-                            "price": price,
-                            "price_text": price_text,
-                            "url": url,
-                            "source": "Panvel"
-                        })
-                except Exception as e:
-                    logger.error(f"Error extracting product information: {str(e)}")
-                    continue
-            
-            return {
-                "source_name": "Panvel",
-                "source_url": search_url,
-                "products": products
-            }
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error scraping panvel.com: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Error scraping panvel.com: {str(e)}")
-            return None
\ No newline at end of file
+        return self._scrape_listing(
+            medication_name, f"https://www.panvel.com/panvel/buscarProduto.do?termoPesquisa={quote(medication_name)}",
+            _PANVEL_LISTING, 'panvel', "www.panvel.com", "Panvel"
+        )
@@ -0,0 +1,222 @@
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger("exam-analyzer-api")
+
+
+class SessionStore:
+    """
+    Bounded in-memory store mapping session_id to exam text, its lab markers,
+    its search index and the analysis already given for it.
+
+    Exam text, the marker table and the analysis are kept zlib-compressed; the
+    index is kept as is and counted by its `nbytes` estimate. Entries are
+    evicted in LRU order when either the entry cap or the byte budget
+    (compressed text, markers and analysis plus index) is exceeded, and expire
+    after `idle_ttl` seconds without being read or written.
+    All operations are guarded by a lock so the store can be shared between
+    the event loop and worker threads.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, idle_ttl=3600.0,
+                 compression_level=6, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.compression_level = compression_level
+        self._clock = clock
+        self._lock = threading.Lock()
+        # session_id -> (compressed text, compressed markers JSON, index, compressed analysis or None,
+        #                size in bytes, last access timestamp)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def put(self, session_id, exam_content, markers=None, index=None, analysis=None):
+        """
+        Store exam text for a session, replacing any previous value
+
+        Args:
+            session_id (str): Session identifier
+            exam_content (str): Exam text to store
+            markers (list, optional): Lab marker table parsed from the exam
+            index (ExamIndex, optional): Search index of the exam text
+            analysis (str, optional): Analysis already given for the exam
+        """
+        blob = zlib.compress(exam_content.encode('utf-8'), self.compression_level)
+        markers_blob = zlib.compress(json.dumps(markers or [], ensure_ascii=False).encode('utf-8'), self.compression_level)
+        analysis_blob = self._compress_analysis(analysis)
+        size = (len(blob) + len(markers_blob) + len(analysis_blob or b'')
+                + (index.nbytes if index is not None else 0))
+        with self._lock:
+            now = self._clock()
+            self._remove(session_id)
+            self._entries[session_id] = (blob, markers_blob, index, analysis_blob, size, now)
+            self._bytes += size
+            self._expire(now)
+            self._enforce_limits()
+
+    def set_analysis(self, session_id, analysis):
+        """
+        Attach the analysis given for a stored exam, replacing any earlier one
+
+        Does nothing when the session is unknown or expired.
+
+        Returns:
+            bool: True if the session was found
+        """
+        analysis_blob = self._compress_analysis(analysis)
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return False
+            size = entry[4] - len(entry[3] or b'') + len(analysis_blob or b'')
+            self._entries[session_id] = entry[:3] + (analysis_blob, size, now)
+            self._entries.move_to_end(session_id)
+            self._bytes += size - entry[4]
+            self._enforce_limits()
+            return True
+
+    def get(self, session_id, default=None):
+        """
+        Retrieve the exam text for a session and refresh its idle timer
+
+        Args:
+            session_id (str): Session identifier
+            default: Value returned when the session is unknown or expired
+
+        Returns:
+            str: The stored exam text, or default
+        """
+        entry = self._touch(session_id)
+        if entry is None:
+            return default
+        return zlib.decompress(entry[0]).decode('utf-8')
+
+    def get_markers(self, session_id, default=None):
+        """
+        Retrieve the lab marker table of a session and refresh its idle timer
+
+        Args:
+            session_id (str): Session identifier
+            default: Value returned when the session is unknown or expired
+
+        Returns:
+            list: Marker dicts (empty if none were parsed), or default
+        """
+        entry = self._touch(session_id)
+        if entry is None:
+            return default
+        return json.loads(zlib.decompress(entry[1]).decode('utf-8'))
+
+    def get_index(self, session_id, default=None):
+        """
+        Retrieve the search index of a session and refresh its idle timer
+
+        Returns:
+            ExamIndex: The index stored with the exam, or default when the
+            session is unknown, expired or was stored without one
+        """
+        entry = self._touch(session_id)
+        if entry is None or entry[2] is None:
+            return default
+        return entry[2]
+
+    def get_entry(self, session_id):
+        """
+        Retrieve everything stored for a session in one lookup
+
+        Counts a single hit or miss and refreshes the idle timer once. The text
+        and markers are decompressed here, so call it from a worker thread.
+
+        Returns:
+            dict: exam_content, markers, index and analysis (None when stored
+            without one), or None when the session is unknown or expired
+        """
+        entry = self._touch(session_id)
+        if entry is None:
+            return None
+        return {
+            "exam_content": zlib.decompress(entry[0]).decode('utf-8'),
+            "markers": json.loads(zlib.decompress(entry[1]).decode('utf-8')),
+            "index": entry[2],
+            "analysis": zlib.decompress(entry[3]).decode('utf-8') if entry[3] is not None else None,
+        }
+
+    def delete(self, session_id):
+        """Remove a session if present"""
+        with self._lock:
+            self._remove(session_id)
+
+    def stats(self):
+        """Return counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __contains__(self, session_id):
+        with self._lock:
+            self._expire(self._clock())
+            return session_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _compress_analysis(self, analysis):
+        return zlib.compress(analysis.encode('utf-8'), self.compression_level) if analysis else None
+
+    def _touch(self, session_id):
+        # Look up an entry, counting the hit or miss and renewing its idle timer
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry = entry[:5] + (now,)
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry
+
+    def _remove(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[4]
+
+    def _expire(self, now):
+        # Entries are kept in access order, so expired ones sit at the front
+        while self._entries:
+            session_id, (_, _, _, _, size, last_access) = next(iter(self._entries.items()))
+            if now - last_access < self.idle_ttl:
+                break
+            self._entries.popitem(last=False)
+            self._bytes -= size
+            self.expirations += 1
+            logger.info(f"Session expired after idle timeout: {session_id}")
+
+    def _enforce_limits(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            session_id, (_, _, _, _, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            logger.info(f"Session evicted from store: {session_id}")
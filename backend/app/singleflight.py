@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("exam-analyzer-api")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async calls into one execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is running await the same task instead of starting another.
+    The result, or the exception, is delivered to every waiter. The task is
+    shielded, so a waiter that disconnects does not cancel the others.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key, func):
+        """
+        Run func() for key unless an identical call is already in flight
+
+        Args:
+            key (hashable): Identity of the call, e.g. (endpoint, medication name)
+            func (callable): Coroutine function performing the work
+
+        Returns:
+            The result of the shared execution
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.executions += 1
+        else:
+            self.collapsed += 1
+            logger.info(f"{self.name}: joined in-flight call for {key}")
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return executions, collapsed calls and calls currently in flight"""
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+        }
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
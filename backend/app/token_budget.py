@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+
+from .metrics import stage
+
+logger = logging.getLogger("exam-analyzer-api")
+
+# Default input token budget per agent; override with GEMINI_INPUT_BUDGET_<AGENT>
+DEFAULT_INPUT_BUDGETS = {
+    "exam_analysis": 24000,
+    "exam_question": 24000,
+    "medication_info": 6000,
+    "medication_prices": 3000,
+    "general_question": 1500,
+}
+
+TRUNCATION_MARKER = "\n[... conteúdo truncado para caber no limite de tokens ...]\n"
+
+# Approximate characters per token for Portuguese text
+CHARS_PER_TOKEN = 4
+
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """
+    Estimate the number of tokens in text
+
+    A local character-based estimate, so checking a budget never costs a
+    count_tokens round trip to the API. It is cheap enough not to need a
+    cache, which would keep whole prompts and exams alive.
+    """
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+
+def input_budget(agent):
+    """Input token budget for an agent"""
+    override = os.getenv(f"GEMINI_INPUT_BUDGET_{agent.upper()}")
+    return int(override) if override else DEFAULT_INPUT_BUDGETS[agent]
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Deterministically cut text to at most max_tokens (estimated)
+
+    Keeps the beginning of the text, ends on a line boundary when one is close
+    to the cut, and appends a truncation marker.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    max_chars = max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER)
+    if max_chars <= 0:
+        return ""
+    cut = text[:max_chars]
+    newline = cut.rfind("\n")
+    if newline >= max_chars // 2:
+        cut = cut[:newline]
+    return cut + TRUNCATION_MARKER
+
+
+def fit_prompt(agent, build, fields, priority):
+    """
+    Build a prompt that fits the agent's input budget
+
+    When the full prompt is over budget, fields are trimmed starting from the
+    least important one until it fits. The fixed instructions are never cut.
+
+    Args:
+        agent (str): Agent name, a key of DEFAULT_INPUT_BUDGETS
+        build (callable): Prompt builder called with the fields as keyword arguments
+        fields (dict): Variable prompt parts (e.g. exam text, question)
+        priority (list): Field names from most to least important
+
+    Returns:
+        tuple: (prompt, estimated input tokens)
+    """
+    with stage("prompt_build", source=agent) as timer:
+        budget = input_budget(agent)
+        fields = dict(fields)
+        prompt = build(**fields)
+        tokens = count_tokens(prompt)
+        trimmed = []
+
+        for name in reversed(priority):
+            if tokens <= budget:
+                break
+            overflow = tokens - budget
+            allowed = max(0, count_tokens(fields[name]) - overflow)
+            fields[name] = truncate_to_tokens(fields[name], allowed)
+            trimmed.append(name)
+            prompt = build(**fields)
+            tokens = count_tokens(prompt)
+        if trimmed:
+            timer.outcome = "trimmed"
+
+    if trimmed:
+        logger.warning(f"Prompt for {agent} over budget of {budget} tokens, trimmed: {', '.join(trimmed)}")
+    logger.info(f"Prompt for {agent}: ~{tokens} input tokens (budget {budget})")
+    record_usage(agent, tokens, bool(trimmed))
+    return prompt, tokens
+
+
+def record_usage(agent, tokens, trimmed=False):
+    """Accumulate per-agent input token counts"""
+    with _usage_lock:
+        usage = _usage.setdefault(agent, {"calls": 0, "input_tokens": 0, "max_input_tokens": 0, "trimmed_calls": 0})
+        usage["calls"] += 1
+        usage["input_tokens"] += tokens
+        usage["max_input_tokens"] = max(usage["max_input_tokens"], tokens)
+        if trimmed:
+            usage["trimmed_calls"] += 1
+
+
+def usage_stats():
+    """Per-agent token usage recorded so far"""
+    with _usage_lock:
+        return {agent: dict(usage) for agent, usage in _usage.items()}
@@ -0,0 +1 @@
+# Benchmarks do backend (executar a partir de backend/: python -m benchmarks.<nome>)
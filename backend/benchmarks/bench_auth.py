@@ -0,0 +1,90 @@
+"""
+Benchmark: custo de autenticação por requisição, antes e depois do cache.
+
+Compara, para o mesmo ID token:
+  - sdk:    firebase_admin.auth.verify_id_token a cada requisição (caminho antigo;
+            o download dos certificados é simulado como cache quente, então o
+            resultado é um limite inferior do custo antigo)
+  - local:  verificação RS256 local contra os certificados pré-carregados
+            (primeira requisição de cada token)
+  - cache:  get_current_user_from_token com o token já verificado (demais requisições)
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_auth --iterations 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import firebase_admin
+import google.auth.credentials
+from firebase_admin import auth, credentials
+from google.oauth2 import id_token
+
+import app.firebase_admin as fb_admin
+from app.main import get_current_user_from_token
+from benchmarks.fixtures import make_id_token, make_signing_key
+
+PROJECT = "exam-mine-benchmark"
+
+
+class _AnonymousCredential(credentials.Base):
+    def get_credential(self):
+        return google.auth.credentials.AnonymousCredentials()
+
+
+def measure(func, iterations):
+    func()  # aquecimento
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.getLogger("exam-analyzer-api").setLevel(logging.WARNING)
+
+    private_pem, cert_pem = make_signing_key()
+    certs = {"k1": cert_pem}
+    token = make_id_token(private_pem, PROJECT)
+
+    # SDK real, sem rede: os certificados vêm do "cache HTTP" simulado
+    firebase_admin.initialize_app(_AnonymousCredential(), {"projectId": PROJECT})
+    id_token._fetch_certs = lambda request, url: certs
+    fb_admin.firebase_initialized = True
+    fb_admin.certificate_store._certs = certs
+
+    def sdk():
+        auth.verify_id_token(token)
+
+    def local():
+        fb_admin.token_cache = fb_admin.VerifiedTokenCache()
+        fb_admin.verify_firebase_token(token)
+
+    loop = asyncio.new_event_loop()
+    header = f"Bearer {token}"
+    fb_admin.verify_firebase_token(token)  # popula o cache
+
+    def cached():
+        loop.run_until_complete(get_current_user_from_token(header))
+
+    results = [
+        ("sdk (antes)", measure(sdk, args.iterations)),
+        ("local (1ª req.)", measure(local, args.iterations)),
+        ("cache (depois)", measure(cached, args.iterations)),
+    ]
+    loop.close()
+
+    baseline = results[0][1]
+    print(f"{'caminho':<18} {'µs/req':>10} {'vs sdk':>8}")
+    for name, seconds in results:
+        print(f"{name:<18} {seconds * 1e6:>10.1f} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
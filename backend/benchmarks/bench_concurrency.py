@@ -0,0 +1,86 @@
+"""
+Benchmark: N requisições concorrentes em um único worker.
+
+Compara o caminho assíncrono atual (generate_content_async) com uma simulação
+do caminho antigo, em que a chamada ao Gemini bloqueava o event loop.
+Com o caminho assíncrono, N requisições devem levar aproximadamente a latência
+de uma chamada; no caminho bloqueante, N vezes essa latência.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_concurrency --requests 10 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-key")
+
+import google.generativeai as genai
+import httpx
+
+import app.gemini_client as gemini_client
+from app.gemini_api import GeminiAPI
+from app.main import app
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+def make_fake_model(latency, blocking):
+    class FakeModel:
+        def __init__(self, model_name, *args, **kwargs):
+            self.model_name = model_name
+
+        async def generate_content_async(self, contents, **kwargs):
+            if blocking:
+                # Simula a chamada síncrona antiga: segura o event loop
+                time.sleep(latency)
+            else:
+                await asyncio.sleep(latency)
+            return _Response("ok")
+
+    return FakeModel
+
+
+async def run_round(num_requests):
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/agents/general-question", data={"question": f"pergunta {i}"})
+            for i in range(num_requests)
+        ])
+        elapsed = time.perf_counter() - start
+    failures = sum(1 for r in responses if r.status_code != 200)
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    original_model = genai.GenerativeModel
+    original_gemini = gemini_client.gemini
+    try:
+        for label, blocking in (("blocking", True), ("async", False)):
+            genai.GenerativeModel = make_fake_model(args.latency, blocking)
+            # Camada Gemini nova a cada rodada: ela guarda o modelo criado
+            gemini_client.gemini = GeminiAPI(
+                gemini_client.MODEL_NAME, gemini_client.GENERATION_CONFIG, rpm=100000, tpm=10**9
+            )
+            elapsed, failures = asyncio.run(run_round(args.requests))
+            print(
+                f"{label:>8}: {args.requests} requests in {elapsed:.2f}s "
+                f"({elapsed / args.latency:.1f}x single-call latency, {failures} failures)"
+            )
+    finally:
+        genai.GenerativeModel = original_model
+        gemini_client.gemini = original_gemini
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: tempo de parse por página de busca de farmácia.
+
+Compara o caminho antigo dos scrapers (BeautifulSoup + lxml montando a árvore
+inteira, select/select_one e regex de preço compilada a cada card) com o atual
+(app.html_extract: XPath pré-compilado, parse a partir do primeiro card).
+Confere também se os dois extraem os mesmos produtos.
+
+Por padrão usa páginas sintéticas do tamanho das reais (centenas de KB, com
+estado JSON embutido, CSS inline e menus). Com --captured DIR usa páginas
+salvas do site real, com os nomes consulta_remedios.html, drogasil.html,
+ultrafarma.html e panvel.html (as que faltarem são ignoradas).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_html_parse --iterations 50
+    python -m benchmarks.bench_html_parse --captured ~/paginas --iterations 50
+"""
+import argparse
+import os
+import re
+import statistics
+import time
+
+from app import scrapers
+from app.html_extract import parse_html, parse_price
+from benchmarks.fixtures import make_large_site_page
+
+# fonte -> (host da página sintética, listagem atual, seletores CSS do código antigo)
+SOURCES = {
+    "consulta_remedios": ("consultaremedios.com.br", scrapers._CONSULTA_REMEDIOS_LISTING, (
+        'div[data-testid="product-card"]', 'h2[data-testid="product-card-title"]',
+        'span[data-testid="product-card-price-value"]')),
+    "drogasil": ("www.drogasil.com.br", scrapers._DROGASIL_LISTING, (
+        'div.ProductCard', 'h2.ProductCard__title', 'span.ProductPrice__value')),
+    "ultrafarma": ("www.ultrafarma.com.br", scrapers._ULTRAFARMA_LISTING, (
+        'div.boxProduto', 'a.prodTitle', 'span.boxPreco')),
+    "panvel": ("www.panvel.com", scrapers._PANVEL_LISTING, (
+        'div.boxProdutos', 'a.nomeLink', 'div.preco')),
+}
+
+
+def soup_products(content, selectors):
+    """Extração como era feita antes, com BeautifulSoup"""
+    from bs4 import BeautifulSoup
+
+    card_css, name_css, price_css = selectors
+    soup = BeautifulSoup(content, 'lxml')
+    products = []
+    for card in soup.select(card_css)[:5]:
+        name_elem = card.select_one(name_css)
+        price_elem = card.select_one(price_css)
+        price_text = price_elem.text.strip() if price_elem else ""
+        price_match = re.search(r'R\$\s*([\d.,]+)', price_text)
+        if name_elem and price_match:
+            products.append((name_elem.text.strip(), float(price_match.group(1).replace('.', '').replace(',', '.'))))
+    return products
+
+
+def lxml_products(content, listing):
+    products = []
+    for name, price_text, _ in listing.products(parse_html(content, listing.marker)):
+        price = parse_price(price_text)
+        if name and price:
+            products.append((name, price))
+    return products
+
+
+def median_ms(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def load_pages(captured_dir):
+    pages = {}
+    for source, (host, _, _) in SOURCES.items():
+        if captured_dir:
+            path = os.path.join(os.path.expanduser(captured_dir), f"{source}.html")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    pages[source] = f.read().decode("utf-8", errors="replace")
+        else:
+            pages[source] = make_large_site_page(host, "dipirona")
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--captured", help="pasta com páginas salvas (<fonte>.html)")
+    args = parser.parse_args()
+
+    pages = load_pages(args.captured)
+    if not pages:
+        raise SystemExit(f"Nenhuma página encontrada em {args.captured}")
+
+    print(f"{'fonte':<18} {'KB':>6} {'bs4 ms':>9} {'lxml ms':>9} {'ganho':>7}  produtos")
+    for source, content in pages.items():
+        _, listing, selectors = SOURCES[source]
+        old, new = soup_products(content, selectors), lxml_products(content, listing)
+        old_ms = median_ms(lambda: soup_products(content, selectors), max(1, args.iterations // 5))
+        new_ms = median_ms(lambda: lxml_products(content, listing), args.iterations)
+        check = len(new) if old == new else f"DIFERENTES (bs4 {len(old)}, lxml {len(new)})"
+        print(f"{source:<18} {len(content.encode()) // 1024:>6} {old_ms:>9.2f} {new_ms:>9.2f} {old_ms / new_ms:>6.1f}x  {check}")
+
+
+if __name__ == "__main__":
+    main()
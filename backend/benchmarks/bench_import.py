@@ -0,0 +1,88 @@
+"""
+Benchmark: tempo de importação (cold start) do processo da API.
+
+Roda `python -X importtime -c "import app.main"` em processos novos, lê o
+relatório do importtime e mostra a mediana do tempo total, os módulos mais
+caros e quais dependências pesadas entraram na importação. Com --budget-ms o
+script sai com código 1 se a mediana passar do limite (para pegar regressões).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_import --runs 5 --top 15 --budget-ms 1500
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Dependências que devem ser carregadas só quando usadas
+HEAVY_MODULES = ("google.generativeai", "firebase_admin", "fitz", "bs4", "lxml.etree")
+
+_LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """
+    Parse the report of `python -X importtime`
+
+    Returns:
+        dict: module name -> (self µs, cumulative µs, nesting depth)
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return modules
+
+
+def run_once(module):
+    env = dict(os.environ)
+    # A importação não pode depender da chave; o .env não sobrescreve o valor vazio
+    env["GEMINI_API_KEY"] = ""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    totals = [run[args.module][1] / 1000 for run in runs]
+    median = statistics.median(totals)
+    last = runs[-1]
+
+    print(f"{args.module}: median {median:.0f}ms over {args.runs} runs (min {min(totals):.0f}ms, max {max(totals):.0f}ms)")
+    print(f"\nTop {args.top} direct imports by cumulative time (last run):")
+    # Profundidade 1: importações diretas de app.main e do pacote app (e algumas da inicialização do Python)
+    direct = sorted(
+        ((name, cumulative) for name, (_, cumulative, depth) in last.items() if depth == 1),
+        key=lambda item: -item[1]
+    )
+    for name, cumulative in direct[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    print("\nHeavy dependencies:")
+    for name in HEAVY_MODULES:
+        timing = last.get(name)
+        state = f"{timing[1] / 1000:.1f}ms" if timing else "not imported"
+        print(f"  {name:<22} {state}")
+
+    if args.budget_ms is not None and median > args.budget_ms:
+        print(f"\nFAIL: median import time {median:.0f}ms exceeds budget {args.budget_ms:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
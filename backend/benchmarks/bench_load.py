@@ -0,0 +1,319 @@
+"""
+Benchmark: carga ponta a ponta nos cinco endpoints, com latência e vazão.
+
+Sobe a API com uvicorn em um processo separado, com um fake local do Gemini
+(latência fixa + tempo de geração por token) e stubs HTTP locais servindo
+HTML no formato de bulas.med.br, consultaremedios, drogasil, ultrafarma e
+panvel (os scrapers fazem requisições HTTP de verdade, só o host muda).
+Dispara as requisições de cada endpoint com a concorrência pedida e mostra
+p50/p95/p99 e requisições por segundo.
+
+Por padrão cada requisição usa um exame ou medicamento diferente, medindo o
+caminho completo (sem acertos de cache); --repeat usa sempre o mesmo.
+
+--save grava os resultados em JSON; --compare compara com um arquivo salvo
+e sai com código 1 se o p95 de algum endpoint piorar mais que --tolerance.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_load --requests 50 --concurrency 10 --save .cache/bench_load.json
+    python -m benchmarks.bench_load --requests 50 --concurrency 10 --compare .cache/bench_load.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from benchmarks.fixtures import make_lab_report_pdf, stub_site_page
+
+ENDPOINTS = ["analyze-exam", "exam-question", "medication-info", "medication-prices", "general-question"]
+
+MEDICATIONS = ["dipirona", "paracetamol", "ibuprofeno", "losartana", "omeprazol", "metformina", "sinvastatina"]
+QUESTIONS = [
+    "O que significa meu colesterol estar alto?",
+    "Devo me preocupar com a glicose?",
+    "Como melhorar meus triglicerídeos?",
+    "O que pode causar alteração no TSH?",
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ─── Processo da API ───────────────────────────────────────────────────────────
+
+def _start_site_stubs(latency):
+    """Servidor HTTP local que responde por todos os sites: /<host>/<caminho>."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            host, _, rest = self.path.lstrip("/").partition("/")
+            parts = urlsplit("/" + rest)
+            query = parse_qs(parts.query)
+            medication = unquote(parts.path.rsplit("/", 1)[-1]) if parts.path.startswith("/bula/") else \
+                next(iter(query.values()), ["remedio"])[0]
+            time.sleep(latency)
+            page = stub_site_page(host, parts.path, medication)
+            body = (page or "not found").encode("utf-8")
+            self.send_response(200 if page else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def _make_fake_model(latency, token_rate, reply_tokens):
+    """GenerativeModel local: `latency` até o primeiro token e `token_rate` tokens/s depois."""
+
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    reply = " ".join(["resultado"] * reply_tokens)
+
+    class FakeGenerativeModel:
+        def __init__(self, model_name, *args, **kwargs):
+            self.model_name = model_name
+
+        async def generate_content_async(self, contents, stream=False, **kwargs):
+            await asyncio.sleep(latency)
+            if stream:
+                return self._stream()
+            await asyncio.sleep(reply_tokens / token_rate)
+            return _Response(reply)
+
+        async def _stream(self):
+            for _ in range(reply_tokens):
+                await asyncio.sleep(1 / token_rate)
+                yield _Response("resultado ")
+
+    return FakeGenerativeModel
+
+
+def serve(port, options):
+    """Ponto de entrada do processo da API (importa a app só depois de ajustar o ambiente)."""
+    cache_dir = options["cache_dir"]
+    os.environ.update({
+        "GEMINI_API_KEY": "benchmark-key",
+        "ANALYSIS_CACHE_PATH": os.path.join(cache_dir, "analysis_cache.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(cache_dir, "jobs.sqlite3"),
+        "PRICE_CATALOG_PATH": os.path.join(cache_dir, "price_catalog.sqlite3"),
+        "GEMINI_RPM": "1000000",
+        "GEMINI_TPM": str(10 ** 12),
+    })
+    os.environ.pop("FIREBASE_SERVICE_ACCOUNT", None)
+    os.environ.pop("INTERACTIONS_DATABASE_URL", None)
+
+    import logging
+
+    import google.generativeai as genai
+    import uvicorn
+
+    stub_port = _start_site_stubs(options["site_latency"])
+    genai.GenerativeModel = _make_fake_model(options["gemini_latency"], options["token_rate"], options["reply_tokens"])
+
+    from app import http_client
+
+    original_get = http_client.get
+
+    def get_from_stub(url, **kwargs):
+        # https://www.drogasil.com.br/search?w=x -> http://127.0.0.1:<stub>/www.drogasil.com.br/search?w=x
+        parts = urlsplit(url)
+        local = f"http://127.0.0.1:{stub_port}/{parts.netloc}{parts.path}"
+        return original_get(local + (f"?{parts.query}" if parts.query else ""), **kwargs)
+
+    http_client.get = get_from_stub
+
+    from app.main import app
+
+    logging.getLogger("exam-analyzer-api").setLevel(logging.ERROR)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+# ─── Cliente ───────────────────────────────────────────────────────────────────
+
+def percentile(samples, fraction):
+    """Percentil por posição (nearest-rank) de uma lista de latências."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _requests_for(endpoint, count, repeat, session_id, pdfs):
+    """Lista de kwargs de httpx.post para cada requisição do endpoint."""
+    auth = {"Authorization": "Bearer benchmark"}
+    for i in range(count):
+        n = 0 if repeat else i
+        if endpoint == "analyze-exam":
+            yield {"files": {"file": ("exame.pdf", pdfs[n % len(pdfs)], "application/pdf")}, "headers": auth}
+        elif endpoint == "exam-question":
+            question = QUESTIONS[n % len(QUESTIONS)] + ("" if repeat else f" ({n})")
+            yield {"data": {"question": question, "session_id": session_id}, "headers": auth}
+        elif endpoint in ("medication-info", "medication-prices"):
+            name = MEDICATIONS[n % len(MEDICATIONS)] + ("" if repeat else f" {n}")
+            yield {"data": {"medication_name": name}}
+        else:
+            yield {"data": {"question": QUESTIONS[n % len(QUESTIONS)] + ("" if repeat else f" ({n})")}}
+
+
+async def run_endpoint(client, endpoint, requests, concurrency):
+    queue = list(requests)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            kwargs = queue.pop()
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"/agents/{endpoint}", **kwargs)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+async def drive(base_url, args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("API did not become ready in 60s")
+            await asyncio.sleep(0.2)
+
+        # Laudos com texto distinto (não caem no cache), gerados antes da medição
+        pdfs = [make_lab_report_pdf(1, patient=f"Paciente {i}") for i in range(1 if args.repeat else args.requests)]
+        session = await client.post(
+            "/agents/analyze-exam",
+            files={"file": ("exame.pdf", make_lab_report_pdf(1, patient="Sessão"), "application/pdf")},
+            headers={"Authorization": "Bearer benchmark"},
+        )
+        session.raise_for_status()
+        session_id = session.json()["session_id"]
+
+        results = {}
+        for endpoint in args.endpoints:
+            requests = list(_requests_for(endpoint, args.requests, args.repeat, session_id, pdfs))
+            results[endpoint] = await run_endpoint(client, endpoint, requests, args.concurrency)
+        return results
+
+
+def compare(results, baseline, tolerance):
+    """Mostra a variação do p95 por endpoint; retorna os endpoints que pioraram além da tolerância."""
+    regressions = []
+    print(f"\n{'endpoint':<20} {'p95 base':>10} {'p95 agora':>10} {'variação':>9}")
+    for endpoint, current in results.items():
+        previous = baseline["results"].get(endpoint)
+        if not previous:
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] if previous["p95_ms"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(endpoint)
+            flag = "  REGRESSÃO"
+        print(f"{endpoint:<20} {previous['p95_ms']:>10.1f} {current['p95_ms']:>10.1f} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50, help="requisições por endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="segundos até o primeiro token")
+    parser.add_argument("--token-rate", type=float, default=2000.0, help="tokens gerados por segundo")
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--site-latency", type=float, default=0.05, help="latência de cada página dos stubs")
+    parser.add_argument("--repeat", action="store_true", help="mesmo exame/medicamento em todas as requisições")
+    parser.add_argument("--save", help="grava os resultados neste arquivo JSON")
+    parser.add_argument("--compare", help="compara com um arquivo salvo por --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="piora aceitável do p95 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    options = {
+        "gemini_latency": args.gemini_latency,
+        "token_rate": args.token_rate,
+        "reply_tokens": args.reply_tokens,
+        "site_latency": args.site_latency,
+    }
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = multiprocessing.get_context("spawn").Process(
+            target=serve, args=(port, dict(options, cache_dir=cache_dir)), daemon=True
+        )
+        server.start()
+        try:
+            results = asyncio.run(drive(f"http://127.0.0.1:{port}", args))
+        finally:
+            server.terminate()
+            server.join(10)
+
+    print(f"{'endpoint':<20} {'reqs':>5} {'erros':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, r in results.items():
+        print(f"{endpoint:<20} {r['requests']:>5} {r['errors']:>6} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "cpus": os.cpu_count()},
+        "options": dict(options, requests=args.requests, concurrency=args.concurrency, repeat=args.repeat),
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("options") != report["options"]:
+            print("\nAviso: a linha de base foi gravada com outras opções")
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: extração serial vs. pool de processos por faixa de páginas.
+
+Mede extract_pdf_content em laudos sintéticos de 1, 10 e 100 páginas com o
+pool desligado (serial) e ligado (páginas distribuídas entre os workers).
+O pool é aquecido antes da medição, como acontece num worker de longa duração.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_pdf_extraction --workers 4 --iterations 20
+"""
+import argparse
+import logging
+import time
+
+import app.pdf_processor as pdf_processor
+from benchmarks.fixtures import make_lab_report_pdf
+
+
+def measure(data, iterations):
+    pdf_processor.extract_pdf_content(data)  # aquecimento
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pdf_processor.extract_pdf_content(data)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    logging.getLogger("exam-analyzer-api").setLevel(logging.WARNING)
+
+    print(f"{'pages':>6} {'serial ms':>10} {'pool ms':>10} {'speedup':>8}")
+    try:
+        for pages in args.pages:
+            data = make_lab_report_pdf(pages)
+
+            pdf_processor.PDF_WORKERS = 1
+            serial = measure(data, args.iterations)
+
+            pdf_processor.PDF_WORKERS = args.workers
+            pdf_processor.PARALLEL_MIN_PAGES = 1
+            pooled = measure(data, args.iterations)
+
+            print(f"{pages:>6} {serial * 1000:>10.2f} {pooled * 1000:>10.2f} {serial / pooled:>7.2f}x")
+    finally:
+        pdf_processor.shutdown_extraction_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: extração de PDF via arquivo temporário vs. direto da memória.
+
+O caminho antigo gravava o upload em temp_{uuid}.pdf, reabria o arquivo com
+fitz e o removia; o novo passa os bytes para fitz.open(stream=...).
+Mede a latência média e, no Linux, as syscalls de leitura/escrita do processo
+(campos syscr/syscw de /proc/self/io).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_pdf_memory --pages 5 --iterations 200
+"""
+import argparse
+import logging
+import os
+import time
+from uuid import uuid4
+
+from app.pdf_processor import extract_pdf_content
+from benchmarks.fixtures import make_lab_report_pdf
+
+
+def read_syscall_counters():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["syscr"]), int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def via_temp_file(contents):
+    temp_file_path = f"temp_{uuid4()}.pdf"
+    with open(temp_file_path, "wb") as buf:
+        buf.write(contents)
+    try:
+        return extract_pdf_content(temp_file_path)
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+def via_memory(contents):
+    return extract_pdf_content(contents)
+
+
+def measure(func, contents, iterations):
+    before = read_syscall_counters()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(contents)
+    elapsed = time.perf_counter() - start
+    after = read_syscall_counters()
+    syscalls = None
+    if before and after:
+        syscalls = ((after[0] - before[0]) / iterations, (after[1] - before[1]) / iterations)
+    return elapsed / iterations, syscalls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    # Os logs por página dominariam a medição
+    logging.getLogger("exam-analyzer-api").setLevel(logging.WARNING)
+
+    contents = make_lab_report_pdf(args.pages)
+    print(f"PDF: {args.pages} pages, {len(contents)} bytes, {args.iterations} iterations")
+    for label, func in (("temp file", via_temp_file), ("in memory", via_memory)):
+        func(contents)  # aquecimento
+        latency, syscalls = measure(func, contents, args.iterations)
+        line = f"{label:>10}: {latency * 1000:.3f} ms/extraction"
+        if syscalls:
+            line += f", {syscalls[0]:.1f} read + {syscalls[1]:.1f} write syscalls/extraction"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
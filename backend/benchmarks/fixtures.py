@@ -0,0 +1,161 @@
+"""Dados sintéticos compartilhados pelos benchmarks."""
+import fitz  # PyMuPDF
+
+LAB_LINES = [
+    "Hemoglobina ............ 13,5 g/dL      (12,0 - 16,0)",
+    "Hematócrito ............ 41,2 %         (36,0 - 48,0)",
+    "Leucócitos ............. 7.800 /mm3     (4.000 - 11.000)",
+    "Plaquetas .............. 250.000 /mm3   (150.000 - 450.000)",
+    "Glicose ................ 92 mg/dL       (70 - 99)",
+    "Colesterol total ....... 215 mg/dL      (< 190)",
+    "Triglicerídeos ......... 140 mg/dL      (< 150)",
+    "Creatinina ............. 0,9 mg/dL      (0,6 - 1,2)",
+    "TSH .................... 2,1 mUI/L      (0,4 - 4,0)",
+]
+
+
+def make_lab_report_pdf(pages=1, patient=None):
+    """
+    Gera um laudo laboratorial sintético com `pages` páginas e retorna os bytes.
+
+    Com `patient`, o nome vai no cabeçalho: laudos de pacientes diferentes têm
+    texto diferente e não se encontram no cache de análises.
+    """
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        y = 72
+        page.insert_text((72, y), f"LAUDO LABORATORIAL - Página {page_number + 1}")
+        if patient:
+            y += 14
+            page.insert_text((72, y), f"Paciente: {patient}")
+        for repeat in range(4):
+            for line in LAB_LINES:
+                y += 14
+                page.insert_text((72, y), line)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_signing_key():
+    """Gera uma chave RSA e o certificado autoassinado, como os publicados pelo Google.
+
+    Retorna (chave privada PEM, certificado PEM).
+    """
+    import datetime
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "benchmark")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def make_id_token(private_pem, project, uid="paciente", kid="k1", expires_in=3600):
+    """Gera um ID token no formato do Firebase Auth assinado com a chave dada."""
+    import time
+    from google.auth import crypt, jwt
+
+    now = int(time.time())
+    claims = {"iss": f"https://securetoken.google.com/{project}", "aud": project, "sub": uid,
+              "iat": now - 10, "exp": now + expires_in, "auth_time": now - 10}
+    return jwt.encode(crypt.RSASigner.from_string(private_pem, key_id=kid), claims).decode()
+
+
+def _cards(template, medication, count=5):
+    return "\n".join(template.format(name=f"{medication.title()} {50 * (i + 1)}mg", price=f"{9 + 3 * i},90", slug=i)
+                     for i in range(count))
+
+
+# Páginas no formato que cada scraper lê (mesmos seletores CSS)
+_PHARMACY_CARDS = {
+    "consultaremedios.com.br": (
+        '<div data-testid="product-card"><a href="/p/{slug}"><h2 data-testid="product-card-title">{name}</h2></a>'
+        '<span data-testid="product-card-price-value">R$ {price}</span></div>'
+    ),
+    "www.drogasil.com.br": (
+        '<div class="ProductCard"><a class="ProductCard__link" href="/p/{slug}">'
+        '<h2 class="ProductCard__title">{name}</h2></a><span class="ProductPrice__value">R$ {price}</span></div>'
+    ),
+    "www.ultrafarma.com.br": (
+        '<div class="boxProduto"><a class="prodTitle" href="/p/{slug}">{name}</a>'
+        '<span class="boxPreco">R$ {price}</span></div>'
+    ),
+    "www.panvel.com": (
+        '<div class="boxProdutos"><a class="nomeLink" href="/p/{slug}">{name}</a>'
+        '<div class="preco">R$ {price}</div></div>'
+    ),
+}
+
+BULA_SECTIONS = [
+    ("Apresentação", "Comprimidos de 500 mg em embalagem com 10 unidades."),
+    ("Composição", "Cada comprimido contém 500 mg do princípio ativo."),
+    ("Para que este medicamento é indicado?", "Alívio de dor e febre."),
+    ("Como devo usar este medicamento?", "Um comprimido a cada 6 horas, se necessário."),
+    ("Quando não devo usar este medicamento?", "Em caso de alergia a qualquer componente."),
+    ("Quais os males que este medicamento pode me causar?", "Reações alérgicas raras."),
+]
+
+
+def stub_site_page(host, path, medication):
+    """
+    HTML servido pelo stub local de um site de farmácia ou bulário.
+
+    Retorna None para páginas que o site real não teria (404).
+    """
+    if host in _PHARMACY_CARDS:
+        return f"<html><body>{_cards(_PHARMACY_CARDS[host], medication)}</body></html>"
+    if host == "bulas.med.br" and path.startswith("/search"):
+        return ('<html><body><div class="col-lg-9"><ul class="search-results">'
+                f'<li><a href="/bula/{medication}">{medication.title()}</a></li></ul></div></body></html>')
+    if host == "bulas.med.br" and path.startswith("/bula/"):
+        blocks = "".join(f'<div class="info-block"><h2 class="info-title">{title}</h2>'
+                         f'<div class="info-content">{text}</div></div>' for title, text in BULA_SECTIONS)
+        return (f'<html><body><h1 class="product-title">{medication.title()}</h1>'
+                f'<span class="manufacturer">Laboratório Exemplo</span>{blocks}</body></html>')
+    if host == "remedios.com.br":
+        # Busca sem resultados: a bula vem de bulas.med.br
+        return "<html><body><p>Nenhum resultado</p></body></html>"
+    return None
+
+
+def make_large_site_page(host, medication, cards=48, script_kb=250):
+    """
+    Página de busca de farmácia no tamanho das reais (centenas de KB).
+
+    Tem o que as páginas capturadas têm além dos cards: estado JSON embutido
+    em <script>, CSS inline, menu com centenas de links, cards com imagem e
+    selos, e rodapé. Os cards usam os mesmos seletores de stub_site_page.
+    """
+    import json
+
+    state = {"props": {"pageProps": {"products": [
+        {"sku": i, "name": f"{medication.title()} {i}", "description": "x" * 200, "price": 9.9 + i}
+        for i in range(script_kb * 1024 // 260)
+    ]}}}
+    style = "".join(f".c{i}{{margin:{i % 7}px;padding:{i % 5}px;color:#{i % 999:03d}}}" for i in range(800))
+    menu = "".join(f'<li class="menu-item"><a href="/categoria/{i}">Categoria {i}</a></li>' for i in range(400))
+    card = (
+        '<div class="grid-item"><div class="badge-list"><span class="badge">Genérico</span>'
+        '<span class="badge">Frete grátis</span></div><img src="/img/{slug}.webp" alt="" loading="lazy">'
+        + _PHARMACY_CARDS[host]
+        + '<div class="installments">ou 3x sem juros</div><button class="buy">Comprar</button></div>'
+    )
+    footer = "".join(f'<p class="footer-text">Informação legal {i}: consulte um farmacêutico.</p>' for i in range(200))
+    return (
+        '<!DOCTYPE html><html lang="pt-BR"><head><meta charset="utf-8">'
+        f'<title>{medication} | Busca</title><style>{style}</style>'
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state)}</script></head>'
+        f'<body><header><nav><ul class="menu">{menu}</ul></nav></header>'
+        f'<main><div class="search-grid">{_cards(card, medication, cards)}</div></main>'
+        f'<footer>{footer}</footer></body></html>'
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 import pytest
@@ -14,4 +15,66 @@ from app.main import app
 def client():
     """Fixture que retorna um TestClient configurado para a aplicação FastAPI."""
     # Solução compatível com versões mais novas
-    return TestClient(app, raise_server_exceptions=False)
\ No newline at end of file
+    return TestClient(app, raise_server_exceptions=False)
+
+
+class FakeGeminiResponse:
+    """Resposta mínima compatível com o que o gemini_client lê (`.text`)."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Substituto local do genai.GenerativeModel.
+    `latency` simula o tempo de resposta da API sem bloquear o event loop.
+    """
+
+    latency = 0.0
+    reply = "Resposta simulada"
+    prompts = []
+
+    def __init__(self, model_name, *args, **kwargs):
+        self.model_name = model_name
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        FakeGenerativeModel.prompts.append(contents)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if stream:
+            return self._stream_chunks(self.reply)
+        return FakeGeminiResponse(self.reply)
+
+    @staticmethod
+    async def _stream_chunks(text):
+        # Um trecho por palavra, como o stream=True do SDK
+        for word in text.split(" "):
+            yield FakeGeminiResponse(word + " ")
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch, tmp_path):
+    """Troca o modelo Gemini por um fake local e retorna a classe para ajustes."""
+    import google.generativeai as genai
+    import app.gemini_client as gemini_client
+    from app.analysis_cache import AnalysisCache
+    from app.gemini_api import GeminiAPI
+    from app.price_catalog import PriceCatalog
+    from app.response_cache import ResponseCache
+
+    # Caches isolados por teste
+    monkeypatch.setattr(gemini_client, "analysis_cache", AnalysisCache(str(tmp_path / "analysis_cache.sqlite3")))
+    monkeypatch.setattr(gemini_client, "medication_info_cache", ResponseCache("medication-info", ttl=3600, stale_ttl=3600))
+    monkeypatch.setattr(gemini_client, "medication_prices_cache", ResponseCache("medication-prices", ttl=3600, stale_ttl=3600))
+    monkeypatch.setattr(gemini_client, "price_catalog", PriceCatalog(str(tmp_path / "price_catalog.sqlite3")))
+
+    FakeGenerativeModel.latency = 0.0
+    FakeGenerativeModel.reply = "Resposta simulada"
+    FakeGenerativeModel.prompts = []
+    monkeypatch.setattr(genai, "GenerativeModel", FakeGenerativeModel)
+    # Camada Gemini nova (sem modelos em cache) e sem limite efetivo
+    monkeypatch.setattr(gemini_client, "gemini", GeminiAPI(
+        gemini_client.MODEL_NAME, gemini_client.GENERATION_CONFIG, rpm=100000, tpm=10**9
+    ))
+    return FakeGenerativeModel
@@ -0,0 +1,42 @@
+import random
+import string
+
+from app.analysis_cache import AnalysisCache, exam_fingerprint
+
+
+def test_fingerprint_ignores_whitespace_differences():
+    a = exam_fingerprint("Hemoglobina  13,5\n\nGlicose 90 ")
+    b = exam_fingerprint(" Hemoglobina 13,5 Glicose 90")
+    assert a == b
+    assert exam_fingerprint("Hemoglobina 13,5", "modelo-a") != exam_fingerprint("Hemoglobina 13,5", "modelo-b")
+
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = AnalysisCache(path)
+    cache.put("k1", "✅ Resumo geral do exame")
+    cache.close()
+
+    reopened = AnalysisCache(path)
+    assert reopened.get("k1") == "✅ Resumo geral do exame"
+    assert reopened.get("k2") is None
+    assert reopened.stats()["hits"] == 1
+    assert reopened.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used_beyond_size_limit(tmp_path):
+    clock_values = iter(range(100))
+    cache = AnalysisCache(str(tmp_path / "cache.sqlite3"), max_bytes=250, clock=lambda: next(clock_values))
+    # Textos pouco compressíveis (~100 bytes comprimidos cada)
+    rng = random.Random(42)
+    texts = {k: "".join(rng.choice(string.ascii_letters) for _ in range(120)) for k in "abc"}
+
+    cache.put("a", texts["a"])
+    cache.put("b", texts["b"])
+    cache.get("a")  # "b" passa a ser o menos recente
+    cache.put("c", texts["c"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == texts["a"]
+    assert cache.get("c") == texts["c"]
+    assert cache.stats()["bytes"] <= 250
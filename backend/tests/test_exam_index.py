@@ -0,0 +1,60 @@
+from app.exam_index import ExamIndex, build_index, is_broad_question, split_exam, tokenize
+from app.session_store import SessionStore
+
+EXAM = """HEMOGRAMA COMPLETO
+Hemoglobina: 13,5 g/dL (12,0 a 16,0)
+Hematócrito: 41 % (36 a 46)
+Leucócitos: 7.200 /mm3 (4.000 a 10.000)
+
+BIOQUÍMICA
+Glicose em jejum: 126 mg/dL (70 a 99)
+Colesterol total: 230 mg/dL (< 190)
+Triglicerídeos: 180 mg/dL (< 150)
+
+HORMÔNIOS
+TSH: 2,1 mUI/L (0,4 a 4,0)
+"""
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("Qual é o meu nível de Glicose?") == ["glicose"]
+    assert tokenize("Hematócrito 41,5") == ["hematocrito", "41,5"]
+
+
+def test_split_keeps_sections_and_whole_lines():
+    chunks = split_exam(EXAM)
+    assert len(chunks) == 3
+    assert chunks[1].startswith("BIOQUÍMICA")
+
+    small = split_exam(EXAM, max_chars=60)
+    assert all(line in EXAM for chunk in small for line in chunk.splitlines())
+    assert len(small) > 3
+
+
+def test_search_ranks_matching_section_first():
+    index = ExamIndex(split_exam(EXAM))
+
+    assert index.search("Como está minha glicose?")[0][0] == 1
+    assert index.search("hormonio tireoide TSH")[0][0] == 2
+    assert index.search("vitamina D") == []
+    assert "Colesterol total" in index.excerpts("colesterol")
+
+
+def test_broad_questions_are_detected():
+    assert is_broad_question("Pode resumir o exame?")
+    assert is_broad_question("Quais valores estão alterados?")
+    assert not is_broad_question("O que significa TSH?")
+
+
+def test_index_lives_with_its_session_and_counts_against_the_budget():
+    index = build_index(EXAM)
+    store = SessionStore(max_entries=1)
+    store.put("s1", EXAM, index=index)
+
+    assert store.get_index("s1") is index
+    assert store.stats()["bytes"] > index.nbytes > len(EXAM) // 2
+
+    # Sessão despejada leva o índice junto
+    store.put("s2", "outro exame")
+    assert store.get_index("s1") is None
+    assert store.get_index("s2") is None  # guardada sem índice
@@ -22,3 +22,106 @@ def test_verify_token_skipped_when_not_initialized(monkeypatch):
     monkeypatch.setattr(fb_admin, "firebase_initialized", False)
     out = verify_firebase_token("any")
     assert out == {"uid": "test-uid", "email": "test@example.com"}
+
+
+def _signing_key():
+    """Chave RSA e certificado autoassinado no formato publicado pelo Google."""
+    import datetime
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "teste")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def _id_token(private_pem, project="projeto", uid="u1", kid="k1", expires_in=3600):
+    import time
+    from google.auth import crypt, jwt
+
+    now = int(time.time())
+    claims = {"iss": f"https://securetoken.google.com/{project}", "aud": project, "sub": uid,
+              "iat": now - 10, "exp": now + expires_in}
+    return jwt.encode(crypt.RSASigner.from_string(private_pem, key_id=kid), claims).decode()
+
+
+@pytest.fixture
+def local_verification(monkeypatch):
+    private_pem, cert_pem = _signing_key()
+    monkeypatch.setattr(fb_admin, "firebase_initialized", True)
+    monkeypatch.setattr(fb_admin, "_project_id", lambda: "projeto")
+    monkeypatch.setattr(fb_admin.certificate_store, "_certs", {"k1": cert_pem})
+    monkeypatch.setattr(fb_admin, "token_cache", fb_admin.VerifiedTokenCache())
+    return private_pem
+
+
+@patch("firebase_admin.auth.verify_id_token")
+def test_token_is_verified_locally_and_cached(mock_verify, local_verification):
+    token = _id_token(local_verification)
+
+    assert verify_firebase_token(token)["uid"] == "u1"
+    assert fb_admin.cached_token_claims(token)["uid"] == "u1"
+    assert verify_firebase_token(token)["uid"] == "u1"
+
+    mock_verify.assert_not_called()
+    assert fb_admin.token_cache.stats()["hits"] == 2
+
+
+@patch("firebase_admin.auth.verify_id_token")
+def test_invalid_tokens_are_rejected_and_not_cached(mock_verify, local_verification):
+    wrong_project = _id_token(local_verification, project="outro")
+    other_key, _ = _signing_key()
+    forged = _id_token(other_key)
+
+    assert verify_firebase_token(wrong_project) is None
+    assert verify_firebase_token(forged) is None
+    assert fb_admin.token_cache.stats()["entries"] == 0
+    mock_verify.assert_not_called()
+
+
+@patch("firebase_admin.auth.verify_id_token", return_value={"uid": "u2", "exp": 4102444800})
+def test_unknown_key_falls_back_to_sdk(mock_verify, local_verification):
+    token = _id_token(local_verification, kid="rotacionada")
+    assert verify_firebase_token(token)["uid"] == "u2"
+    mock_verify.assert_called_once()
+
+
+def test_cached_claims_expire_with_the_token():
+    clock = [1000.0]
+    cache = fb_admin.VerifiedTokenCache(max_entries=2, clock=lambda: clock[0])
+    cache.put("a", {"uid": "a", "exp": 1100})
+    cache.put("b", {"uid": "b", "exp": 2000})
+    cache.put("c", {"uid": "c", "exp": 2000})
+
+    assert cache.get("a") is None  # removido pelo limite de entradas
+    assert cache.get("b")["uid"] == "b"
+    clock[0] = 2000.0
+    assert cache.get("b") is None
+
+
+def test_certificates_refresh_honors_max_age(monkeypatch):
+    class Response:
+        headers = {"Cache-Control": "public, max-age=20000, must-revalidate"}
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"k1": "cert"}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(fb_admin.http_client, "get", lambda url: Response())
+    store = fb_admin.CertificateStore()
+
+    assert store.refresh() == 3600  # limitado a AUTH_CERT_REFRESH_MAX_SECONDS
+    assert store.get() == {"k1": "cert"}
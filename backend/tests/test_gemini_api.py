@@ -0,0 +1,91 @@
+import asyncio
+
+import google.generativeai as genai
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.gemini_api import GeminiAPI
+
+
+class FlakyModel:
+    """Fake local do GenerativeModel que falha com 429/503 antes de responder."""
+
+    instances = 0
+
+    def __init__(self, model_name):
+        FlakyModel.instances += 1
+        self.failures = [google_exceptions.ResourceExhausted("quota"), google_exceptions.ServiceUnavailable("busy")]
+
+    async def generate_content_async(self, contents, **kwargs):
+        if self.failures:
+            raise self.failures.pop(0)
+        return f"ok: {contents}"
+
+
+@pytest.fixture
+def flaky_model(monkeypatch):
+    FlakyModel.instances = 0
+    monkeypatch.setattr(genai, "GenerativeModel", FlakyModel)
+    return FlakyModel
+
+
+@pytest.mark.asyncio
+async def test_retries_429_and_503_with_backoff(flaky_model):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    api = GeminiAPI("models/teste", {}, max_retries=3, backoff_base=1.0, sleep=fake_sleep)
+
+    assert await api.generate("pergunta") == "ok: pergunta"
+    assert api.stats()["retries"] == 2
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(flaky_model):
+    async def fake_sleep(seconds):
+        pass
+
+    api = GeminiAPI("models/teste", {}, max_retries=1, sleep=fake_sleep)
+
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        await api.generate("pergunta")
+
+
+@pytest.mark.asyncio
+async def test_model_object_is_reused_across_calls(flaky_model):
+    async def fake_sleep(seconds):
+        pass
+
+    api = GeminiAPI("models/teste", {}, sleep=fake_sleep)
+    for _ in range(3):
+        await api.generate("pergunta")
+
+    assert flaky_model.instances == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_capped(monkeypatch):
+    state = {"active": 0, "peak": 0}
+
+    class SlowModel:
+        def __init__(self, model_name):
+            pass
+
+        async def generate_content_async(self, contents, **kwargs):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return contents
+
+    monkeypatch.setattr(genai, "GenerativeModel", SlowModel)
+    api = GeminiAPI("models/teste", {}, rpm=10**6, tpm=10**9, max_concurrency=3)
+
+    results = await asyncio.gather(*[api.generate(f"p{i}") for i in range(10)])
+
+    assert results == [f"p{i}" for i in range(10)]
+    assert state["peak"] == 3
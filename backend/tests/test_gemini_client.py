@@ -0,0 +1,133 @@
+import pytest
+
+import app.gemini_client as gemini_client
+
+
+@pytest.mark.asyncio
+async def test_duplicate_exam_is_served_from_analysis_cache(fake_gemini):
+    fake_gemini.reply = "✅ Resumo geral do exame"
+    exam = "Hemoglobina 13,5 g/dL\nGlicose 90 mg/dL"
+
+    first = await gemini_client.analyze_exam(exam, "sessao-1")
+    second = await gemini_client.analyze_exam(exam + "\n", "sessao-2")
+
+    assert first == second == "✅ Resumo geral do exame"
+    assert len(fake_gemini.prompts) == 1
+    # A nova sessão fica ligada ao mesmo texto do exame, já indexado
+    assert gemini_client.exam_storage.get("sessao-2").strip() == exam
+    assert gemini_client.exam_storage.get_index("sessao-2").chunks
+
+
+@pytest.mark.asyncio
+async def test_medication_info_is_cached_by_normalized_name(fake_gemini, monkeypatch):
+    scraped = []
+
+    async def fake_search(name):
+        scraped.append(name)
+        return {"content": "Analgésico e antitérmico", "source": "https://exemplo/bula"}
+
+    monkeypatch.setattr(gemini_client.medication_info_scraper, "search_async", fake_search)
+
+    first = await gemini_client.search_medication_info("Dipirona")
+    second = await gemini_client.search_medication_info("  dipirôna ")
+
+    assert first == second
+    assert len(scraped) == 1
+    assert len(fake_gemini.prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_follow_up_on_long_exam_sends_only_relevant_chunks(fake_gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, "EXAM_RETRIEVAL_MIN_TOKENS", 100)
+    fake_gemini.reply = "✅ Resumo geral: colesterol elevado"
+    # Laudo descritivo, sem tabela de marcadores
+    sections = [f"SEÇÃO {i}\nRegião{i} avaliada sem alterações significativas." for i in range(40)]
+    exam = "\n\n".join(sections + ["LIPÍDIOS\nColesterol total acima do desejável para a idade."])
+
+    await gemini_client.analyze_exam(exam, "sessao-rag")
+    await gemini_client.analyze_and_answer("O que significa meu colesterol?", "sessao-rag")
+    await gemini_client.analyze_and_answer("Pode resumir o exame?", "sessao-rag")
+
+    targeted, broad = fake_gemini.prompts[1], fake_gemini.prompts[2]
+    assert "Colesterol total acima" in targeted
+    assert "Região7" not in targeted
+    # O resumo da análise anterior acompanha os trechos
+    assert "colesterol elevado" in targeted
+    # Perguntas gerais continuam recebendo o exame inteiro
+    assert "Região7" in broad
+
+
+@pytest.mark.asyncio
+async def test_value_lookup_is_answered_from_marker_table(fake_gemini):
+    exam = "Hemoglobina: 13,5 g/dL (12,0 a 16,0)\nGlicose em jejum: 126 mg/dL (70 a 99)\nObservação: amostra colhida em jejum"
+
+    await gemini_client.analyze_exam(exam, "sessao-tabela")
+    answer = await gemini_client.analyze_and_answer("Qual meu valor de glicose?", "sessao-tabela")
+
+    assert "**126 mg/dL**" in answer
+    assert "acima da faixa de referência" in answer
+    assert len(fake_gemini.prompts) == 1  # só a análise inicial
+
+    await gemini_client.analyze_and_answer("O que significa minha glicose alta?", "sessao-tabela")
+    prompt = fake_gemini.prompts[1]
+    # O Gemini recebe a tabela compacta, não o texto bruto
+    assert "Glicose em jejum: 126 mg/dL (ref. 70 a 99) [ALTO]" in prompt
+    assert "Glicose em jejum: 126 mg/dL (70 a 99)" not in prompt
+
+
+@pytest.mark.asyncio
+async def test_batch_summary_lives_with_the_session_not_the_analysis_cache(fake_gemini):
+    fake_gemini.reply = "✅ Resumo: TSH normal"
+    exams = [("tireoide.pdf", "TSH 2,1 mUI/L 0,4 a 4,0", None), ("laudo.pdf", "Ultrassom sem alterações", None)]
+
+    await gemini_client.analyze_exam_batch(exams, "sessao-lote")
+    await gemini_client.analyze_and_answer("Meus exames estão bons?", "sessao-lote")
+
+    # Só as análises de cada exame entram no cache; o texto juntado nunca foi analisado
+    assert gemini_client.analysis_cache.stats()["entries"] == 2
+    session = gemini_client.exam_storage.get_entry("sessao-lote")
+    assert "=== EXAME: laudo.pdf ===\n✅ Resumo: TSH normal" in session["analysis"]
+    # A pergunta seguinte recebe o resumo guardado na sessão
+    assert "=== EXAME: tireoide.pdf ===\n✅ Resumo: TSH normal" in fake_gemini.prompts[-1]
+
+
+@pytest.mark.asyncio
+async def test_follow_up_summary_survives_analysis_cache_eviction(fake_gemini, monkeypatch, tmp_path):
+    from app.analysis_cache import AnalysisCache
+
+    fake_gemini.reply = "✅ Resumo geral: glicose elevada"
+    exam = "Glicose em jejum: 126 mg/dL (70 a 99)\nObservação: amostra colhida em jejum"
+    chunks = [chunk async for chunk in gemini_client.analyze_exam_stream(exam, "sessao-resumo")]
+    assert "".join(chunks).strip() == "✅ Resumo geral: glicose elevada"
+
+    # O relatório sai do cache (LRU), mas a sessão continua com o resumo
+    monkeypatch.setattr(gemini_client, "analysis_cache", AnalysisCache(str(tmp_path / "vazio.sqlite3")))
+    await gemini_client.analyze_and_answer("O que significa minha glicose alta?", "sessao-resumo")
+
+    assert "glicose elevada" in fake_gemini.prompts[-1]
+    assert "Não disponível." not in fake_gemini.prompts[-1]
+
+
+@pytest.mark.asyncio
+async def test_broad_question_on_mixed_exam_keeps_the_free_text(fake_gemini):
+    exam = (
+        "Hemoglobina: 13,5 g/dL (12,0 a 16,0)\n"
+        "Glicose em jejum: 126 mg/dL (70 a 99)\n"
+        "URINA TIPO I\n"
+        "Aspecto: ligeiramente turvo\n"
+        "ULTRASSONOGRAFIA DE ABDOME\n"
+        "Fígado com esteatose leve. Vesícula sem cálculos.\n"
+        "Nota do médico: repetir glicemia em 3 meses"
+    )
+
+    await gemini_client.analyze_exam(exam, "sessao-mista")
+    await gemini_client.analyze_and_answer("Pode resumir o exame?", "sessao-mista")
+    await gemini_client.analyze_and_answer("Tenho algo no baço?", "sessao-mista")
+
+    for prompt in fake_gemini.prompts[1:]:
+        # Tabela compacta mais tudo o que não virou marcador
+        assert "Glicose em jejum: 126 mg/dL (ref. 70 a 99) [ALTO]" in prompt
+        assert "Fígado com esteatose leve" in prompt
+        assert "ligeiramente turvo" in prompt
+        assert "repetir glicemia em 3 meses" in prompt
+        assert "Glicose em jejum: 126 mg/dL (70 a 99)" not in prompt
@@ -0,0 +1,70 @@
+from app.html_extract import ProductListing, Selector, css_class, parse_html, parse_price
+from app.scrapers import MedicationPriceScraper
+from unittest.mock import MagicMock, patch
+
+LISTING = ProductListing(
+    card=f"//div[{css_class('ProductCard')}]",
+    name=f".//h2[{css_class('ProductCard__title')}]",
+    price=f".//span[{css_class('ProductPrice__value')}]",
+    link=f".//a[{css_class('ProductCard__link')}]/@href",
+    marker='ProductCard'
+)
+
+
+def _card(name, price, href="/p"):
+    return (f'<div class="grid-item ProductCard"><a class="ProductCard__link" href="{href}">'
+            f'<h2 class="ProductCard__title"> {name} </h2></a><span class="ProductPrice__value">R$ {price}</span></div>')
+
+
+def test_css_class_matches_whole_class_names():
+    root = parse_html('<body><p class="a ProductCard b">sim</p><p class="ProductCard__title">não</p></body>')
+
+    assert Selector(f"//p[{css_class('ProductCard')}]").text(root) == "sim"
+    assert len(Selector(f"//p[{css_class('ProductCard')}]").all(root)) == 1
+
+
+def test_listing_reads_the_first_five_cards():
+    # O primeiro card tem outras classes antes e filhos com o mesmo prefixo
+    page = "<html><body>" + "".join(_card(f"Dipirona {i}", f"{i},50", f"/p/{i}") for i in range(8)) + "</body></html>"
+
+    products = LISTING.products(parse_html(page, LISTING.marker))
+
+    assert len(products) == 5
+    assert products[0] == ("Dipirona 0", "R$ 0,50", "/p/0")
+
+
+def test_cards_written_inside_scripts_are_not_parsed():
+    # Um template JS com o mesmo HTML antes do card real não vira produto
+    page = ("<html><head><script>const t = '" + _card("Falso", "1,00") + "';</script></head><body>"
+            '<p>class="ProductCard em texto</p>' + _card("Real", "2,00") + "</body></html>")
+
+    assert [name for name, _, _ in LISTING.products(parse_html(page, LISTING.marker))] == ["Real"]
+
+
+def test_parse_price():
+    assert parse_price("R$ 1.234,56") == 1234.56
+    assert parse_price("De R$ 20,00 por R$ 15,90") == 20.0
+    assert parse_price("Indisponível") is None
+    assert parse_price(None) is None
+
+
+def test_empty_page_has_no_products():
+    assert parse_html("") is None
+    assert LISTING.products(parse_html("  ", LISTING.marker)) == []
+
+
+def test_price_scraper_reads_products_with_lxml():
+    page = "<html><head><title>Busca</title></head><body>" + _card("Dipirona 1g", "12,90", "/dipirona-1g") \
+        + _card("", "5,00") + _card("Sem preço", "") + "</body></html>"
+    response = MagicMock(status_code=200, content=page.encode("utf-8"))
+
+    with patch("app.http_client.get", return_value=response):
+        result = MedicationPriceScraper()._scrape_drogasil("dipirona")
+
+    assert result["products"] == [{
+        "name": "Dipirona 1g",
+        "price": 12.9,
+        "price_text": "R$ 12,90",
+        "url": "https://www.drogasil.com.br/dipirona-1g",
+        "source": "Drogasil"
+    }]
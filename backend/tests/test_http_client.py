@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    failures_left = 0
+
+    def do_GET(self):
+        if self.path == "/lenta":
+            time.sleep(0.3)
+        if _Handler.failures_left > 0:
+            _Handler.failures_left -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = "<html>Dipirona</html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    http_client.close()
+    yield f"http://127.0.0.1:{server.server_port}"
+    http_client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused_across_requests(local_server):
+    for _ in range(5):
+        response = http_client.get(f"{local_server}/busca")
+        assert response.text == "<html>Dipirona</html>"
+        response.close()
+
+    stats = http_client.stats()
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1
+    assert stats["reused_requests"] == 4
+
+
+def test_idempotent_get_is_retried_on_503(local_server):
+    _Handler.failures_left = 1
+
+    response = http_client.get(f"{local_server}/busca")
+
+    assert response.status_code == 200
+    assert http_client.stats()["requests"] == 2
+
+
+def test_compression_is_negotiated():
+    assert "gzip" in http_client.get_session().headers["Accept-Encoding"]
+
+
+def test_scraper_threads_do_not_queue_on_the_pool(local_server):
+    from app.scrapers import _scrape_executor
+
+    # Tantas buscas simultâneas no mesmo site quanto threads de scraping
+    threads = _scrape_executor._max_workers
+    assert http_client.POOL_MAX_PER_HOST >= threads
+
+    def fetch(_):
+        response = http_client.get(f"{local_server}/lenta")
+        response.close()
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        assert list(pool.map(fetch, range(threads))) == [200] * threads
+    # Com 4 conexões por host seriam 4 rodadas de 0,3s
+    assert time.perf_counter() - start < 0.9
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.interactions import InteractionRecorder
+
+
+def _rows(url):
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT user_email, agent_type, question, answer FROM interactions ORDER BY rowid")).fetchall()
+    finally:
+        engine.dispose()
+
+
+async def _wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'interactions.sqlite3'}"
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_written_in_one_insert(sqlite_url):
+    recorder = InteractionRecorder(sqlite_url, batch_size=3, flush_interval=60)
+    await recorder.start()
+
+    for i in range(3):
+        assert await recorder.record("ana@example.com", "general-question", f"pergunta {i}", f"resposta {i}")
+    # O lote cheio é gravado sem esperar o intervalo de 60s
+    await _wait_for(lambda: recorder.recorded == 3)
+    await recorder.stop()
+
+    assert recorder.batches == 1
+    assert [row.question for row in _rows(sqlite_url)] == ["pergunta 0", "pergunta 1", "pergunta 2"]
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_is_written_after_the_interval(sqlite_url):
+    recorder = InteractionRecorder(sqlite_url, batch_size=100, flush_interval=0.05)
+    await recorder.start()
+
+    await recorder.record("ana@example.com", "exam-follow-up", "Qual minha glicose?", "90 mg/dL")
+    await _wait_for(lambda: recorder.recorded == 1)
+    await recorder.stop()
+
+    assert _rows(sqlite_url) == [("ana@example.com", "exam-follow-up", "Qual minha glicose?", "90 mg/dL")]
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_buffered_rows(sqlite_url):
+    recorder = InteractionRecorder(sqlite_url, batch_size=100, flush_interval=60)
+    await recorder.start()
+
+    for i in range(5):
+        await recorder.record("ana@example.com", "general-question", f"pergunta {i}", "ok")
+    await recorder.stop()
+
+    assert len(_rows(sqlite_url)) == 5
+    # Depois de parado, nada mais é aceito
+    assert not await recorder.record("ana@example.com", "general-question", "tarde", "ok")
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_applies_backpressure_then_drops(sqlite_url):
+    recorder = InteractionRecorder(sqlite_url, batch_size=2, flush_interval=60, max_buffer=2, put_timeout=0.01)
+    await recorder.start()
+
+    # Banco lento: o primeiro lote fica preso no INSERT
+    release = threading.Event()
+    insert = recorder._insert
+    recorder._insert = lambda rows: release.wait(5) and insert(rows)
+
+    results = [await recorder.record("ana@example.com", "general-question", f"p{i}", "ok") for i in range(6)]
+
+    # 2 no lote em gravação, 2 no buffer, o resto descartado
+    assert results == [True, True, True, True, False, False]
+    assert recorder.dropped == 2
+
+    release.set()
+    await recorder.stop()
+    assert recorder.recorded == 4
+    assert len(_rows(sqlite_url)) == 4
+
+
+@pytest.mark.asyncio
+async def test_a_bad_row_does_not_lose_the_batch(sqlite_url):
+    recorder = InteractionRecorder(sqlite_url, batch_size=100, flush_interval=60)
+    await recorder.start()
+
+    await recorder.record("ana@example.com", "general-question", "boa", "ok")
+    await recorder.record("ana@example.com", None, "sem agente", "ok")  # viola NOT NULL
+    await recorder.record("ana@example.com", "general-question", "outra boa", "ok")
+    await recorder.stop()
+
+    assert recorder.recorded == 2
+    assert recorder.failed == 1
+    assert [row.question for row in _rows(sqlite_url)] == ["boa", "outra boa"]
+
+
+def test_disabled_without_url():
+    recorder = InteractionRecorder("")
+
+    asyncio.run(recorder.start())
+
+    assert not recorder.enabled
+    assert not recorder.running
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue, JobWorkers
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path)
+    job_id = queue.enqueue("analyze_exam", {"exam_content": "Glicose 90 mg/dL"}, owner="u1")
+    queue.close()
+
+    reopened = JobQueue(path)
+    job = reopened.claim()
+    assert job["id"] == job_id
+    assert job["payload"] == {"exam_content": "Glicose 90 mg/dL"}
+    assert reopened.claim() is None  # já reservado
+
+    assert reopened.complete(job_id, "✅ Resumo", job["attempts"])
+    assert reopened.get(job_id)["status"] == DONE
+    assert reopened.get(job_id)["result"] == "✅ Resumo"
+    assert reopened.get(job_id)["owner"] == "u1"
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(tmp_path):
+    clock = FakeClock()
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=2, clock=clock)
+    job_id = queue.enqueue("analyze_exam", {})
+
+    assert queue.claim()["attempts"] == 1
+    clock.now += 30
+    assert queue.claim() is None  # lease ainda válido
+
+    clock.now += 31  # o worker "morreu" com o job
+    assert queue.claim()["attempts"] == 2
+
+    clock.now += 61
+    assert queue.claim() is None
+    assert queue.get(job_id)["status"] == FAILED
+
+
+def test_finished_jobs_are_purged_after_ttl(tmp_path):
+    clock = FakeClock()
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), result_ttl=100, clock=clock)
+    old = queue.enqueue("analyze_exam", {})
+    job = queue.claim()
+    queue.fail(old, "erro", job["attempts"])
+
+    clock.now += 101
+    queue.enqueue("analyze_exam", {})
+
+    assert queue.get(old) is None
+    assert queue.stats() == {QUEUED: 1, RUNNING: 0, DONE: 0, FAILED: 0}
+
+
+@pytest.mark.asyncio
+async def test_workers_run_jobs_and_record_failures(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+    async def handler(payload):
+        if payload["fail"]:
+            raise ValueError("Gemini indisponível")
+        return f"ok {payload['n']}"
+
+    workers = JobWorkers(queue, {"analyze_exam": handler}, concurrency=2, poll_interval=0.05)
+    workers.start()
+    try:
+        ok = queue.enqueue("analyze_exam", {"n": 1, "fail": False})
+        bad = queue.enqueue("analyze_exam", {"n": 2, "fail": True})
+        workers.notify()
+
+        done = await workers.wait(ok, timeout=2)
+        failed = await workers.wait(bad, timeout=2)
+    finally:
+        await workers.stop()
+
+    assert (done["status"], done["result"]) == (DONE, "ok 1")
+    assert (failed["status"], failed["error"]) == (FAILED, "Gemini indisponível")
+
+
+def test_only_the_current_claim_can_finish_a_job(tmp_path):
+    clock = FakeClock()
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=1, clock=clock)
+    job_id = queue.enqueue("analyze_exam", {})
+    first = queue.claim()
+
+    clock.now += 30
+    assert queue.renew(job_id, first["attempts"])
+    clock.now += 45
+    assert queue.claim() is None  # lease renovado
+
+    clock.now += 16
+    assert queue.claim() is None  # expirou: abandonado (max_attempts=1)
+    # O worker original termina depois e não sobrescreve o FAILED
+    assert not queue.complete(job_id, "tarde demais", first["attempts"])
+    assert not queue.renew(job_id, first["attempts"])
+    assert queue.get(job_id)["status"] == FAILED
+
+
+@pytest.mark.asyncio
+async def test_job_longer_than_the_lease_runs_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.3)
+    runs = []
+
+    async def handler(payload):
+        runs.append(payload)
+        await asyncio.sleep(1.0)  # p.ex. novas tentativas do Gemini sob rate limit
+        return "ok"
+
+    workers = JobWorkers(queue, {"analyze_exam": handler}, concurrency=2, poll_interval=0.05)
+    workers.start()
+    try:
+        job_id = queue.enqueue("analyze_exam", {"n": 1})
+        workers.notify()
+        job = await workers.wait(job_id, timeout=3)
+    finally:
+        await workers.stop()
+
+    assert (job["status"], job["result"], job["attempts"]) == (DONE, "ok", 1)
+    assert len(runs) == 1
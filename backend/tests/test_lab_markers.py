@@ -0,0 +1,70 @@
+import pytest
+
+from app.lab_markers import answer_from_markers, format_marker_table, parse_marker_row, parse_markers, parse_number
+
+REPORT = """HEMOGRAMA
+Hemoglobina: 13,5 g/dL (12,0 a 16,0)
+Hemoglobina glicada 6,1 % 4,0 a 5,6
+Leucócitos ........ 7.200 /mm3 4.000 - 10.000
+Colesterol total: 230 mg/dL (< 190)
+HDL-Colesterol 45 mg/dL Superior a 40
+TSH 2,1 mUI/L 0,4 a 4,0
+T4 livre 1,2 ng/dL 0,7 a 1,8
+Data: 12/03/2024
+Página 1 de 3
+Paciente: Maria 45 anos
+""".splitlines()
+
+
+@pytest.mark.parametrize("text, expected", [("13,5", 13.5), ("7.200", 7200.0), ("1.234,5", 1234.5), ("0.9", 0.9)])
+def test_parse_number_handles_brazilian_format(text, expected):
+    assert parse_number(text) == expected
+
+
+def test_rows_are_parsed_with_reference_and_status():
+    markers = parse_markers(REPORT)
+
+    assert [m["name"] for m in markers] == [
+        "Hemoglobina", "Hemoglobina glicada", "Leucócitos", "Colesterol total", "HDL-Colesterol", "TSH", "T4 livre",
+    ]
+    leucocitos = markers[2]
+    assert (leucocitos["low"], leucocitos["high"], leucocitos["status"]) == (4000.0, 10000.0, "normal")
+    assert markers[3]["status"] == "alto"  # 230 com referência < 190
+    assert markers[4]["low"] == 40.0
+
+
+def test_rows_without_unit_or_reference_are_not_markers():
+    assert parse_marker_row("Idade 45") is None
+    assert parse_marker_row("Creatinina 0,9 mg/dL")["reference"] is None
+
+
+def test_table_is_compact_and_flags_out_of_range_values():
+    table = format_marker_table(parse_markers(REPORT))
+    assert "Colesterol total: 230 mg/dL (ref. < 190) [ALTO]" in table
+    assert "TSH: 2,1 mUI/L (ref. 0,4 a 4,0)" in table.splitlines()
+
+
+def test_value_lookups_are_answered_locally():
+    markers = parse_markers(REPORT)
+
+    answer = answer_from_markers("Qual meu valor de hemoglobina?", markers)
+    assert "**Hemoglobina**: **13,5 g/dL**" in answer
+    assert "glicada" not in answer
+
+    answer = answer_from_markers("qual o resultado do TSH e do T4 livre", markers)
+    assert answer.index("TSH") < answer.index("T4 livre")  # ordem do laudo
+
+
+@pytest.mark.parametrize("question", [
+    "O que significa hemoglobina glicada alta?",  # pede interpretação
+    "o que é hemoglobina?",  # pede definição
+    "Que é TSH",
+    "O que são leucócitos?",
+    "Para que serve o exame de TSH?",
+    "TSH serve pra quê?",
+    "Como está minha hemoglobina?",
+    "Qual o valor da vitamina D?",  # marcador ausente do exame
+    "Estou com anemia?",
+])
+def test_other_questions_go_to_gemini(question):
+    assert answer_from_markers(question, parse_markers(REPORT)) is None
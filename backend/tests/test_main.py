@@ -1,10 +1,58 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+
+import fitz
+import httpx
 import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import app.firebase_admin as fb_admin
+import app.gemini_client as gemini_client
+from app.job_queue import JobQueue, JobWorkers
+from app.main import app, get_current_user_from_token
 
 def test_root(client):
     r = client.get("/")
     assert r.status_code == 200
     assert r.json() == {"message": "Welcome to Exam Mine API"}
 
+def test_import_is_lazy_and_does_not_require_gemini_key():
+    # A importação não configura o Gemini nem carrega o SDK (~0,5s)
+    env = dict(os.environ, GEMINI_API_KEY="")
+    code = "import sys, app.main; print('google.generativeai' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)),
+        env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "False"
+
+def test_readiness_reports_warm_state(client, fake_gemini, monkeypatch):
+    monkeypatch.setattr(fb_admin, "firebase_initialized", False)
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEY", "test-key")
+    # Sem o lifespan nada foi inicializado
+    r = client.get("/ready")
+    assert r.status_code == 503
+    assert r.json()["checks"]["gemini"] is False
+
+    with TestClient(app) as warm_client:
+        deadline = time.monotonic() + 10
+        while (r := warm_client.get("/ready")).status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    assert r.status_code == 200
+    assert r.json() == {
+        "status": "ready",
+        "checks": {"gemini": True, "firebase": "disabled", "job_workers": True},
+    }
+
 def test_analyze_exam_requires_auth(client, tmp_path):
     # Cria um PDF mínimo no diretório temporário
     pdf_file = tmp_path / "sample.pdf"
@@ -16,3 +64,169 @@ def test_analyze_exam_requires_auth(client, tmp_path):
             files={"file": ("sample.pdf", f, "application/pdf")}
         )
     assert r.status_code == 401
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_do_not_block_event_loop(fake_gemini):
+    # Cada chamada ao Gemini leva 0.3s; 5 requisições concorrentes devem
+    # terminar perto de 0.3s, e não 1.5s como no caminho síncrono.
+    fake_gemini.latency = 0.3
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as ac:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            ac.post("/agents/general-question", data={"question": f"pergunta {i}"})
+            for i in range(5)
+        ])
+        elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed < 0.3 * 5 / 2
+
+def test_general_question_stream_emits_sse_chunks(client, fake_gemini):
+    fake_gemini.reply = "Beba bastante água"
+
+    r = client.post("/agents/general-question/stream", data={"question": "Como hidratar?"})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in r.text.split("\n\n") if block]
+    assert events[0].startswith("event: start")
+    assert events[-1].startswith("event: done")
+    chunks = [json.loads(e[len("data: "):])["text"] for e in events[1:-1]]
+    assert "".join(chunks).strip() == "Beba bastante água"
+
+
+def _lab_pdf(*lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + 16 * i), line)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def test_batch_analysis_returns_per_file_results_and_one_session(client, fake_gemini):
+    app.dependency_overrides[get_current_user_from_token] = lambda: {"uid": "clinica"}
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("tireoide.pdf", _lab_pdf("TSH 2,1 mUI/L 0,4 a 4,0"))
+        zf.writestr("leia-me.txt", "ignorado")
+    try:
+        r = client.post("/agents/analyze-exams", files=[
+            ("files", ("hemograma.pdf", _lab_pdf("Hemoglobina 13,5 g/dL 12,0 a 16,0"), "application/pdf")),
+            ("files", ("notas.docx", b"nao e pdf", "application/octet-stream")),
+            ("files", ("lote.zip", archive.getvalue(), "application/zip")),
+        ])
+        body = r.json()
+        # A sessão única permite perguntar sobre todos os exames juntos
+        answer = client.post("/agents/exam-question", data={"question": "qual o valor do TSH?", "session_id": body["session_id"]})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 200
+    assert [(res["filename"], res["status"]) for res in body["results"]] == [
+        ("hemograma.pdf", "ok"), ("notas.docx", "error"), ("lote.zip/tireoide.pdf", "ok"),
+    ]
+    assert len(fake_gemini.prompts) == 2
+
+    assert answer.status_code == 200
+    assert "**2,1 mUI/L**" in answer.json()["answer"]
+    assert "lote.zip/tireoide.pdf" in answer.json()["answer"]
+
+
+def _zip_of_zeros(members, size):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(members):
+            zf.writestr(f"exame{i}.pdf", bytes(size))
+    return archive.getvalue()
+
+def test_zip_with_too_many_pdfs_is_rejected_before_decompressing(client, monkeypatch):
+    import app.main as main
+
+    read = []
+    monkeypatch.setattr(main, "_read_zip_member", lambda *args: read.append(args))
+    app.dependency_overrides[get_current_user_from_token] = lambda: {"uid": "clinica"}
+    try:
+        # Zip bomb: 300 PDFs de 1MB de zeros ocupam poucos KB compactados
+        r = client.post("/agents/analyze-exams", files=[
+            ("files", ("lote.zip", _zip_of_zeros(300, 1024 * 1024), "application/zip")),
+        ])
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 413
+    assert read == []
+
+def test_zip_uncompressed_total_is_capped(monkeypatch):
+    import app.main as main
+
+    monkeypatch.setattr(main, "ZIP_MAX_UNCOMPRESSED_BYTES", 2 * 1024 * 1024)
+    monkeypatch.setattr(main, "ZIP_READ_CHUNK_BYTES", 1024)
+    entries = main._expand_zip("lote.zip", _zip_of_zeros(3, 1024 * 1024), max_files=10)
+    assert entries == [("lote.zip", None, "ZIP file too large when uncompressed.")]
+
+    # Dentro do total, os PDFs são lidos normalmente
+    entries = main._expand_zip("lote.zip", _zip_of_zeros(2, 1024 * 1024), max_files=10)
+    assert [error for _, _, error in entries] == [None, None]
+
+
+@pytest.fixture
+def job_mode(monkeypatch, tmp_path):
+    """Fila de jobs temporária com workers de polling curto e usuário autenticado."""
+    import app.main as main
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(main, "job_queue", queue)
+    monkeypatch.setattr(main, "job_workers", JobWorkers(queue, main.job_workers.handlers, poll_interval=0.05))
+    app.dependency_overrides[get_current_user_from_token] = lambda: {"uid": "paciente"}
+    yield queue
+    app.dependency_overrides.clear()
+
+def test_job_mode_returns_202_and_result_is_polled(fake_gemini, job_mode):
+    fake_gemini.reply = "✅ Resumo geral do exame"
+
+    with TestClient(app) as client:
+        r = client.post(
+            "/agents/analyze-exam/jobs",
+            files={"file": ("exame.pdf", _lab_pdf("Hemoglobina 13,5 g/dL 12,0 a 16,0"), "application/pdf")}
+        )
+        assert r.status_code == 202
+        body = r.json()
+        assert r.headers["location"] == f"/agents/jobs/{body['job_id']}"
+
+        result = client.get(f"/agents/jobs/{body['job_id']}", params={"wait": 5}).json()
+        events = client.get(f"/agents/jobs/{body['job_id']}/events").text
+
+        app.dependency_overrides[get_current_user_from_token] = lambda: {"uid": "outro"}
+        assert client.get(f"/agents/jobs/{body['job_id']}").status_code == 404
+
+    assert result == {"job_id": body["job_id"], "status": "done", "analysis": "✅ Resumo geral do exame"}
+    assert "event: done" in events
+    # A sessão fica disponível para perguntas de seguimento
+    assert gemini_client.exam_storage.get(body["session_id"])
+
+def test_answers_of_signed_in_users_are_recorded(fake_gemini, monkeypatch, tmp_path):
+    import app.main as main
+    from app.interactions import InteractionRecorder
+
+    fake_gemini.reply = "Beba bastante água"
+    url = f"sqlite:///{tmp_path / 'interactions.sqlite3'}"
+    monkeypatch.setattr(main, "interaction_recorder", InteractionRecorder(url, flush_interval=60))
+    app.dependency_overrides[get_current_user_from_token] = lambda: {"uid": "ana", "email": "ana@example.com"}
+    try:
+        with TestClient(app) as client:
+            assert client.post("/agents/general-question", data={"question": "Como hidratar?"}).status_code == 200
+            assert "event: done" in client.post("/agents/general-question/stream", data={"question": "E no calor?"}).text
+    finally:
+        app.dependency_overrides.clear()
+
+    # Gravadas em lote no encerramento, sem esperar o intervalo
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_email, agent_type, question, answer FROM interactions ORDER BY rowid")).fetchall()
+    engine.dispose()
+    assert [tuple(row) for row in rows] == [
+        ("ana@example.com", "general-question", "Como hidratar?", "Beba bastante água"),
+        ("ana@example.com", "general-question", "E no calor?", "Beba bastante água "),
+    ]
@@ -0,0 +1,103 @@
+import pytest
+
+import app.gemini_client as gemini_client
+from app.medication_names import MedicationNameIndex, fold_name
+
+
+@pytest.fixture
+def names(tmp_path):
+    path = tmp_path / "medicamentos.txt"
+    path.write_text(
+        "# Nome canônico | variantes\n"
+        "dipirona | dipirona sódica | metamizol\n"
+        "losartana | losartan | losartana potássica\n"
+        "amoxicilina + clavulanato | clavulin\n"
+        "paracetamol | acetaminofeno\n",
+        encoding="utf-8",
+    )
+    return MedicationNameIndex(str(path))
+
+
+def test_variants_resolve_to_canonical_name(names):
+    assert names.resolve("Dipirona  ") == ("dipirona", "dipirona")
+    assert names.resolve("DIPIRONA SÓDICA") == ("dipirona", "dipirona")
+    assert names.resolve("metamizol 1g") == ("dipirona 1g", "dipirona")
+    # A dose e a apresentação continuam depois do nome
+    assert names.resolve("Losartan 50mg comprimido") == ("losartana 50mg comprimido", "losartana")
+    assert names.resolve("amoxicilina+clavulanato") == ("amoxicilina + clavulanato", "amoxicilina + clavulanato")
+
+
+def test_typos_are_corrected(names):
+    assert names.resolve("dipriona")[0] == "dipirona"
+    assert names.resolve("lozartana 50mg")[0] == "losartana 50mg"
+    assert names.resolve("paracetmol")[0] == "paracetamol"
+
+
+@pytest.mark.parametrize("name", ["cefazolina", "terazosina", "oxazepam", "cloxazolam", "liotironina",
+                                  "penciclovir", "fanciclovir", "ornidazol", "vardenafila"])
+def test_look_alike_drugs_are_not_turned_into_another_drug(name):
+    # Remédios fora da lista, a 2 ou 3 edições de outro que está nela
+    assert gemini_client.medication_names.resolve(name) == (name, None)
+
+
+def test_typo_close_to_two_medications_is_not_corrected(tmp_path):
+    path = tmp_path / "medicamentos.txt"
+    path.write_text("cetoconazol\nfluconazol\nbenzetacil\nbenzatacil\n", encoding="utf-8")
+    names = MedicationNameIndex(str(path))
+    assert names.resolve("benzitacil") == ("benzitacil", None)
+    assert names.resolve("fluconazl") == ("fluconazol", "fluconazol")
+
+
+def test_unknown_names_pass_through(names):
+    assert names.resolve("Xarelto 20mg") == ("Xarelto 20mg", None)
+    # Palavras curtas não são corrigidas para um nome parecido
+    assert names.resolve("dip") == ("dip", None)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("B12", "vitamina b12"),
+    ("d3 2000ui", "vitamina d 2000ui"),
+    ("CBD", "canabidiol"),
+    ("AAS 100mg", "ácido acetilsalicílico 100mg"),
+    ("DHT", "DHT"),  # fora da lista, buscado como digitado
+])
+def test_short_names_are_not_rejected(text, expected):
+    assert gemini_client.medication_names.resolve(text)[0] == expected
+
+
+@pytest.mark.parametrize("text", ["", "  ", "x", "ok", "12", "teste", "Qual o preço do remédio?", "sdfgh",
+                                  "https://exemplo.com", "me diga por favor quanto custa aquele remédio da pressão"])
+def test_obvious_non_medications_are_rejected(names, text):
+    assert names.resolve(text) == (None, None)
+
+
+def test_data_file_has_no_duplicate_variants():
+    seen = {}
+    with open(gemini_client.medication_names.path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            for variant in filter(None, (fold_name(name) for name in line.split("|"))):
+                assert variant not in seen, f"{variant!r} aparece em {seen[variant]!r} e {line!r}"
+                seen[variant] = line
+    assert len(gemini_client.medication_names) == len(seen)
+
+
+@pytest.mark.asyncio
+async def test_lookups_use_canonical_name_and_skip_non_medications(fake_gemini, monkeypatch):
+    scraped = []
+
+    async def fake_search(name):
+        scraped.append(name)
+        return {"content": "Anti-hipertensivo", "source": "https://exemplo/bula"}
+
+    monkeypatch.setattr(gemini_client.medication_info_scraper, "search_async", fake_search)
+
+    first = await gemini_client.search_medication_info("Losartan")
+    second = await gemini_client.search_medication_info("losartana potássica")
+    rejected = await gemini_client.search_medication_info("qual o remédio?")
+    rejected_prices = await gemini_client.search_medication_prices("teste")
+
+    assert first == second
+    assert scraped == ["losartana"]
+    assert len(fake_gemini.prompts) == 1
+    assert "Não reconheci" in rejected and "Não reconheci" in rejected_prices
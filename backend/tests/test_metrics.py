@@ -0,0 +1,215 @@
+import logging
+
+import fitz
+import pytest
+
+from app.main import app, get_current_user_from_token
+from app.metrics import STAGE_SECONDS, Histogram, current_endpoint, stage
+from app.scrapers import MedicationPriceScraper
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("teste_seconds", "Histograma de teste", ["endpoint"], buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, endpoint="/x")
+
+    assert histogram.render() == [
+        "# HELP teste_seconds Histograma de teste",
+        "# TYPE teste_seconds histogram",
+        'teste_seconds_bucket{endpoint="/x",le="0.1"} 2',
+        'teste_seconds_bucket{endpoint="/x",le="1.0"} 3',
+        'teste_seconds_bucket{endpoint="/x",le="+Inf"} 4',
+        'teste_seconds_sum{endpoint="/x"} 3.65',
+        'teste_seconds_count{endpoint="/x"} 4',
+    ]
+
+
+def _count(endpoint, stage_name, source="", outcome="ok"):
+    series = STAGE_SECONDS.series().get((endpoint, stage_name, source, outcome))
+    return series[2] if series else 0
+
+
+def test_stage_outcome():
+    token = current_endpoint.set("/teste/stage")
+    try:
+        with stage("etapa"):
+            pass
+        with stage("etapa") as timer:
+            timer.outcome = "empty"
+        with pytest.raises(ValueError):
+            with stage("etapa"):
+                raise ValueError("falhou")
+    finally:
+        current_endpoint.reset(token)
+
+    assert _count("/teste/stage", "etapa") == 1
+    assert _count("/teste/stage", "etapa", outcome="empty") == 1
+    assert _count("/teste/stage", "etapa", outcome="error") == 1
+
+
+def _pdf(*lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + 20 * i), line)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_exam_analysis_stages_are_labeled_by_endpoint(client, fake_gemini, caplog):
+    endpoint = "/agents/analyze-exam"
+    before = {name: _count(endpoint, name) for name in ("upload_read", "pdf_extract", "gemini_call")}
+    before_prompt = _count(endpoint, "prompt_build", "exam_analysis")
+
+    app.dependency_overrides[get_current_user_from_token] = lambda: {"uid": "paciente"}
+    try:
+        with caplog.at_level(logging.INFO, logger="exam-analyzer-api"):
+            r = client.post(
+                endpoint,
+                files={"file": ("exame.pdf", _pdf("Glicose 90 mg/dL 70 a 99"), "application/pdf")},
+                headers={"X-Request-ID": "req-teste-1"}
+            )
+        request_logs = list(caplog.records)
+        metrics = client.get("/metrics")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 200
+    assert r.headers["x-request-id"] == "req-teste-1"
+    for name, count in before.items():
+        assert _count(endpoint, name) == count + 1, name
+    assert _count(endpoint, "prompt_build", "exam_analysis") == before_prompt + 1
+
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert f'exam_mine_stage_duration_seconds_count{{endpoint="{endpoint}",stage="gemini_call",source="",outcome="ok"}}' in metrics.text
+    assert f'exam_mine_request_duration_seconds_count{{endpoint="{endpoint}",method="POST",status="200"}}' in metrics.text
+
+    # Todas as linhas de log da requisição, inclusive as das threads, trazem o id
+    assert any(record.threadName.startswith("AnyIO worker") for record in request_logs)
+    assert {record.request_id for record in request_logs} == {"req-teste-1"}
+
+
+def test_invalid_request_id_is_replaced(client):
+    r = client.get("/", headers={"X-Request-ID": "id com espacos; e <tags>"})
+
+    assert r.headers["x-request-id"] != "id com espacos; e <tags>"
+    assert len(r.headers["x-request-id"]) == 32
+
+
+def test_each_price_source_is_timed_in_its_thread():
+    def _scrape_farmacia_rapida(name):
+        return {"source_name": "Rápida", "products": [{"name": name, "price": 10.0}]}
+
+    def _scrape_farmacia_vazia(name):
+        return None
+
+    scraper = MedicationPriceScraper(deadline=5)
+    scraper.sources = [_scrape_farmacia_rapida, _scrape_farmacia_vazia]
+
+    token = current_endpoint.set("/teste/precos")
+    try:
+        scraper.search("dipirona")
+    finally:
+        current_endpoint.reset(token)
+
+    assert _count("/teste/precos", "scrape", "farmacia_rapida") == 1
+    assert _count("/teste/precos", "scrape", "farmacia_vazia", outcome="empty") == 1
+
+
+def test_cache_dedup_and_connection_counters_are_exported(client, monkeypatch):
+    from app import http_client
+
+    monkeypatch.setattr(http_client, "stats", lambda: {
+        "requests": 5, "connections_opened": 2, "reused_requests": 3,
+        "hosts": {"https://www.drogasil.com.br": {"requests": 5, "connections": 2}},
+    })
+
+    text = client.get("/metrics").text
+
+    assert "# TYPE exam_mine_response_cache_hits_total counter" in text
+    assert 'exam_mine_response_cache_misses_total{cache="medication-prices"}' in text
+    assert 'exam_mine_session_store_bytes{store="exams"}' in text
+    assert 'exam_mine_singleflight_collapsed_total{group="medication-lookups"}' in text
+    assert "# TYPE exam_mine_http_pool_reused_requests gauge" in text
+    assert 'exam_mine_http_pool_reused_requests{host="https://www.drogasil.com.br"} 3' in text
+
+
+def test_interaction_recorder_counters_are_exported(client, monkeypatch):
+    from app.interactions import interaction_recorder
+
+    monkeypatch.setattr(interaction_recorder, "dropped", 7)
+    text = client.get("/metrics").text
+
+    assert "# TYPE exam_mine_interactions_dropped_total counter" in text
+    assert 'exam_mine_interactions_dropped_total{recorder="interactions"} 7' in text
+    assert 'exam_mine_interactions_buffered{recorder="interactions"}' in text
+
+
+def test_gemini_retry_and_limiter_counters_are_exported(client, monkeypatch):
+    from app import gemini_client
+
+    monkeypatch.setattr(gemini_client.gemini, "retries", 4)
+    text = client.get("/metrics").text
+
+    assert 'exam_mine_gemini_retries_total{model="models/gemini-1.5-pro"} 4' in text
+    assert "# TYPE exam_mine_gemini_waited_seconds_total counter" in text
+    assert "exam_mine_gemini_calls_total" in text
+
+
+def test_token_usage_per_agent_is_exported(client):
+    from app.token_budget import record_usage
+
+    record_usage("medication_info", 120)
+    text = client.get("/metrics").text
+
+    assert "# TYPE exam_mine_prompt_input_tokens_total counter" in text
+    assert 'exam_mine_prompt_input_tokens_total{agent="medication_info"}' in text
+    assert 'exam_mine_prompt_max_input_tokens{agent="medication_info"}' in text
+
+
+def test_analysis_cache_counters_are_exported(client, fake_gemini):
+    from app import gemini_client
+
+    gemini_client.analysis_cache.put("chave", "✅ Resumo")
+    gemini_client.analysis_cache.get("chave")
+    text = client.get("/metrics").text
+
+    assert 'exam_mine_analysis_cache_hits_total{cache="exam-analyses"} 1' in text
+    assert 'exam_mine_analysis_cache_entries{cache="exam-analyses"} 1' in text
+
+
+def test_job_queue_depth_is_exported(client, monkeypatch):
+    import app.main as main
+
+    monkeypatch.setattr(main.job_queue, "stats", lambda: {"queued": 3, "running": 1, "done": 0, "failed": 0})
+    text = client.get("/metrics").text
+
+    assert "# TYPE exam_mine_job_queue_jobs gauge" in text
+    assert 'exam_mine_job_queue_jobs{status="queued"} 3' in text
+    assert 'exam_mine_job_queue_jobs{status="running"} 1' in text
+
+
+def test_verified_token_cache_counters_are_exported(client, monkeypatch):
+    from app.firebase_admin import token_cache
+
+    monkeypatch.setattr(token_cache, "hits", 12)
+    text = client.get("/metrics").text
+
+    assert 'exam_mine_token_cache_hits_total{cache="firebase-tokens"} 12' in text
+    assert 'exam_mine_token_cache_entries{cache="firebase-tokens"}' in text
+
+
+def test_price_catalog_freshness_is_exported(client, fake_gemini):
+    from app import gemini_client
+
+    gemini_client.price_catalog.store("dipirona", "Dipirona", [{"name": "Dipirona 1g", "price": 12.9, "source": "Drogasil"}])
+    gemini_client.price_catalog.store("losartana", "Losartana", [], complete=False)
+    gemini_client.price_catalog.lookup("dipirona", "Dipirona")
+    text = client.get("/metrics").text
+
+    assert 'exam_mine_price_catalog_fresh_medications{catalog="prices"} 1' in text
+    assert 'exam_mine_price_catalog_medications{catalog="prices"} 2' in text
+    assert 'exam_mine_price_catalog_hits_total{catalog="prices"} 1' in text
+    assert 'exam_mine_price_refresh_failed_total{catalog="prices"}' in text
@@ -1,5 +1,9 @@
+import io
+
+import fitz
 import pytest
-from app.pdf_processor import extract_pdf_content
+import app.pdf_processor as pdf_processor
+from app.pdf_processor import extract_exam_content, extract_pdf_content
 
 def test_extract_pdf_content_file_not_found():
     # Como o FileNotFoundError é capturado e relançado como Exception,
@@ -7,3 +11,69 @@ def test_extract_pdf_content_file_not_found():
     with pytest.raises(Exception) as exc:
         extract_pdf_content("no-such-file.pdf")
     assert "Failed to extract PDF content" in str(exc.value)
+
+
+def _make_pdf(text):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_extract_pdf_content_from_bytes():
+    data = _make_pdf("Hemoglobina 13,5 g/dL")
+    assert "Hemoglobina 13,5 g/dL" in extract_pdf_content(data)
+
+
+def test_extract_pdf_content_from_buffer():
+    data = _make_pdf("Glicose 90 mg/dL")
+    assert "Glicose 90 mg/dL" in extract_pdf_content(io.BytesIO(data))
+
+
+def test_extract_pdf_content_invalid_bytes():
+    with pytest.raises(Exception) as exc:
+        extract_pdf_content(b"not a pdf")
+    assert "Failed to extract PDF content" in str(exc.value)
+
+
+def test_parallel_extraction_preserves_page_order(monkeypatch):
+    doc = fitz.open()
+    for i in range(6):
+        doc.new_page().insert_text((72, 72), f"Pagina {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+
+    serial = extract_pdf_content(data)
+
+    monkeypatch.setattr(pdf_processor, "PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_processor, "PDF_WORKERS", 2)
+    try:
+        parallel = extract_pdf_content(data)
+    finally:
+        pdf_processor.shutdown_extraction_pool()
+
+    assert parallel == serial
+    positions = [parallel.index(f"Pagina {i + 1}") for i in range(6)]
+    assert positions == sorted(positions)
+
+
+def test_markers_are_rebuilt_from_table_cells():
+    # Cada célula é um bloco de texto separado, como nos laudos reais
+    doc = fitz.open()
+    page = doc.new_page()
+    rows = [("Hemoglobina", "13,5", "g/dL", "12,0 a 16,0"), ("Glicose", "126", "mg/dL", "70 a 99")]
+    for i, cells in enumerate(rows):
+        for x, cell in zip((72, 250, 320, 400), cells):
+            page.insert_text((x, 100 + 20 * i), cell)
+    data = doc.tobytes()
+    doc.close()
+
+    text, markers = extract_exam_content(data)
+
+    assert "Hemoglobina 13,5" not in text  # get_text() separa as células
+    assert [(m["name"], m["value"], m["unit"], m["status"]) for m in markers] == [
+        ("Hemoglobina", "13,5", "g/dL", "normal"),
+        ("Glicose", "126", "mg/dL", "alto"),
+    ]
@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+
+import app.gemini_client as gemini_client
+from app.price_catalog import PriceCatalog, PriceCatalogRefresher, SitePoliteness
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _product(name, price, source="Drogasil"):
+    return {"name": name, "price": price, "price_text": f"R$ {price:.2f}".replace(".", ","),
+            "url": f"https://exemplo/{name}", "source": source}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def catalog(tmp_path, clock):
+    catalog = PriceCatalog(str(tmp_path / "precos.sqlite3"), max_age=3600, min_matches=2, clock=clock)
+    yield catalog
+    catalog.close()
+
+
+def test_fresh_prices_are_served_until_max_age(catalog, clock):
+    catalog.store("dipirona", "Dipirona", [_product("Dipirona 1g", 12.9), _product("Dipirona 500mg", 8.5, "Panvel")])
+
+    result = catalog.lookup("dipirona", "Dipirona")
+    assert [p["price"] for p in result["products"]] == [8.5, 12.9]
+    assert result["sources"] == ["Panvel", "Drogasil"]
+
+    clock.now += 3601
+    assert catalog.lookup("dipirona", "Dipirona") is None
+
+
+def test_other_names_are_not_answered_from_combination_products(catalog):
+    catalog.store("losartana", "Losartana", [
+        _product("Losartana Potássica + Hidroclorotiazida 50mg/12,5mg", 19.0),
+        _product("Losartana Potássica + Hidroclorotiazida 100mg/25mg", 24.0, "Panvel"),
+        _product("Losartana Potássica + Hidroclorotiazida 50mg/12,5mg", 21.0, "Ultrafarma"),
+    ])
+
+    # Os combinados listados para losartana não respondem pelo remédio isolado
+    assert catalog.lookup("hidroclorotiazida", "hidroclorotiazida") is None
+    assert catalog.lookup("losartana", "Losartana") is not None
+
+
+def test_partial_refresh_is_answered_from_products_named_after_the_medication(catalog, clock):
+    catalog.store("losartana 50mg", "Losartana 50mg", [
+        _product("Losartana Potássica 50mg", 9.0),
+        _product("Losartana Potássica 50mg", 11.0, "Panvel"),
+        _product("Hidroclorotiazida + Losartana 50mg", 15.0),
+    ], complete=False)
+
+    result = catalog.lookup("losartana 50mg", "Losartana 50mg")
+    assert [p["price"] for p in result["products"]] == [9.0, 11.0]
+
+    clock.now += 3601
+    assert catalog.lookup("losartana 50mg", "Losartana 50mg") is None
+
+
+def test_a_failed_source_keeps_its_earlier_products(catalog, clock):
+    catalog.store("dipirona", "Dipirona", [_product("Dipirona 1g", 12.9), _product("Dipirona 1g", 11.0, "Panvel")])
+
+    clock.now += 60
+    catalog.store_search("dipirona", "Dipirona", {
+        "sources": ["Drogasil"],
+        "products": [_product("Dipirona 1g", 12.5)],
+        "timings": {"drogasil": {"status": "ok", "source_name": "Drogasil"}, "panvel": {"status": "timeout"}},
+    })
+
+    result = catalog.lookup("dipirona", "Dipirona")
+    assert sorted((p["source"], p["price"]) for p in result["products"]) == [("Drogasil", 12.5), ("Panvel", 11.0)]
+
+
+def test_sources_that_answered_empty_lose_their_products_and_failed_ones_keep_them(catalog, clock):
+    catalog.store("dipirona", "Dipirona", [
+        _product("Dipirona 1g", 12.9), _product("Dipirona 1g", 11.0, "Panvel"), _product("Dipirona 1g", 10.0, "Ultrafarma"),
+    ])
+
+    clock.now += 60
+    catalog.store_search("dipirona", "Dipirona", {
+        "sources": [],
+        "products": [],
+        "timings": {
+            "drogasil": {"status": "empty", "source_name": "Drogasil"},
+            "panvel": {"status": "error", "source_name": None},
+            "ultrafarma": {"status": "timeout"},
+        },
+    })
+
+    result = catalog.lookup("dipirona", "Dipirona")
+    assert sorted(p["source"] for p in result["products"]) == ["Panvel", "Ultrafarma"]
+    # Com fontes falhando, o medicamento não conta como atualizado
+    catalog.note_request("dipirona", "Dipirona")
+    catalog.flush_demand()
+    assert catalog.due(top_n=10, refresh_age=30, demand_window=3600) == [("dipirona", "Dipirona")]
+
+
+def test_most_requested_stale_medications_are_due(catalog, clock):
+    for name, count in (("Dipirona", 3), ("Losartana", 2), ("Omeprazol", 1)):
+        for _ in range(count):
+            catalog.note_request(name.lower(), name)
+    catalog.flush_demand()
+    catalog.store("dipirona", "Dipirona", [_product("Dipirona 1g", 12.9)])
+
+    assert catalog.due(top_n=2, refresh_age=600, demand_window=3600) == [("losartana", "Losartana")]
+    clock.now += 601
+    assert catalog.due(top_n=2, refresh_age=600, demand_window=3600) == [("dipirona", "Dipirona"), ("losartana", "Losartana")]
+
+
+def test_politeness_spaces_requests_to_the_same_site():
+    clock = FakeClock(0.0)
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    politeness = SitePoliteness(10, clock=clock, sleep=sleep)
+
+    async def run():
+        await politeness.wait("drogasil")
+        await politeness.wait("panvel")
+        clock.now += 4
+        await politeness.wait("drogasil")
+
+    asyncio.run(run())
+    assert slept == [pytest.approx(6)]
+
+
+def test_refresher_scrapes_due_medications_source_by_source(catalog):
+    def _scrape_drogasil(name):
+        return {"source_name": "Drogasil", "products": [_product(f"{name} 1g", 12.9)]}
+
+    def _scrape_panvel(name):
+        return None  # erro no site
+
+    class Scraper:
+        sources = [_scrape_drogasil, _scrape_panvel]
+
+    catalog.note_request("dipirona", "Dipirona")
+    refresher = PriceCatalogRefresher(catalog, Scraper(), top_n=10, site_interval=0)
+
+    assert asyncio.run(refresher.refresh_once()) == 1
+    assert refresher.failed == 1
+    assert catalog.stats()["products"] == 1
+    # Com uma fonte falhando o medicamento continua pendente
+    assert catalog.due(top_n=10, refresh_age=600, demand_window=3600) == [("dipirona", "Dipirona")]
+
+
+def test_price_lookup_skips_the_live_scrape_when_the_catalog_is_fresh(fake_gemini, monkeypatch):
+    gemini_client.price_catalog.store("dipirona", "Dipirona", [_product("Dipirona 1g", 12.9)])
+
+    async def no_scrape(name):
+        raise AssertionError("scrape ao vivo com o catálogo atualizado")
+
+    monkeypatch.setattr(gemini_client.medication_price_scraper, "search_async", no_scrape)
+    answer = asyncio.run(gemini_client.search_medication_prices("Dipirona"))
+
+    assert "Dipirona 1g" in fake_gemini.prompts[-1]
+    assert "https://exemplo/Dipirona 1g" in answer
+
+
+def test_single_drug_is_scraped_live_when_only_combinations_are_stored(fake_gemini, monkeypatch):
+    gemini_client.price_catalog.store("losartana", "Losartana", [
+        _product(f"Losartana Potássica + Hidroclorotiazida {dose}", price) for dose, price in
+        [("50mg/12,5mg", 19.0), ("100mg/25mg", 24.0), ("100mg/12,5mg", 22.0)]
+    ])
+    scraped = []
+
+    async def live_scrape(name):
+        scraped.append(name)
+        return {"query": name, "sources": ["Drogasil"], "products": [_product("Hidroclorotiazida 25mg", 4.5)],
+                "timings": {}}
+
+    monkeypatch.setattr(gemini_client.medication_price_scraper, "search_async", live_scrape)
+    asyncio.run(gemini_client.search_medication_prices("Hidroclorotiazida"))
+
+    assert scraped == ["hidroclorotiazida"]
+    assert "Hidroclorotiazida 25mg" in fake_gemini.prompts[-1]
@@ -0,0 +1,44 @@
+import pytest
+
+from app.rate_limiter import RateLimiter
+
+
+class FakeTime:
+    """Relógio e sleep falsos: dormir apenas avança o relógio."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_are_enforced():
+    fake = FakeTime()
+    limiter = RateLimiter(rpm=60, tpm=10**9, clock=fake.clock, sleep=fake.sleep)
+
+    for _ in range(60):
+        await limiter.acquire()
+    assert fake.now == 0  # rajada cabe na capacidade do balde
+
+    await limiter.acquire()
+    assert fake.now == pytest.approx(1.0)  # 60 RPM = 1 requisição por segundo
+
+
+@pytest.mark.asyncio
+async def test_tokens_per_minute_are_enforced():
+    fake = FakeTime()
+    limiter = RateLimiter(rpm=1000, tpm=6000, clock=fake.clock, sleep=fake.sleep)
+
+    await limiter.acquire(tokens=6000)
+    await limiter.acquire(tokens=3000)
+
+    # 6000 TPM = 100 tokens/s; faltavam 3000 tokens
+    assert fake.now == pytest.approx(30.0)
+    assert limiter.stats()["waits"] == 1
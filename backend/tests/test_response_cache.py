@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_compute(values):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return values[len(calls) - 1]
+
+    return compute, calls
+
+
+@pytest.mark.asyncio
+async def test_fresh_entries_are_served_from_cache():
+    cache = ResponseCache("teste", ttl=60, stale_ttl=60, clock=FakeClock())
+    compute, calls = make_compute(["v1", "v2"])
+
+    assert await cache.get_or_compute("dipirona", compute) == "v1"
+    assert await cache.get_or_compute("dipirona", compute) == "v1"
+    assert len(calls) == 1
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshing_in_background():
+    clock = FakeClock()
+    cache = ResponseCache("teste", ttl=60, stale_ttl=60, clock=clock)
+    compute, calls = make_compute(["v1", "v2"])
+    await cache.get_or_compute("dipirona", compute)
+
+    clock.now = 90
+    assert await cache.get_or_compute("dipirona", compute) == "v1"
+    await asyncio.sleep(0)  # deixa a atualização em segundo plano rodar
+    assert await cache.get_or_compute("dipirona", compute) == "v2"
+    assert len(calls) == 2
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.stats()["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_recomputed_inline():
+    clock = FakeClock()
+    cache = ResponseCache("teste", ttl=60, stale_ttl=60, clock=clock)
+    compute, calls = make_compute(["v1", "v2"])
+    await cache.get_or_compute("dipirona", compute)
+
+    clock.now = 500
+    assert await cache.get_or_compute("dipirona", compute) == "v2"
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_stale_value():
+    clock = FakeClock()
+    cache = ResponseCache("teste", ttl=60, stale_ttl=60, clock=clock)
+    cache.put("dipirona", "v1")
+
+    async def failing():
+        raise RuntimeError("site fora do ar")
+
+    clock.now = 90
+    assert await cache.get_or_compute("dipirona", failing) == "v1"
+    await asyncio.sleep(0)
+    assert await cache.get_or_compute("dipirona", failing) == "v1"
+    assert cache.stats()["refresh_failures"] >= 1
+
+
+def test_memory_bound_evicts_least_recently_used():
+    cache = ResponseCache("teste", ttl=60, stale_ttl=60, max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.put("c", "12345")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 10
+    assert cache.stats()["evictions"] == 1
@@ -1,6 +1,9 @@
+import threading
+import time
+
 import pytest
 from unittest.mock import patch, MagicMock
-from app.scrapers import MedicationInfoScraper
+from app.scrapers import MedicationInfoScraper, MedicationPriceScraper, SearchCancelled, _fetch_html, _timed_call
 
 def test_scrape_bulas_med_br_success():
     scraper = MedicationInfoScraper()
@@ -27,8 +30,220 @@ def test_scrape_bulas_med_br_success():
     resp_bula   = MagicMock(status_code=200, content=bula_html.encode("utf-8"))
 
     # 1ª chamada -> resp_search, 2ª chamada -> resp_bula
-    with patch("requests.get", side_effect=[resp_search, resp_bula]):
+    with patch("app.http_client.get", side_effect=[resp_search, resp_bula]):
         result = scraper._scrape_bulas_med_br("Aspirina")
         assert result is not None
         assert "Aspirina" in result["content"]
         assert "LabTeste" in result["content"]
+
+
+def test_price_search_queries_sources_concurrently_under_deadline():
+    scraper = MedicationPriceScraper(deadline=0.5)
+
+    def fast(name):
+        return {
+            "source_name": "Rápida",
+            "products": [{"name": "Dipirona 500mg", "price": 9.9, "source": "Rápida"}]
+        }
+
+    def also_fast(name):
+        time.sleep(0.1)
+        return {
+            "source_name": "Média",
+            "products": [{"name": "Dipirona 1g", "price": 4.5, "source": "Média"}]
+        }
+
+    def slow(name):
+        time.sleep(2)
+        return {"source_name": "Lenta", "products": [{"name": "X", "price": 1.0}]}
+
+    def broken(name):
+        raise RuntimeError("boom")
+
+    fast.__name__, also_fast.__name__ = "_scrape_rapida", "_scrape_media"
+    slow.__name__, broken.__name__ = "_scrape_lenta", "_scrape_quebrada"
+    scraper.sources = [fast, also_fast, slow, broken]
+
+    start = time.perf_counter()
+    result = scraper.search("dipirona")
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.0
+    assert [p["price"] for p in result["products"]] == [4.5, 9.9]
+    assert result["sources"] == ["Rápida", "Média"]
+    assert result["timings"]["rapida"]["status"] == "ok"
+    assert result["timings"]["lenta"]["status"] == "timeout"
+    assert result["timings"]["quebrada"]["status"] == "error"
+
+
+def _named(func, name):
+    func.__name__ = name
+    return func
+
+
+def test_info_search_races_sources_in_priority_order_and_cancels_losers():
+    cancelled = threading.Event()
+
+    def empty_first(name, cancel_event=None):
+        time.sleep(0.05)
+        return None
+
+    def winner(name, cancel_event=None):
+        time.sleep(0.1)
+        return {"content": "Bula da dipirona", "source": "https://exemplo/bula"}
+
+    def slow_loser(name, cancel_event=None):
+        # Simula o download em partes de _fetch_html
+        for _ in range(100):
+            if cancel_event.is_set():
+                cancelled.set()
+                return None
+            time.sleep(0.02)
+        return {"content": "tarde demais", "source": "lenta"}
+
+    scraper = MedicationInfoScraper(racing=True)
+    scraper.sources = [
+        _named(empty_first, "_scrape_vazia"),
+        _named(winner, "_scrape_vencedora"),
+        _named(slow_loser, "_scrape_lenta"),
+    ]
+
+    start = time.perf_counter()
+    result = scraper.search("dipirona")
+    elapsed = time.perf_counter() - start
+
+    assert result["content"] == "Bula da dipirona"
+    assert elapsed < 0.5
+    assert cancelled.wait(1)
+
+
+def test_info_race_loser_is_recorded_as_cancelled_and_failure_as_error():
+    import requests
+    from app.metrics import STAGE_SECONDS
+
+    def outcomes(source):
+        return {key[3]: series[2] for key, series in STAGE_SECONDS.series().items()
+                if key[1] == "scrape" and key[2] == source}
+
+    def winner(name, cancel_event=None):
+        time.sleep(0.1)
+        return {"content": "Bula da dipirona", "source": "https://exemplo/bula"}
+
+    def slow_download(chunk_size):
+        for _ in range(100):
+            time.sleep(0.02)
+            yield b"<html>"
+
+    response = MagicMock()
+    response.iter_content.side_effect = slow_download
+    before = outcomes("bulas_med_br")
+
+    scraper = MedicationInfoScraper(racing=True)
+    scraper.sources = [_named(winner, "_scrape_vencedora"), scraper._scrape_bulas_med_br]
+    with patch("app.http_client.get", return_value=response):
+        assert scraper.search("dipirona")["content"] == "Bula da dipirona"
+        deadline = time.monotonic() + 2
+        while outcomes("bulas_med_br").get("cancelled", 0) == before.get("cancelled", 0) and time.monotonic() < deadline:
+            time.sleep(0.02)
+    assert outcomes("bulas_med_br").get("cancelled", 0) == before.get("cancelled", 0) + 1
+
+    # Sem rede a fonte conta como erro, não como resposta vazia
+    before = outcomes("remedios_com_br")
+    with patch("app.http_client.get", side_effect=requests.exceptions.ConnectionError("sem rede")):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            _timed_call(scraper._scrape_remedios_com_br, "dipirona")
+    assert outcomes("remedios_com_br").get("error", 0) == before.get("error", 0) + 1
+    assert outcomes("remedios_com_br").get("empty", 0) == before.get("empty", 0)
+
+
+def test_info_search_priority_is_configurable():
+    scraper = MedicationInfoScraper(priority=["remedios_com_br", "bulas_med_br"])
+    names = [f.__name__ for f in scraper.sources]
+    assert names == ["_scrape_remedios_com_br", "_scrape_bulas_med_br", "_scrape_bulario_anvisa"]
+
+
+def test_fetch_html_stops_reading_when_cancelled():
+    cancel_event = threading.Event()
+    response = MagicMock()
+
+    def chunks(chunk_size):
+        yield b"<html>"
+        cancel_event.set()
+        yield b"resto"
+
+    response.iter_content.side_effect = chunks
+    with patch("app.http_client.get", return_value=response):
+        with pytest.raises(SearchCancelled):
+            _fetch_html("https://exemplo", {}, cancel_event)
+    response.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_async_searches_do_not_hold_default_executor_threads():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    def slow_prices(name):
+        time.sleep(0.5)
+        return {"source_name": "Lenta", "products": [{"name": "Dipirona 1g", "price": 4.5}]}
+
+    def slow_info(name, cancel_event=None):
+        time.sleep(0.5)
+        return {"content": "Bula", "source": "lenta"}
+
+    prices = MedicationPriceScraper(deadline=2)
+    prices.sources = [_named(slow_prices, "_scrape_lenta")]
+    info = MedicationInfoScraper(racing=True)
+    info.sources = [_named(slow_info, "_scrape_lenta")]
+
+    # Um único thread no executor padrão: se as buscas o ocupassem, o to_thread esperaria por elas
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+    searches = [asyncio.create_task(prices.search_async("dipirona")), asyncio.create_task(info.search_async("dipirona"))]
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.to_thread(lambda: None)
+    assert time.perf_counter() - start < 0.2
+
+    price_result, info_result = await asyncio.gather(*searches)
+    assert price_result["products"][0]["price"] == 4.5
+    assert info_result["content"] == "Bula"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_async", [False, True])
+async def test_info_race_gives_up_at_deadline(use_async):
+    import asyncio
+
+    cancelled = threading.Event()
+
+    def hanging(name, cancel_event=None):
+        while not cancel_event.wait(0.02):
+            pass
+        cancelled.set()
+        return None
+
+    scraper = MedicationInfoScraper(racing=True, deadline=0.2)
+    scraper.sources = [_named(hanging, "_scrape_travada")]
+
+    start = time.perf_counter()
+    if use_async:
+        result = await scraper.search_async("dipirona")
+    else:
+        result = await asyncio.to_thread(scraper.search, "dipirona")
+
+    assert result == {"content": "", "source": ""}
+    assert time.perf_counter() - start < 0.5
+    assert cancelled.wait(1)
+
+
+def test_pharmacy_request_errors_are_reported_as_errors():
+    import requests
+
+    scraper = MedicationPriceScraper(deadline=2)
+    scraper.sources = [scraper._scrape_drogasil]
+    with patch("app.http_client.get", side_effect=requests.exceptions.ConnectionError("sem rede")):
+        result = scraper.search("dipirona")
+
+    assert result["timings"]["drogasil"]["status"] == "error"
@@ -0,0 +1,122 @@
+import threading
+
+from app.session_store import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_put_and_get_roundtrip_counts_hits_and_misses():
+    store = SessionStore()
+    store.put("s1", "Hemoglobina 13,5 g/dL")
+
+    assert store.get("s1") == "Hemoglobina 13,5 g/dL"
+    assert store.get("desconhecida") is None
+    stats = store.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_text_is_compressed_at_rest():
+    store = SessionStore()
+    text = "Glicose 90 mg/dL\n" * 500
+    store.put("s1", text)
+
+    assert store.stats()["bytes"] < len(text.encode("utf-8")) / 10
+
+
+def test_evicts_least_recently_used_when_entry_cap_exceeded():
+    store = SessionStore(max_entries=2)
+    store.put("a", "exame a")
+    store.put("b", "exame b")
+    store.get("a")  # "b" passa a ser o menos recente
+    store.put("c", "exame c")
+
+    assert "b" not in store
+    assert store.get("a") == "exame a"
+    assert store.get("c") == "exame c"
+    assert store.stats()["evictions"] == 1
+
+
+def test_byte_budget_is_enforced():
+    store = SessionStore(max_bytes=200)
+    for i in range(20):
+        # Conteúdo pouco compressível para ocupar o orçamento rapidamente
+        store.put(f"s{i}", "".join(chr(0x41 + (i * 7 + j * 13) % 58) for j in range(100)))
+
+    assert store.stats()["bytes"] <= 200
+    assert store.stats()["evictions"] > 0
+
+
+def test_sessions_expire_after_idle_ttl():
+    clock = FakeClock()
+    store = SessionStore(idle_ttl=60, clock=clock)
+    store.put("s1", "exame")
+
+    clock.now = 59
+    assert store.get("s1") == "exame"  # leitura renova o prazo
+    clock.now = 118
+    assert store.get("s1") == "exame"
+    clock.now = 200
+    assert store.get("s1") is None
+    assert store.stats()["expirations"] == 1
+
+
+def test_concurrent_access_keeps_accounting_consistent():
+    store = SessionStore(max_entries=50)
+
+    def worker(n):
+        for i in range(200):
+            store.put(f"{n}-{i}", f"exame {n} {i}")
+            store.get(f"{n}-{i // 2}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(store) == 50
+    assert store.stats()["bytes"] == sum(len(blob) + len(markers) + len(analysis or b"") for blob, markers, _, analysis, _, _ in store._entries.values())
+
+
+def test_markers_are_stored_with_the_session():
+    store = SessionStore()
+    markers = [{"name": "Hemoglobina", "value": "13,5", "unit": "g/dL", "reference": "12,0 a 16,0",
+                "low": 12.0, "high": 16.0, "status": "normal"}]
+    store.put("s1", "Hemoglobina 13,5 g/dL", markers)
+    store.put("s2", "exame sem marcadores")
+
+    assert store.get_markers("s1") == markers
+    assert store.get_markers("s2") == []
+    assert store.get_markers("desconhecida") is None
+
+
+def test_get_entry_is_a_single_lookup():
+    store = SessionStore()
+    markers = [{"name": "Glicose", "value": "90", "unit": "mg/dL"}]
+    store.put("s1", "Glicose 90 mg/dL", markers)
+
+    entry = store.get_entry("s1")
+    assert (entry["exam_content"], entry["markers"], entry["index"]) == ("Glicose 90 mg/dL", markers, None)
+    assert store.get_entry("desconhecida") is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_analysis_is_stored_with_the_session_and_counted():
+    store = SessionStore()
+    store.put("s1", "Glicose 90 mg/dL")
+    before = store.stats()["bytes"]
+
+    assert store.set_analysis("s1", "✅ Resumo geral " * 50)
+    assert not store.set_analysis("desconhecida", "✅ Resumo")
+    assert store.get_entry("s1")["analysis"] == "✅ Resumo geral " * 50
+    assert store.stats()["bytes"] > before
+    store.put("s1", "Glicose 95 mg/dL")  # novo exame, análise antiga descartada
+    assert store.get_entry("s1")["analysis"] is None
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight("teste")
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "bula da dipirona"
+
+    results = await asyncio.gather(*[flight.do(("info", "dipirona"), lookup) for _ in range(10)])
+
+    assert results == ["bula da dipirona"] * 10
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "collapsed": 9}
+
+
+@pytest.mark.asyncio
+async def test_failure_propagates_to_every_waiter():
+    flight = SingleFlight("teste")
+
+    async def lookup():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Gemini indisponível")
+
+    results = await asyncio.gather(
+        *[flight.do(("prices", "losartana"), lookup) for _ in range(3)],
+        return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately_and_cancelled_waiter_does_not_cancel_others():
+    flight = SingleFlight("teste")
+
+    async def lookup():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    leader = asyncio.ensure_future(flight.do(("info", "omeprazol"), lookup))
+    follower = asyncio.ensure_future(flight.do(("info", "omeprazol"), lookup))
+    other = asyncio.ensure_future(flight.do(("prices", "omeprazol"), lookup))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ok"
+    assert await other == "ok"
+    assert flight.stats()["executions"] == 2
@@ -0,0 +1,68 @@
+import pytest
+
+from app import gemini_client, token_budget
+from app.token_budget import TRUNCATION_MARKER, count_tokens, fit_prompt, truncate_to_tokens
+
+
+def _build(instructions, question, exam):
+    return f"{instructions}\nExame:\n{exam}\nPergunta: {question}"
+
+
+def test_truncation_is_deterministic_and_within_budget():
+    text = "\n".join(f"Linha {i}: hemoglobina 13,{i % 10} g/dL" for i in range(500))
+
+    first = truncate_to_tokens(text, 200)
+    assert first == truncate_to_tokens(text, 200)
+    assert count_tokens(first) <= 200
+    assert first.startswith("Linha 0:")
+    assert first.endswith(TRUNCATION_MARKER)
+    # Corta em fim de linha, sem deixar linha pela metade
+    assert first[:-len(TRUNCATION_MARKER)].split("\n")[-1].endswith("g/dL")
+
+    assert truncate_to_tokens("curto", 200) == "curto"
+
+
+def test_fit_prompt_trims_least_important_field_first(monkeypatch):
+    monkeypatch.setenv("GEMINI_INPUT_BUDGET_EXAM_QUESTION", "300")
+    fields = {"instructions": "Responda em português.", "question": "Minha glicose está alta?", "exam": "x" * 5000}
+
+    prompt, tokens = fit_prompt("exam_question", _build, fields, priority=["instructions", "question", "exam"])
+
+    assert tokens == count_tokens(prompt) <= 300
+    assert "Responda em português." in prompt
+    assert "Minha glicose está alta?" in prompt
+    assert TRUNCATION_MARKER in prompt
+
+
+def test_fit_prompt_leaves_prompts_within_budget_untouched():
+    fields = {"instructions": "Responda.", "question": "Tudo bem?", "exam": "Glicose 90 mg/dL"}
+
+    prompt, _ = fit_prompt("exam_question", _build, fields, priority=["instructions", "question", "exam"])
+
+    assert prompt == _build(**fields)
+
+
+def test_usage_is_recorded_per_agent(monkeypatch):
+    monkeypatch.setattr(token_budget, "_usage", {})
+    monkeypatch.setenv("GEMINI_INPUT_BUDGET_GENERAL_QUESTION", "50")
+
+    fit_prompt("general_question", _build, {"instructions": "", "question": "a" * 1000, "exam": ""}, priority=["question"])
+    fit_prompt("general_question", _build, {"instructions": "", "question": "ok", "exam": ""}, priority=["question"])
+
+    usage = token_budget.usage_stats()["general_question"]
+    assert usage["calls"] == 2
+    assert usage["trimmed_calls"] == 1
+    assert usage["max_input_tokens"] <= 50
+
+
+@pytest.mark.asyncio
+async def test_long_exam_is_trimmed_before_reaching_gemini(fake_gemini, monkeypatch):
+    monkeypatch.setenv("GEMINI_INPUT_BUDGET_EXAM_ANALYSIS", "2000")
+    exam = "\n".join(f"Colesterol total {i} mg/dL" for i in range(5000))
+
+    await gemini_client.analyze_exam(exam, "sessao-longa")
+
+    assert count_tokens(fake_gemini.prompts[0]) <= 2000
+    assert TRUNCATION_MARKER in fake_gemini.prompts[0]
+    # A sessão guarda o exame completo para as perguntas de acompanhamento
+    assert gemini_client.exam_storage.get("sessao-longa") == exam